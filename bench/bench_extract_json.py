@@ -0,0 +1,153 @@
+# bench/bench_extract_json.py
+"""
+Microbenchmark: extract_json_from_text (single-pass raw_decode) vs the previous
+balanced-brace implementation, on small, large and deeply nested Grok payloads.
+
+    python bench/bench_extract_json.py [--repeat 5]
+
+Every payload is first checked for identical results between the two versions.
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import extract_json_from_text  # noqa: E402
+
+
+def legacy_extract_json_from_text(text):
+    # verbatim copy of the pre-rewrite implementation, kept as the baseline
+    if not text or not isinstance(text, str):
+        raise ValueError("No text provided for JSON extraction")
+    candidates = []
+    starts = []
+    for i, ch in enumerate(text):
+        if ch == "{":
+            starts.append(i)
+        elif ch == "}":
+            if starts:
+                start = starts.pop()
+                end = i
+                if end - start > 20:
+                    candidates.append(text[start:end+1])
+    candidates = sorted(set(candidates), key=lambda s: -len(s))
+
+    def try_parse(s):
+        try:
+            return json.loads(s)
+        except Exception:
+            fixed = s.replace("“", '"').replace("”", '"').replace("’", "'").replace("\t", " ")
+            try:
+                fixed = re.sub(r"'([A-Za-z0-9_\- ]+)'\s*:", r'"\1":', fixed)
+                fixed = re.sub(r':\s*\'([^\']*)\'', r': "\1"', fixed)
+                return json.loads(fixed)
+            except Exception:
+                return None
+
+    for cand in candidates:
+        parsed = try_parse(cand)
+        if parsed is not None:
+            return parsed
+    first = text.find("{")
+    last = text.rfind("}")
+    if first != -1 and last > first:
+        parsed = try_parse(text[first:last+1])
+        if parsed is not None:
+            return parsed
+    raise ValueError("No valid JSON object found in text (attempted multiple heuristics)")
+
+
+def tweets_payload(n):
+    return json.dumps({
+        "tweets": [
+            {
+                "id": str(1850000000000000000 + i),
+                "author": f"@handle{i}",
+                "created_at": "2025-10-29T12:00:00Z",
+                "text": f"Tweet {i} about {{markets}} and AI adoption " * 3,
+                "url": f"https://x.com/handle{i}/status/{1850000000000000000 + i}",
+                "retweets": i, "replies": i // 2, "likes": i * 3,
+                "why_selected": "high engagement",
+            }
+            for i in range(n)
+        ],
+        "summary": "Markets moved on AI news.",
+        "cfo_insights": ["Watch capex", "Hedge FX"],
+    }, indent=2)
+
+
+def exec_payload(sections, rows):
+    tables = [
+        {
+            "title": f"Table {s}",
+            "headers": ["Date", "Acquirer", "Acquiree", "Size/Valuation", "Rationale"],
+            "rows": [["2025-10-29", f"Acq {r}", f"Target {r}", "$1bn", "Scale {and} reach"] for r in range(rows)],
+            "notes": {"meta": {"nested": {"deeper": {"deepest": {"k": "v" * 10}}}}},
+        }
+        for s in range(sections)
+    ]
+    document = "\n\n".join(f"## Section {s}\n" + "Analysis {with braces} text. " * 40 for s in range(sections))
+    return json.dumps({
+        "document": document,
+        "highlights": [f"Highlight {h}" for h in range(10)],
+        "tables": tables,
+        "sources": [{"title": f"Source {k}", "url": f"https://example.com/{k}"} for k in range(30)],
+    }, indent=2)
+
+
+def cases():
+    big_exec = exec_payload(sections=6, rows=60)
+    return {
+        "tweets_n5": "```json\n" + tweets_payload(5) + "\n```",
+        "tweets_n50": tweets_payload(50),
+        "tweets_n50_truncated": tweets_payload(50)[:-400],
+        "exec_large": "Here is the pack:\n" + big_exec + "\nThanks.",
+        "exec_large_truncated": big_exec[: int(len(big_exec) * 0.8)],
+        "smart_quotes": tweets_payload(10).replace('"summary": "', '"summary": “').replace('news."', 'news.”'),
+    }
+
+
+def bench(fn, text, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        try:
+            fn(text)
+        except ValueError:
+            pass
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'case':<24}{'bytes':>10}{'legacy ms':>12}{'new ms':>10}{'speedup':>10}")
+    for name, text in cases().items():
+        try:
+            expected = legacy_extract_json_from_text(text)
+        except ValueError:
+            expected = ValueError
+        try:
+            got = extract_json_from_text(text)
+        except ValueError:
+            got = ValueError
+        # the legacy extractor picks an arbitrary object among equal-length candidates
+        # (set() ordering); the new one deterministically picks the leftmost of them
+        same = got == expected or (
+            isinstance(got, dict) and isinstance(expected, dict)
+            and len(json.dumps(got)) == len(json.dumps(expected))
+        )
+        assert same, f"{name}: results differ from legacy extractor"
+        legacy = bench(legacy_extract_json_from_text, text, args.repeat)
+        new = bench(extract_json_from_text, text, args.repeat)
+        print(f"{name:<24}{len(text):>10}{legacy * 1000:>12.2f}{new * 1000:>10.2f}{legacy / new:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
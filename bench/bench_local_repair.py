@@ -0,0 +1,118 @@
+# bench/bench_local_repair.py
+"""
+Correctness checks and coverage for the local truncation repair: cuts tweets and
+exec payloads at every --step'th offset and reports how many cuts are recovered
+without a reformat call, plus the time the repair takes.
+
+    python bench/bench_local_repair.py [--step 7]
+
+Fails (non-zero exit) if a repaired tweet differs from the original one, i.e. a
+half-written tweet was kept instead of dropped.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import (  # noqa: E402
+    clean_exec_content, clean_tweet_content, extract_json_from_text,
+    is_exec_payload, is_tweets_payload, repair_truncated_json,
+)
+
+
+def tweets_payload(n):
+    return {
+        "tweets": [
+            {
+                "id": str(1850000000000000000 + i),
+                "author": f"@handle{i}",
+                "created_at": "2025-10-29T12:00:00Z",
+                "text": f"Tweet {i}: “markets” rally on AI news \\ {{braces}} émirats " * 2,
+                "url": f"https://x.com/handle{i}/status/{1850000000000000000 + i}",
+                "retweets": i, "replies": 0, "likes": i * 2,
+                "why_selected": "high engagement",
+            }
+            for i in range(n)
+        ],
+        "summary": "Markets moved on AI news.",
+        "cfo_insights": ["Watch capex", "Hedge FX"],
+    }
+
+
+def exec_payload():
+    return {
+        "document": "## Cyber\n" + "Analysis with \"quotes\" and \\u escapes. " * 80,
+        "highlights": [f"Highlight {h}" for h in range(6)],
+        "tables": [{"title": "M&A table", "headers": ["Date", "Acquirer", "Acquiree", "Size/Valuation", "Rationale"],
+                    "rows": [["2025-10-29", f"Acq {r}", f"Target {r}", "$1bn", "Scale"] for r in range(12)]}],
+        "sources": [{"title": f"Source {k}", "url": f"https://example.com/{k}"} for k in range(10)],
+    }
+
+
+def parse_or_repair(text, valid):
+    """Same order as finalize_summary / finalize_exec_summary, minus the Grok calls."""
+    try:
+        parsed = extract_json_from_text(text)
+        if valid(parsed):
+            return parsed, "grok"
+    except ValueError:
+        pass
+    repaired = repair_truncated_json(text)
+    if valid(repaired):
+        return repaired, "local_repair"
+    return None, "reformat"
+
+
+def run(name, doc, clean, valid, check, step):
+    full = json.dumps(doc, ensure_ascii=False, indent=2)
+    counts = {"grok": 0, "local_repair": 0, "reformat": 0}
+    repair_times = []
+    ok = True
+    for cut in range(1, len(full), step):
+        text = clean(full[:cut])
+        t0 = time.perf_counter()
+        obj, path = parse_or_repair(text, valid)
+        if path != "grok":
+            repair_times.append(time.perf_counter() - t0)
+        counts[path] += 1
+        if obj is not None and not check(obj, doc):
+            print(f"FAIL {name}: cut at {cut} kept a partial element\n  ...{full[max(0, cut - 80):cut]!r}")
+            ok = False
+            break
+    total = sum(counts.values())
+    repair_times.sort()
+    p50 = repair_times[len(repair_times) // 2] * 1000 if repair_times else 0
+    print(f"{name:<10}{len(full):>8}{total:>7}{counts['grok']:>7}{counts['local_repair']:>9}"
+          f"{counts['reformat']:>10}{p50:>12.3f}")
+    return ok
+
+
+def check_tweets(obj, doc):
+    originals = {t["id"]: t for t in doc["tweets"]}
+    return all(t == originals.get(t.get("id")) for t in obj.get("tweets") or [])
+
+
+def check_exec(obj, doc):
+    rows = doc["tables"][0]["rows"]
+    for table in obj.get("tables") or []:
+        if any(r not in rows for r in table.get("rows", [])):
+            return False
+    return doc["document"].startswith(obj.get("document") or "")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--step", type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"{'payload':<10}{'bytes':>8}{'cuts':>7}{'parsed':>7}{'repaired':>9}{'reformat':>10}{'repair ms':>12}")
+    ok = run("tweets", tweets_payload(15), clean_tweet_content, is_tweets_payload, check_tweets, args.step)
+    ok &= run("exec", exec_payload(), clean_exec_content, is_exec_payload, check_exec, args.step)
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
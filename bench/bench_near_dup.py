@@ -0,0 +1,122 @@
+# bench/bench_near_dup.py
+"""
+Benchmark for near-duplicate clustering: near_duplicate_clusters (batched NumPy
+MinHash + LSH banding) vs exact pairwise Jaccard over word shingles.
+
+    python bench/bench_near_dup.py [--repeat 3] [--sizes 200,1000,5000,10000]
+
+The pairwise baseline is quadratic and only runs up to --baseline-max tweets; its
+clusters are used to report the MinHash recall and precision of duplicate pairs.
+Correctness is covered by tests/test_near_dup.py, which reuses the baseline and corpus.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from itertools import combinations
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import NEAR_DUP_SHINGLE, NEAR_DUP_THRESHOLD, near_duplicate_clusters, shingle_tokens  # noqa: E402
+
+
+# ----------------------
+# exact pairwise baseline
+# ----------------------
+def shingles(text):
+    words = shingle_tokens(text)
+    if len(words) < NEAR_DUP_SHINGLE:
+        return {tuple(words)} if words else {("\0", id(text))}
+    return {tuple(words[i:i + NEAR_DUP_SHINGLE]) for i in range(len(words) - NEAR_DUP_SHINGLE + 1)}
+
+
+def pairwise_clusters(texts):
+    sets = [shingles(t) for t in texts]
+    parent = list(range(len(texts)))
+
+    def find(i):
+        while parent[i] != i:
+            i = parent[i]
+        return i
+
+    for i, j in combinations(range(len(texts)), 2):
+        if len(sets[i] & sets[j]) / len(sets[i] | sets[j]) >= NEAR_DUP_THRESHOLD:
+            ri, rj = find(i), find(j)
+            if ri != rj:
+                parent[max(ri, rj)] = min(ri, rj)
+    clusters = {}
+    for i in range(len(texts)):
+        clusters.setdefault(find(i), []).append(i)
+    return list(clusters.values())
+
+
+def same_cluster_pairs(clusters):
+    return {pair for c in clusters for pair in combinations(c, 2)}
+
+
+# ----------------------
+# corpus: stories with retweets, quote-tweets and light edits mixed in
+# ----------------------
+VOCAB = ("oil opec aramco profit quarter bank central rate inflation cyber ransomware breach "
+         "regulator fine audit merger acquisition deal shares market rally slump guidance ai model "
+         "chip export sanctions bond yield dollar riyal dirham budget deficit ipo listing exchange").split()
+
+
+def story(rng, words=25):
+    return " ".join(rng.choice(VOCAB) + str(rng.randrange(200)) for _ in range(words))
+
+
+def corpus(size, seed=7):
+    rng = random.Random(seed)
+    texts = []
+    while len(texts) < size:
+        base = story(rng)
+        texts.append(base)
+        for _ in range(rng.randrange(4)):
+            kind = rng.random()
+            if kind < 0.3:
+                texts.append(f"RT @desk{rng.randrange(50)}: {base}")
+            elif kind < 0.6:
+                texts.append(f"Worth reading: {base} https://t.co/{rng.randrange(10 ** 6)}")
+            else:
+                words = base.split()
+                words[rng.randrange(len(words))] = "update"
+                texts.append(" ".join(words))
+    rng.shuffle(texts)
+    return texts[:size]
+
+
+def bench(fn, texts, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn(texts)
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--sizes", default="200,1000,5000,10000")
+    parser.add_argument("--baseline-max", type=int, default=1000)
+    args = parser.parse_args()
+
+    near_duplicate_clusters(corpus(50))  # warm up NumPy
+    print(f"{'tweets':>8}{'pairwise ms':>14}{'minhash ms':>12}{'speedup':>10}{'clusters':>10}{'recall':>8}{'precision':>11}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        texts = corpus(size)
+        new, clusters = bench(near_duplicate_clusters, texts, args.repeat)
+        if size <= args.baseline_max:
+            legacy, exact = bench(pairwise_clusters, texts, 1)
+            got, expected = same_cluster_pairs(clusters), same_cluster_pairs(exact)
+            recall = len(got & expected) / max(1, len(expected))
+            precision = len(got & expected) / max(1, len(got))
+            print(f"{size:>8}{legacy * 1000:>14.1f}{new * 1000:>12.1f}{legacy / new:>9.1f}x"
+                  f"{len(clusters):>10}{recall:>8.3f}{precision:>11.3f}")
+        else:
+            print(f"{size:>8}{'-':>14}{new * 1000:>12.1f}{'-':>10}{len(clusters):>10}{'-':>8}{'-':>11}")
+
+
+if __name__ == "__main__":
+    main()
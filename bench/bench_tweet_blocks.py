@@ -0,0 +1,148 @@
+# bench/bench_tweet_blocks.py
+"""
+Benchmark for the regex fallback: find_all_tweet_like_blocks (single-pass tokenizer)
+vs the previous window-per-match implementation.
+
+    python bench/bench_tweet_blocks.py [--repeat 5]
+
+Correctness is covered by tests/test_extract.py.
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import find_all_tweet_like_blocks  # noqa: E402
+
+# ----------------------
+# previous implementation, kept as the baseline
+# ----------------------
+RE_TWEET_URL = re.compile(r"https?://(?:x\.com|twitter\.com)/(?P<author>[^/\s]+)/status/(?P<id>\d+)", re.IGNORECASE)
+RE_ID = re.compile(r'"id"\s*:\s*"?(?P<id>\d{5,})"?')
+RE_AUTHOR_FIELD = re.compile(r'"author"\s*:\s*"?(?P<author>@?[\w_]{1,30})"?')
+RE_TEXT_FIELD = re.compile(r'"text"\s*:\s*"(?P<text>(?:\\.|[^"\\])*)"', re.S)
+RE_CREATED_AT = re.compile(r'"created_at"\s*:\s*"(?P<created>[^"]+)"')
+RE_WHY = re.compile(r'"why_selected"\s*:\s*"(?P<why>(?:\\.|[^"\\])*)"', re.S)
+
+
+def legacy_find_all_tweet_like_blocks(text):
+    results = []
+    if not text:
+        return results
+    text_matches = list(RE_TEXT_FIELD.finditer(text))
+    if text_matches:
+        for m in text_matches:
+            start, end = m.span()
+            window = text[max(0, start - 500):min(len(text), end + 500)]
+            tweet = {"id": "", "author": "", "text": "", "url": "", "why_selected": "", "created_at": ""}
+            tweet["text"] = m.group("text").encode('utf-8').decode('unicode_escape') if m.group("text") else ""
+            id_m = RE_ID.search(window)
+            if id_m:
+                tweet["id"] = id_m.group("id")
+            author_m = RE_AUTHOR_FIELD.search(window)
+            if author_m:
+                author = author_m.group("author")
+                tweet["author"] = author if author.startswith("@") else "@" + author
+            created_m = RE_CREATED_AT.search(window)
+            if created_m:
+                tweet["created_at"] = created_m.group("created")
+            why_m = RE_WHY.search(window)
+            if why_m:
+                tweet["why_selected"] = why_m.group("why").encode('utf-8').decode('unicode_escape')
+            url_m = RE_TWEET_URL.search(window)
+            if url_m:
+                tweet["url"] = url_m.group(0)
+                if not tweet["id"]:
+                    tweet["id"] = url_m.group("id")
+                if not tweet["author"]:
+                    a = url_m.group("author")
+                    tweet["author"] = a if a.startswith("@") else "@" + a
+            results.append(tweet)
+    if not results:
+        for url_m in RE_TWEET_URL.finditer(text):
+            author_raw = url_m.group("author")
+            start, end = url_m.span()
+            window = text[max(0, start-200):min(len(text), end+400)]
+            t_m = RE_TEXT_FIELD.search(window)
+            why_m = RE_WHY.search(window)
+            created_m = RE_CREATED_AT.search(window)
+            results.append({
+                "id": url_m.group("id"),
+                "author": "@" + author_raw if not author_raw.startswith("@") else author_raw,
+                "text": t_m.group("text") if t_m else "",
+                "url": url_m.group(0),
+                "why_selected": why_m.group("why") if why_m else "",
+                "created_at": created_m.group("created") if created_m else "",
+            })
+    dedup = {}
+    for r in results:
+        key = r.get("id") or r.get("url") or r.get("text")[:40]
+        if not key:
+            continue
+        if key in dedup:
+            existing = dedup[key]
+            for f in ("author", "text", "url", "why_selected", "created_at"):
+                if not existing.get(f) and r.get(f):
+                    existing[f] = r.get(f)
+        else:
+            dedup[key] = r
+    return list(dedup.values())
+
+
+# ----------------------
+# payloads
+# ----------------------
+def tweet(i, text=None, **extra):
+    t = {
+        "id": str(1850000000000000000 + i),
+        "author": f"@handle{i}",
+        "created_at": "2025-10-29T12:00:00Z",
+        "text": text if text is not None else f"Tweet {i}: markets rally on AI news",
+        "url": f"https://x.com/handle{i}/status/{1850000000000000000 + i}",
+        "retweets": i, "replies": 0, "likes": i * 2,
+        "why_selected": "high engagement",
+    }
+    t.update(extra)
+    return t
+
+
+def payload(tweets, summary="Markets moved."):
+    return json.dumps({"tweets": tweets, "summary": summary, "cfo_insights": []}, ensure_ascii=False, indent=2)
+
+
+def bench(fn, text, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    big = payload([tweet(i, text=f"Tweet {i} " + "lorem ipsum dolor sit amet " * 8) for i in range(400)])
+    cases = {
+        "tweets_n20": payload([tweet(i) for i in range(20)]),
+        "tweets_n400": big,
+        "tweets_n400_truncated": big[: int(len(big) * 0.7)],
+        "malformed_n400": big.replace('",\n', '"\n').replace("},", "}"),
+        # degraded output with most fields missing: every old window search scanned ~1KB for nothing
+        "sparse_fields_n3000": json.dumps({"tweets": [{"text": f"short tweet {i}", "likes": i} for i in range(3000)]}),
+        "prose_urls": " ".join(f"see https://x.com/u{i}/status/{1000000 + i} now" for i in range(2000)),
+    }
+    print(f"{'case':<24}{'bytes':>10}{'legacy ms':>12}{'new ms':>10}{'speedup':>10}")
+    for name, text in cases.items():
+        legacy = bench(legacy_find_all_tweet_like_blocks, text, args.repeat)
+        new = bench(find_all_tweet_like_blocks, text, args.repeat)
+        print(f"{name:<24}{len(text):>10}{legacy * 1000:>12.2f}{new * 1000:>10.2f}{legacy / new:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
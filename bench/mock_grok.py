@@ -0,0 +1,218 @@
+# bench/mock_grok.py
+"""
+Local stand-in for Grok's /v1/chat/completions, for benchmarking without API quota.
+
+    python bench/mock_grok.py --port 9100 --latency-ms 800 --jitter-ms 400 \
+        --truncate-rate 0.1 --malformed-rate 0.1 --error-rate 0.02 [--corpus bench/corpus.jsonl]
+
+Point the app at it with GROK_API_URL=http://127.0.0.1:9100/v1/chat/completions.
+Responses are replayed round-robin from a recorded corpus (see GROK_RECORD_PATH in
+main.py) when one is given, otherwise synthesized from the prompt. Supports
+`stream: true` (SSE chunks spread over the latency). Like Grok's prompt cache, a
+system message seen before is reported in usage.prompt_tokens_details.cached_tokens.
+"""
+import re
+import json
+import random
+import asyncio
+import argparse
+from typing import Any, Dict, List
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+RE_N = re.compile(r"return up to (\d+) tweets", re.IGNORECASE)
+
+
+def request_kind(payload: Dict[str, Any]) -> str:
+    """'reformat', 'exec' or 'tweets' — also used by run_bench.py to bucket the corpus."""
+    text = " ".join(str(m.get("content", "")) for m in payload.get("messages", []))
+    if "RAW CONTENT START" in text:
+        return "reformat"
+    if "Executive Briefing" in text or "briefing writer" in text:
+        return "exec"
+    return "tweets"
+
+
+def completion_content(response: Any) -> str:
+    if isinstance(response, dict) and response.get("choices"):
+        ch0 = response["choices"][0]
+        return (ch0.get("message") or {}).get("content") or ch0.get("text") or ""
+    return json.dumps(response)
+
+
+def synth_tweets(n: int, rng: random.Random) -> str:
+    tweets = []
+    for i in range(n):
+        tid = str(rng.randrange(10**18, 10**19))
+        handle = f"acct{rng.randrange(10**4)}"
+        tweets.append({
+            "id": tid,
+            "author": "@" + handle,
+            "created_at": "2025-10-29T%02d:%02d:00Z" % (rng.randrange(24), rng.randrange(60)),
+            "text": f"Update {i}: " + " ".join(rng.choice(["AI", "markets", "rally", "deal", "breach", "rules", "EY",
+                                                           "fintech", "ransomware", "GCC", "بنك", "€"]) for _ in range(25)),
+            "url": f"https://x.com/{handle}/status/{tid}",
+            "retweets": rng.randrange(500), "replies": rng.randrange(100), "likes": rng.randrange(5000),
+            "why_selected": "High engagement from an official account",
+        })
+    return json.dumps({"tweets": tweets, "summary": "Synthetic summary line. " * 4,
+                       "cfo_insights": ["Watch liquidity", "Review AI controls"]}, ensure_ascii=False, indent=2)
+
+
+def synth_exec(rng: random.Random) -> str:
+    sections = ["Cyber attacks", "Regulation", "Audit firms", "M&A", "CFO lessons"]
+    document = "\n\n".join(f"## {s}\n" + "Analysis sentence with context and dates. " * rng.randrange(20, 60)
+                           for s in sections)
+    table = {"title": "M&A table", "headers": ["Date", "Acquirer", "Acquiree", "Size/Valuation", "Rationale"],
+             "rows": [["2025-10-29", f"Acq {r}", f"Target {r}", f"${rng.randrange(1, 90)}bn", "Scale"]
+                      for r in range(rng.randrange(3, 15))]}
+    return json.dumps({"document": document, "highlights": [f"Highlight {h}" for h in range(6)],
+                       "tables": [table], "sources": [{"title": f"Source {k}", "url": f"https://example.com/{k}"}
+                                                       for k in range(12)]}, ensure_ascii=False, indent=2)
+
+
+def malform(content: str, rng: random.Random) -> str:
+    mode = rng.choice(["prose", "quotes", "commas", "fence"])
+    if mode == "prose":
+        return "Sure! Here are the results:\n" + content + "\nLet me know if you need more."
+    if mode == "quotes":
+        return content.replace('"summary": "', "'summary': '", 1).replace('"', "“", 3)
+    if mode == "commas":
+        return content.replace("},\n", "}\n").replace('",\n', '"\n', 5)
+    return "```json\n" + content + "\n```"
+
+
+class MockGrok:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.corpus: Dict[str, List[str]] = {"tweets": [], "exec": [], "reformat": []}
+        self._next: Dict[str, int] = {"tweets": 0, "exec": 0, "reformat": 0}
+        self.seen_prefixes: set = set()
+        if args.corpus:
+            with open(args.corpus, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        rec = json.loads(line)
+                        self.corpus[request_kind(rec["request"])].append(completion_content(rec["response"]))
+
+    def content_for(self, payload: Dict[str, Any]) -> str:
+        kind = request_kind(payload)
+        recorded = self.corpus[kind]
+        if recorded:
+            i = self._next[kind]
+            self._next[kind] = i + 1
+            return recorded[i % len(recorded)]
+        if kind == "exec":
+            return synth_exec(self.rng)
+        prompt = " ".join(str(m.get("content", "")) for m in payload.get("messages", []))
+        if kind == "reformat":
+            # hand back the JSON part of the raw content, repaired if we can
+            raw = prompt.split("RAW CONTENT START:", 1)[-1].rsplit("RAW CONTENT END.", 1)[0]
+            return raw.strip()
+        m = RE_N.search(prompt)
+        return synth_tweets(int(m.group(1)) if m else 5, self.rng)
+
+    def cached_tokens(self, payload: Dict[str, Any]) -> int:
+        """Tokens of a system message already seen (a stand-in for prefix caching)."""
+        messages = payload.get("messages") or []
+        if not messages or messages[0].get("role") != "system":
+            return 0
+        prefix = str(messages[0].get("content", ""))
+        if prefix in self.seen_prefixes:
+            return len(prefix) // 4
+        self.seen_prefixes.add(prefix)
+        return 0
+
+    def latency(self) -> float:
+        a = self.args
+        return max(0.0, (a.latency_ms + self.rng.uniform(-a.jitter_ms, a.jitter_ms)) / 1000.0)
+
+
+def create_app(args: argparse.Namespace) -> FastAPI:
+    mock = MockGrok(args)
+    app = FastAPI(title="Mock Grok")
+    app.state.stats = {"requests": 0, "errors": 0, "truncated": 0, "malformed": 0, "hung": 0}
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok", "stats": app.state.stats}
+
+    @app.post("/v1/chat/completions")
+    async def completions(request: Request):
+        payload = await request.json()
+        stats = app.state.stats
+        stats["requests"] += 1
+        rng = mock.rng
+        delay = mock.latency()
+
+        if rng.random() < args.hang_rate:
+            stats["hung"] += 1
+            await asyncio.sleep(args.hang_seconds)
+        if rng.random() < args.error_rate:
+            stats["errors"] += 1
+            await asyncio.sleep(delay / 4)
+            status = rng.choice([429, 500, 503])
+            return JSONResponse({"error": {"message": f"injected {status}"}}, status_code=status,
+                                headers={"Retry-After": "1"} if status == 429 else None)
+
+        content = mock.content_for(payload)
+        if rng.random() < args.truncate_rate:
+            stats["truncated"] += 1
+            content = content[: int(len(content) * rng.uniform(0.5, 0.95))]
+        elif rng.random() < args.malformed_rate:
+            stats["malformed"] += 1
+            content = malform(content, rng)
+
+        prompt_chars = sum(len(str(m.get("content", ""))) for m in payload.get("messages", []))
+        usage = {"prompt_tokens": prompt_chars // 4, "completion_tokens": len(content) // 4,
+                 "total_tokens": (prompt_chars + len(content)) // 4,
+                 "prompt_tokens_details": {"cached_tokens": mock.cached_tokens(payload)}}
+
+        if payload.get("stream"):
+            chunk = args.stream_chunk_chars
+            pieces = [content[i:i + chunk] for i in range(0, len(content), chunk)] or [""]
+
+            async def events():
+                per_piece = delay / len(pieces)
+                for piece in pieces:
+                    await asyncio.sleep(per_piece)
+                    yield "data: " + json.dumps({"choices": [{"delta": {"content": piece}}]}) + "\n\n"
+                yield "data: " + json.dumps({"choices": [], "usage": usage}) + "\n\n"
+                yield "data: [DONE]\n\n"
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        await asyncio.sleep(delay)
+        return {
+            "id": f"mock-{stats['requests']}",
+            "object": "chat.completion",
+            "model": payload.get("model", "grok-3"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage,
+        }
+
+    return app
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=9100)
+    p.add_argument("--corpus", default="", help="JSONL corpus recorded with GROK_RECORD_PATH")
+    p.add_argument("--latency-ms", type=float, default=500)
+    p.add_argument("--jitter-ms", type=float, default=200)
+    p.add_argument("--truncate-rate", type=float, default=0.0)
+    p.add_argument("--malformed-rate", type=float, default=0.0)
+    p.add_argument("--error-rate", type=float, default=0.0)
+    p.add_argument("--hang-rate", type=float, default=0.0, help="fraction of requests that stall (timeouts)")
+    p.add_argument("--hang-seconds", type=float, default=300)
+    p.add_argument("--stream-chunk-chars", type=int, default=24)
+    p.add_argument("--seed", type=int, default=1234)
+    return p.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    uvicorn.run(create_app(args), host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,327 @@
+# bench/run_bench.py
+"""
+Offline benchmark suite.
+
+    # 1. record real Grok traffic into a replay corpus (uses GROK_API_KEY, costs quota once)
+    python bench/run_bench.py record --corpus bench/corpus.jsonl --topics ai,cyber,ma --exec
+
+    # 2. parser micro-suite over the corpus (or synthetic payloads without --corpus)
+    python bench/run_bench.py parse --corpus bench/corpus.jsonl --out parse.json
+
+    # 3. end-to-end load: app + local mock Grok, concurrent clients
+    python bench/run_bench.py e2e --corpus bench/corpus.jsonl --concurrency 16 --requests 200 \
+        --latency-ms 800 --truncate-rate 0.1 --out e2e.json
+
+    # compare two result files (e.g. from two commits)
+    python bench/run_bench.py compare before.json after.json
+
+Latencies are reported as p50/p95/p99 in ms, throughput as requests (or calls) per second.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import subprocess
+from collections import Counter
+from typing import Any, Dict, List
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {"count": 0}
+    s = sorted(samples)
+
+    def pct(p):
+        return s[min(len(s) - 1, int(round(p / 100.0 * (len(s) - 1))))]
+    return {"count": len(s), "p50_ms": round(pct(50) * 1000, 3), "p95_ms": round(pct(95) * 1000, 3),
+            "p99_ms": round(pct(99) * 1000, 3), "max_ms": round(s[-1] * 1000, 3)}
+
+
+def git_rev() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, text=True).strip()
+    except Exception:
+        return ""
+
+
+def write_results(results: Dict[str, Any], out: str) -> None:
+    results = dict(results, commit=git_rev(), recorded_at=time.strftime("%Y-%m-%dT%H:%M:%S"))
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    if out:
+        with open(out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+
+def wait_ready(url: str, proc: subprocess.Popen, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"process for {url} exited with {proc.returncode}")
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} not ready after {timeout}s")
+
+
+def start_app(port: int, env_overrides: Dict[str, str]) -> subprocess.Popen:
+    env = dict(os.environ, TWEET_STORE_PATH="", PREFETCH_ENABLED="0")
+    env.update(env_overrides)
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+                            cwd=REPO_DIR, env=env)
+    wait_ready(f"http://127.0.0.1:{port}/ping", proc)
+    return proc
+
+
+def stop(proc: subprocess.Popen) -> None:
+    proc.terminate()
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+# ----------------------
+# record: drive the real app once with GROK_RECORD_PATH set
+# ----------------------
+def cmd_record(args: argparse.Namespace) -> None:
+    if not os.getenv("GROK_API_KEY"):
+        sys.exit("record needs a real GROK_API_KEY in the environment")
+    proc = start_app(args.port, {"GROK_RECORD_PATH": os.path.abspath(args.corpus)})
+    try:
+        base = f"http://127.0.0.1:{args.port}"
+        with httpx.Client(base_url=base, timeout=600) as client:
+            for topic in [t for t in args.topics.split(",") if t]:
+                r = client.get("/get_summary", params={"topic": topic, "n": args.n, "fresh": True})
+                print(f"recorded topic={topic}: {r.status_code} source={r.json().get('source')}")
+            if args.exec:
+                r = client.get("/get_exec_summary", params={"fresh": True})
+                print(f"recorded exec: {r.status_code} source={r.json().get('source')}")
+    finally:
+        stop(proc)
+
+
+# ----------------------
+# parse: replay corpus contents through the local parsing stages
+# ----------------------
+def load_contents(corpus: str) -> List[Dict[str, str]]:
+    from mock_grok import request_kind, completion_content, synth_tweets, synth_exec, malform
+    items = []
+    if corpus:
+        with open(corpus, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    rec = json.loads(line)
+                    items.append({"kind": request_kind(rec["request"]), "content": completion_content(rec["response"])})
+        return items
+    rng = random.Random(7)
+    for i in range(60):
+        content = synth_tweets(rng.choice([5, 10, 25]), rng)
+        if i % 3 == 1:
+            content = content[: int(len(content) * 0.8)]
+        elif i % 3 == 2:
+            content = malform(content, rng)
+        items.append({"kind": "tweets", "content": content})
+    for i in range(20):
+        content = synth_exec(rng)
+        items.append({"kind": "exec", "content": content[: int(len(content) * 0.85)] if i % 2 else content})
+    return items
+
+
+def time_calls(fn, contents: List[str], repeat: int) -> Dict[str, Any]:
+    samples = []
+    total_bytes = 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for c in contents:
+            t0 = time.perf_counter()
+            try:
+                fn(c)
+            except ValueError:
+                pass
+            samples.append(time.perf_counter() - t0)
+            total_bytes += len(c)
+    elapsed = time.perf_counter() - started
+    return dict(percentiles(samples), calls_per_s=round(len(samples) / elapsed, 1),
+                mb_per_s=round(total_bytes / elapsed / 1e6, 2))
+
+
+def cmd_parse(args: argparse.Namespace) -> None:
+    import main
+    items = load_contents(args.corpus)
+    tweets = [main.clean_tweet_content(i["content"]) for i in items if i["kind"] != "exec"]
+    execs = [main.clean_exec_content(i["content"]) for i in items if i["kind"] == "exec"]
+    results = {"suite": "parse", "corpus": args.corpus or "synthetic", "items": len(items), "stages": {}}
+    if tweets:
+        results["stages"]["extract_json_from_text[tweets]"] = time_calls(main.extract_json_from_text, tweets, args.repeat)
+        results["stages"]["find_all_tweet_like_blocks"] = time_calls(main.find_all_tweet_like_blocks, tweets, args.repeat)
+    if execs:
+        results["stages"]["extract_json_from_text[exec]"] = time_calls(main.extract_json_from_text, execs, args.repeat)
+    write_results(results, args.out)
+
+
+# ----------------------
+# e2e: app under concurrent load against the mock upstream
+# ----------------------
+async def run_load(base: str, paths: List[str], concurrency: int, total: int, timeout: float) -> Dict[str, Any]:
+    latencies: Dict[str, List[float]] = {p: [] for p in paths}
+    statuses: Counter = Counter()
+    sources: Counter = Counter()
+    counter = iter(range(total))
+
+    async def worker(client: httpx.AsyncClient):
+        for i in counter:
+            path = paths[i % len(paths)]
+            t0 = time.perf_counter()
+            try:
+                r = await client.get(path)
+                statuses[r.status_code] += 1
+                body = r.json()
+                sources[body.get("source") or ("error" if "error" in body else "none")] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+            latencies[path].append(time.perf_counter() - t0)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base, timeout=timeout, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*[worker(client) for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+    all_samples = [x for v in latencies.values() for x in v]
+    return {
+        "requests": len(all_samples),
+        "elapsed_s": round(elapsed, 3),
+        "rps": round(len(all_samples) / elapsed, 2),
+        "latency": percentiles(all_samples),
+        "by_endpoint": {p: percentiles(v) for p, v in latencies.items()},
+        "status_codes": {str(k): v for k, v in statuses.items()},
+        "sources": dict(sources),
+    }
+
+
+def cmd_e2e(args: argparse.Namespace) -> None:
+    mock_cmd = [sys.executable, os.path.join(BENCH_DIR, "mock_grok.py"), "--port", str(args.mock_port),
+                "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+                "--truncate-rate", str(args.truncate_rate), "--malformed-rate", str(args.malformed_rate),
+                "--error-rate", str(args.error_rate), "--hang-rate", str(args.hang_rate)]
+    if args.corpus:
+        mock_cmd += ["--corpus", os.path.abspath(args.corpus)]
+    mock = subprocess.Popen(mock_cmd, cwd=REPO_DIR)
+    app = None
+    try:
+        wait_ready(f"http://127.0.0.1:{args.mock_port}/health", mock)
+        app_env = {"GROK_API_KEY": "bench", "GROK_API_URL": f"http://127.0.0.1:{args.mock_port}/v1/chat/completions"}
+        for kv in args.app_env:
+            k, _, v = kv.partition("=")
+            app_env[k] = v
+        app = start_app(args.port, app_env)
+        fresh = "" if args.use_cache else "&fresh=true"
+        paths = []
+        for endpoint in args.endpoints.split(","):
+            if endpoint == "summary":
+                paths += [f"/get_summary?topic={t}&n={args.n}{fresh}" for t in args.topics.split(",")]
+            elif endpoint == "exec":
+                paths.append(f"/get_exec_summary?{fresh.lstrip('&')}")
+            elif endpoint == "batch":
+                paths.append(f"/get_summaries?topics={args.topics}&n={args.n}{fresh}")
+        load = asyncio.run(run_load(f"http://127.0.0.1:{args.port}", paths, args.concurrency, args.requests, args.timeout))
+        mock_stats = httpx.get(f"http://127.0.0.1:{args.mock_port}/health").json()["stats"]
+        results = {"suite": "e2e", "config": {k: v for k, v in vars(args).items() if k != "func"},
+                   "upstream": mock_stats, **load}
+        write_results(results, args.out)
+    finally:
+        if app is not None:
+            stop(app)
+        stop(mock)
+
+
+# ----------------------
+# compare: p50/p95/p99 and throughput deltas between two result files
+# ----------------------
+def _flatten(d: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    out = {}
+    for k, v in d.items():
+        key = f"{prefix}{k}"
+        if isinstance(v, dict) and k not in ("config", "upstream", "status_codes", "sources"):
+            out.update(_flatten(v, key + "."))
+        elif isinstance(v, (int, float)) and not isinstance(v, bool) and \
+                (k.endswith("_ms") or k in ("rps", "calls_per_s", "mb_per_s")):
+            out[key] = v
+    return out
+
+
+def cmd_compare(args: argparse.Namespace) -> None:
+    with open(args.before, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(args.after, encoding="utf-8") as f:
+        after = json.load(f)
+    a, b = _flatten(before), _flatten(after)
+    print(f"{'metric':<60}{before.get('commit', 'before'):>12}{after.get('commit', 'after'):>12}{'change':>10}")
+    for key in sorted(set(a) & set(b)):
+        change = (b[key] - a[key]) / a[key] * 100 if a[key] else 0.0
+        print(f"{key:<60}{a[key]:>12}{b[key]:>12}{change:>+9.1f}%")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("record", help="record real Grok responses into a JSONL corpus")
+    p.add_argument("--corpus", default=os.path.join(BENCH_DIR, "corpus.jsonl"))
+    p.add_argument("--topics", default="ai,cyber,regulation,ma,market,audit")
+    p.add_argument("--n", type=int, default=10)
+    p.add_argument("--exec", action="store_true", help="also record one executive briefing")
+    p.add_argument("--port", type=int, default=9200)
+    p.set_defaults(func=cmd_record)
+
+    p = sub.add_parser("parse", help="replay corpus contents through the parsing stages")
+    p.add_argument("--corpus", default="")
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--out", default="")
+    p.set_defaults(func=cmd_parse)
+
+    p = sub.add_parser("e2e", help="end-to-end throughput/latency against the mock upstream")
+    p.add_argument("--corpus", default="")
+    p.add_argument("--endpoints", default="summary,exec", help="comma list of summary, exec, batch")
+    p.add_argument("--topics", default="ai,cyber,regulation,ma,market,audit")
+    p.add_argument("--n", type=int, default=5)
+    p.add_argument("--concurrency", type=int, default=16)
+    p.add_argument("--requests", type=int, default=200)
+    p.add_argument("--timeout", type=float, default=300)
+    p.add_argument("--use-cache", action="store_true", help="don't send fresh=true (measures cache hits too)")
+    p.add_argument("--latency-ms", type=float, default=500)
+    p.add_argument("--jitter-ms", type=float, default=200)
+    p.add_argument("--truncate-rate", type=float, default=0.0)
+    p.add_argument("--malformed-rate", type=float, default=0.0)
+    p.add_argument("--error-rate", type=float, default=0.0)
+    p.add_argument("--hang-rate", type=float, default=0.0)
+    p.add_argument("--app-env", action="append", default=[], metavar="KEY=VALUE",
+                   help="extra environment for the app under test (repeatable)")
+    p.add_argument("--port", type=int, default=9201)
+    p.add_argument("--mock-port", type=int, default=9100)
+    p.add_argument("--out", default="")
+    p.set_defaults(func=cmd_e2e)
+
+    p = sub.add_parser("compare", help="compare two result files")
+    p.add_argument("before")
+    p.add_argument("after")
+    p.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,15 +4,50 @@ print(">>> FastAPI app loading successfully. lol sujay")
 import os
 import re
 import json
-import requests
-from typing import List, Dict, Any, Optional
-from fastapi import FastAPI, Query
+import time
+import random
+import asyncio
+import gzip
+import heapq
+import math
+import sqlite3
+import hashlib
+import mimetypes
+import threading
+import secrets
+import cProfile
+import pstats
+import collections.abc
+import httpx
+from email.utils import formatdate
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field, fields, replace
+from functools import lru_cache, wraps
+from typing import List, Dict, Any, Optional, Tuple, Callable, Awaitable, AsyncIterator
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from fastapi import FastAPI, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from dotenv import load_dotenv
 from datetime import datetime, timedelta, timezone
 
+try:
+    import brotli
+except ImportError:  # optional: without it responses are gzip-encoded only
+    brotli = None
+
+try:
+    import numpy as np
+except ImportError:  # optional: without it near-duplicate clustering is skipped
+    np = None
+
+try:
+    import orjson
+except ImportError:  # optional: without it responses are encoded with the stdlib json module
+    orjson = None
+
 TOPIC_INSTRUCTIONS = {
     "ai": (
         "Return tweets strictly about AI developments, deployments, or AI adoption in industries or countries. "
@@ -39,21 +74,112 @@ TOPIC_INSTRUCTIONS = {
     )
 }
 
+# ----------------------
+# Schemas for the structured items Grok returns (tweets, exec tables, sources).
+# The dataclasses are never instantiated: each field carries its example value for
+# the prompt schemas below and its validation / truncation limits, and clean() turns
+# a decoded object into the plain dict kept in the caches, the tweet store and on
+# the wire, so the schema and the sanitizers share one definition.
+# ----------------------
+MODEL_MAX_COLUMNS = 32
+MAX_ENGAGEMENT_COUNT = 10 ** 12
+RE_ENGAGEMENT_COUNT = re.compile(r"(\d[\d,]*(?:\.\d+)?)\s*([kmb]?)", re.IGNORECASE)
+_COUNT_SCALE = {"": 1, "k": 1e3, "m": 1e6, "b": 1e9}
+
+def model_field(example: Any, limit: int = 0, kind: str = "text", max_items: int = 0) -> Any:
+    """
+    kind: "text" (str cut to `limit` chars), "count" (non-negative int, "1.2K" style
+    accepted), "texts" (list of up to `max_items` texts) or "rows" (list of up to
+    `max_items` rows of texts).
+    """
+    metadata = {"example": example, "limit": limit, "kind": kind, "max_items": max_items}
+    if kind in ("texts", "rows"):
+        return field(default_factory=list, metadata=metadata)
+    return field(default=0 if kind == "count" else "", metadata=metadata)
+
+def clip_text(value: Any, limit: int) -> str:
+    return str(value or "")[:limit]
+
+def clip_count(value: Any) -> int:
+    if isinstance(value, bool):
+        return 0
+    if not isinstance(value, (int, float)):
+        m = RE_ENGAGEMENT_COUNT.search(str(value or ""))
+        if not m:
+            return 0
+        value = float(m.group(1).replace(",", "")) * _COUNT_SCALE[m.group(2).lower()]
+    try:
+        return max(0, min(int(value), MAX_ENGAGEMENT_COUNT))
+    except (ValueError, OverflowError):  # nan / inf
+        return 0
+
+def _coerce(kind: str, value: Any, limit: int, max_items: int) -> Any:
+    if kind == "count":
+        return clip_count(value)
+    if kind == "texts":
+        return [clip_text(v, limit) for v in value[:max_items]] if isinstance(value, list) else []
+    if kind == "rows":
+        if not isinstance(value, list):
+            return []
+        return [[clip_text(c, limit) for c in row[:MODEL_MAX_COLUMNS]] for row in value[:max_items] if isinstance(row, list)]
+    return clip_text(value, limit)
+
+@lru_cache(maxsize=None)
+def model_spec(cls: type) -> Tuple[Tuple[str, str, int, int], ...]:
+    return tuple((f.name, f.metadata["kind"], f.metadata["limit"], f.metadata["max_items"]) for f in fields(cls))
+
+class Model:
+    @classmethod
+    def clean(cls, raw: Any) -> Optional[Dict[str, Any]]:
+        """Validated, truncated dict (fields in schema order) from a decoded JSON object; None if it is not an object."""
+        if not isinstance(raw, dict):
+            return None
+        return {name: _coerce(kind, raw.get(name), limit, max_items) for name, kind, limit, max_items in model_spec(cls)}
+
+    @classmethod
+    def example(cls) -> Dict[str, Any]:
+        return {f.name: f.metadata["example"] for f in fields(cls)}
+
+@dataclass
+class Tweet(Model):
+    id: str = model_field("<tweet id>", 32)
+    author: str = model_field("@handle", 48)
+    created_at: str = model_field("YYYY-MM-DDTHH:MM:SSZ", 64)
+    text: str = model_field("exact tweet text (verbatim, no added commentary)", 1000)
+    url: str = model_field("https://x.com/handle/status/<id>", 300)
+    retweets: int = model_field(0, kind="count")
+    replies: int = model_field(0, kind="count")
+    likes: int = model_field(0, kind="count")
+    why_selected: str = model_field("short reason", 300)
+
+@dataclass
+class ExecTable(Model):
+    title: str = model_field("M&A table", 300)
+    headers: List[str] = model_field(["Date", "Acquirer", "Acquiree", "Size/Valuation", "Rationale"], 200,
+                                     kind="texts", max_items=MODEL_MAX_COLUMNS)
+    rows: List[List[str]] = model_field([["2025-10-29", "Acquirer", "Acquiree", "$X", "Reason"]], 1000,
+                                        kind="rows", max_items=500)
+
+@dataclass
+class ExecSource(Model):
+    title: str = model_field("source title", 300)
+    url: str = model_field("https://...", 1000)
+
+def dumps_json(obj: Any) -> bytes:
+    """Compact UTF-8 JSON, through orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def loads_json(data: Any) -> Any:
+    """json.loads through orjson when it is installed (raises ValueError on invalid JSON)."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
 # Strict JSON schema (string) for tweets (unchanged)
 STRICT_SCHEMA_JSON = json.dumps({
-    "tweets": [
-        {
-            "id": "<tweet id>",
-            "author": "@handle",
-            "created_at": "YYYY-MM-DDTHH:MM:SSZ",
-            "text": "exact tweet text (verbatim, no added commentary)",
-            "url": "https://x.com/handle/status/<id>",
-            "retweets": 0,
-            "replies": 0,
-            "likes": 0,
-            "why_selected": "short reason"
-        }
-    ],
+    "tweets": [Tweet.example()],
     "summary": "3-6 line text summarizing the theme / developments",
     "cfo_insights": ["short bullet 1", "short bullet 2"]  # optional but requested
 }, indent=2)
@@ -62,616 +188,3623 @@ STRICT_SCHEMA_JSON = json.dumps({
 EXEC_SCHEMA_JSON = json.dumps({
     "document": "Full executive briefing document as a single string (with sections and dates).",
     "highlights": ["short bullet 1", "short bullet 2"],
-    "tables": [
-        {
-            "title": "M&A table",
-            "headers": ["Date", "Acquirer", "Acquiree", "Size/Valuation", "Rationale"],
-            "rows": [["2025-10-29", "Acquirer", "Acquiree", "$X", "Reason"]]
-        }
-    ],
-    "sources": [
-        {"title": "source title", "url": "https://..."}
-    ]
+    "tables": [ExecTable.example()],
+    "sources": [ExecSource.example()]
 }, indent=2)
 
 load_dotenv()
 
-app = FastAPI(title="Twitter AI News — Grok Backend (Improved JSON extraction & Exec packs)")
+GROK_API_URL = os.getenv("GROK_API_URL", "https://api.x.ai/v1/chat/completions")
+GROK_API_KEY = os.getenv("GROK_API_KEY")
+# when set, every upstream request/response pair is appended to this JSONL file
+# (the replay corpus used by bench/run_bench.py and bench/mock_grok.py)
+GROK_RECORD_PATH = os.getenv("GROK_RECORD_PATH", "")
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# ----------------------
+# Shared upstream HTTP client (one pooled, keep-alive client for every Grok call)
+# ----------------------
+GROK_HTTP2 = os.getenv("GROK_HTTP2", "0").lower() in ("1", "true", "yes")
+GROK_MAX_CONNECTIONS = int(os.getenv("GROK_MAX_CONNECTIONS", "20"))
+GROK_MAX_KEEPALIVE = int(os.getenv("GROK_MAX_KEEPALIVE", "10"))
+GROK_KEEPALIVE_EXPIRY = float(os.getenv("GROK_KEEPALIVE_EXPIRY", "60"))
+GROK_CONNECT_TIMEOUT = float(os.getenv("GROK_CONNECT_TIMEOUT", "10"))
 
-@app.get("/ping")
-def ping():
-    return JSONResponse({"status": "ok"})
+# Upstream admission: at most GROK_MAX_INFLIGHT concurrent Grok calls, at most
+# GROK_MAX_QUEUE callers waiting for a slot; beyond that we shed load with a 503.
+GROK_MAX_INFLIGHT = int(os.getenv("GROK_MAX_INFLIGHT", "8"))
+GROK_MAX_QUEUE = int(os.getenv("GROK_MAX_QUEUE", "16"))
+GROK_RETRY_AFTER = int(os.getenv("GROK_RETRY_AFTER", "5"))
 
-app.mount("/static", StaticFiles(directory="./static"), name="static")
+class UpstreamBusy(Exception):
+    """Raised when the upstream wait queue is full; surfaced to clients as 503 + Retry-After."""
+    client_message = "Server is busy talking to Grok. Try again shortly."
 
-GROK_API_URL = "https://api.x.ai/v1/chat/completions"
-GROK_API_KEY = os.getenv("GROK_API_KEY")
+    def __init__(self, message: str, retry_after: int = GROK_RETRY_AFTER):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def busy_error(exc: UpstreamBusy) -> Dict[str, Any]:
+    return {"error": exc.client_message, "detail": str(exc), "retry_after": exc.retry_after}
+
+class UpstreamLimiter:
+    def __init__(self, max_inflight: int, max_queue: int):
+        self._sem = asyncio.Semaphore(max_inflight)
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.inflight = 0
+        self.waiting = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        if self._sem.locked() and self.waiting >= self.max_queue:
+            raise UpstreamBusy(f"{self.inflight} upstream calls in flight and {self.waiting} queued")
+        self.waiting += 1
+        try:
+            await self._sem.acquire()
+        finally:
+            self.waiting -= 1
+        self.inflight += 1
+        try:
+            yield
+        finally:
+            self.inflight -= 1
+            self._sem.release()
 
 # ----------------------
-# Robust JSON extraction: find balanced JSON objects and try to parse them,
-# prefer the largest valid JSON substring.
+# Upstream quota: token buckets for Grok's requests-per-minute and tokens-per-minute
+# limits, shared by every call (primary, shard, section, reformat, stream). Waiters
+# are admitted strictly in priority order (interactive, then batch, then prefetch;
+# FIFO within a class), and a call whose estimated wait exceeds its time budget is
+# rejected at once instead of queueing into a timeout. 0 disables a limit.
 # ----------------------
-def extract_json_from_text(text: str) -> Any:
+GROK_RPM_LIMIT = float(os.getenv("GROK_RPM_LIMIT", "0"))
+GROK_TPM_LIMIT = float(os.getenv("GROK_TPM_LIMIT", "0"))
+PRIORITY_CLASSES = {"interactive": 0, "batch": 1, "prefetch": 2}
+
+# priority class of the Grok calls made from the current context (batch and prefetch set their own)
+upstream_priority: ContextVar[str] = ContextVar("upstream_priority", default="interactive")
+
+class QuotaExhausted(UpstreamBusy):
+    """Raised when a call cannot be admitted under the RPM/TPM quota within its time budget."""
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def shortfall_seconds(self, amount: float) -> float:
+        """Seconds until `amount` is available, as of the last refill."""
+        return max(0.0, (amount - self.level) / self.rate)
+
+def estimate_tokens(payload: Dict[str, Any]) -> int:
+    """Upper-bound token cost charged up front: prompt (~4 chars/token) plus max_tokens."""
+    chars = sum(len(str(m.get("content", ""))) for m in payload.get("messages", []))
+    return chars // 4 + int(payload.get("max_tokens") or 0)
+
+def usage_tokens(usage: Any) -> Optional[int]:
+    if not isinstance(usage, dict):
+        return None
+    total = usage.get("total_tokens")
+    if total is None and usage.get("prompt_tokens") is not None:
+        total = usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0)
+    return total
+
+class UpstreamQuota:
     """
-    Robust extractor:
-     - scans text and finds all balanced {...} candidate substrings
-     - tries to json.loads each candidate (and also simple quote fixes)
-     - returns the first largest valid JSON object found (by length)
-    Raises ValueError if none parse.
+    Each call is charged one request and its estimated tokens when admitted; settle()
+    corrects the token charge once Grok reports the real usage. A 429 from Grok
+    pauses all admissions for its Retry-After.
     """
-    if not text or not isinstance(text, str):
-        raise ValueError("No text provided for JSON extraction")
+    def __init__(self, rpm: float, tpm: float):
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.paused_until = 0.0
+        self._waiters: List[List[Any]] = []  # heap of [priority rank, seq, tokens, future]
+        self._seq = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
 
-    candidates = []
-    # stack-based scan for balanced braces
-    starts = []
-    for i, ch in enumerate(text):
-        if ch == "{":
-            starts.append(i)
-        elif ch == "}":
-            if starts:
-                start = starts.pop()  # matched start
-                end = i
-                # Only consider candidates with some minimum reasonable length
-                if end - start > 20:
-                    candidates.append(text[start:end+1])
-
-    # sort candidates by length descending so we try largest first
-    candidates = sorted(set(candidates), key=lambda s: -len(s))
-
-    def try_parse(s: str):
-        try:
-            return json.loads(s)
-        except Exception:
-            # quick heuristic fixes same as before
-            fixed = s.replace("“", '"').replace("”", '"').replace("’", "'").replace("\t", " ")
-            try:
-                fixed = re.sub(r"'([A-Za-z0-9_\- ]+)'\s*:", r'"\1":', fixed)
-                fixed = re.sub(r':\s*\'([^\']*)\'', r': "\1"', fixed)
-                return json.loads(fixed)
-            except Exception:
-                return None
+    @property
+    def enabled(self) -> bool:
+        return self.requests is not None or self.tokens is not None
 
-    for cand in candidates:
-        parsed = try_parse(cand)
-        if parsed is not None:
-            return parsed
+    @property
+    def waiting(self) -> int:
+        return sum(1 for w in self._waiters if not w[3].done())
 
-    # Fallback to original approach: try first { ... last } as before
-    first = text.find("{")
-    last = text.rfind("}")
-    if first != -1 and last > first:
-        candidate = text[first:last+1]
-        parsed = try_parse(candidate)
-        if parsed is not None:
-            return parsed
+    def _delay(self, requests: float, tokens: float) -> float:
+        now = time.monotonic()
+        delay = self.paused_until - now
+        for bucket, amount in ((self.requests, requests), (self.tokens, tokens)):
+            if bucket is not None:
+                bucket.refill(now)
+                delay = max(delay, bucket.shortfall_seconds(amount))
+        return max(0.0, delay)
 
-    # If still no JSON found, raise informative error
-    raise ValueError("No valid JSON object found in text (attempted multiple heuristics)")
+    def _charge(self, requests: float, tokens: float) -> None:
+        for bucket, amount in ((self.requests, requests), (self.tokens, tokens)):
+            if bucket is not None:
+                bucket.level = min(bucket.capacity, bucket.level - amount)
 
-# ----------------------
-# Regex extraction fallback for tweets (unchanged)
-# ----------------------
-RE_TWEET_URL = re.compile(r"https?://(?:x\.com|twitter\.com)/(?P<author>[^/\s]+)/status/(?P<id>\d+)", re.IGNORECASE)
-RE_ID = re.compile(r'"id"\s*:\s*"?(?P<id>\d{5,})"?')
-RE_AUTHOR_FIELD = re.compile(r'"author"\s*:\s*"?(?P<author>@?[\w_]{1,30})"?')
-RE_TEXT_FIELD = re.compile(r'"text"\s*:\s*"(?P<text>(?:\\.|[^"\\])*)"', re.S)
-RE_CREATED_AT = re.compile(r'"created_at"\s*:\s*"(?P<created>[^"]+)"')
-RE_WHY = re.compile(r'"why_selected"\s*:\s*"(?P<why>(?:\\.|[^"\\])*)"', re.S)
-RE_SUMMARY_FIELD = re.compile(r'"summary"\s*:\s*"(?P<summary>(?:\\.|[^"\\])*)"', re.S)
+    def estimate_wait(self, tokens: int, rank: int) -> float:
+        """Wait for this call behind every queued call of the same or a higher priority."""
+        ahead = [w for w in self._waiters if w[0] <= rank and not w[3].done()]
+        return self._delay(len(ahead) + 1, sum(w[2] for w in ahead) + tokens)
 
-def find_all_tweet_like_blocks(text: str) -> List[Dict[str, str]]:
-    results: List[Dict[str, str]] = []
-    if not text:
-        return results
-    text_matches = list(RE_TEXT_FIELD.finditer(text))
-    if text_matches:
-        for m in text_matches:
-            start, end = m.span()
-            window_start = max(0, start - 500)
-            window_end = min(len(text), end + 500)
-            window = text[window_start:window_end]
-            tweet = {"id": "", "author": "", "text": "", "url": "", "why_selected": "", "created_at": ""}
-            tweet["text"] = m.group("text").encode('utf-8').decode('unicode_escape') if m.group("text") else ""
-            id_m = RE_ID.search(window)
-            if id_m:
-                tweet["id"] = id_m.group("id")
-            author_m = RE_AUTHOR_FIELD.search(window)
-            if author_m:
-                author = author_m.group("author")
-                if not author.startswith("@"):
-                    author = "@" + author
-                tweet["author"] = author
-            created_m = RE_CREATED_AT.search(window)
-            if created_m:
-                tweet["created_at"] = created_m.group("created")
-            why_m = RE_WHY.search(window)
-            if why_m:
-                tweet["why_selected"] = why_m.group("why").encode('utf-8').decode('unicode_escape')
-            url_m = RE_TWEET_URL.search(window)
-            if url_m:
-                tweet["url"] = url_m.group(0)
-                if not tweet["id"]:
-                    tweet["id"] = url_m.group("id")
-                if not tweet["author"]:
-                    a = url_m.group("author")
-                    if not a.startswith("@"):
-                        a = "@" + a
-                    tweet["author"] = a
-            results.append(tweet)
-    if not results:
-        for url_m in RE_TWEET_URL.finditer(text):
-            tid = url_m.group("id")
-            author_raw = url_m.group("author")
-            author = "@" + author_raw if not author_raw.startswith("@") else author_raw
-            start, end = url_m.span()
-            window = text[max(0, start-200):min(len(text), end+400)]
-            t_m = RE_TEXT_FIELD.search(window)
-            txt = t_m.group("text") if t_m else ""
-            why_m = RE_WHY.search(window)
-            why = why_m.group("why") if why_m else ""
-            created_m = RE_CREATED_AT.search(window)
-            created = created_m.group("created") if created_m else ""
-            results.append({
-                "id": tid,
-                "author": author,
-                "text": txt,
-                "url": url_m.group(0),
-                "why_selected": why,
-                "created_at": created
-            })
-    dedup: Dict[str, Dict[str, str]] = {}
-    for r in results:
-        key = r.get("id") or r.get("url") or r.get("text")[:40]
-        if not key:
-            continue
-        if key in dedup:
-            existing = dedup[key]
-            for f in ("author", "text", "url", "why_selected", "created_at"):
-                if not existing.get(f) and r.get(f):
-                    existing[f] = r.get(f)
-        else:
-            dedup[key] = r
-    return list(dedup.values())
+    def has_headroom(self, tokens: int) -> bool:
+        return not self.enabled or (self.waiting == 0 and self._delay(1, tokens) == 0)
 
-def sanitize_tweet_obj(t: Dict[str, Any]) -> Dict[str, str]:
-    return {
-        "id": str(t.get("id") or "")[:32],
-        "author": str(t.get("author") or "")[:48],
-        "created_at": str(t.get("created_at") or "")[:64],
-        "text": str(t.get("text") or "")[:1000],
-        "url": str(t.get("url") or "")[:300],
-        "why_selected": str(t.get("why_selected") or "")[:300]
-    }
+    async def acquire(self, tokens: int, priority: str, timeout: float) -> int:
+        """Wait for admission; returns the tokens charged (pass them to settle())."""
+        if not self.enabled:
+            return 0
+        if self.tokens is not None:
+            tokens = min(tokens, int(self.tokens.capacity))  # a call larger than the bucket would never fit
+        rank = PRIORITY_CLASSES.get(priority, 0)
+        wait = self.estimate_wait(tokens, rank)
+        if wait > timeout:
+            QUOTA_REJECTIONS.labels(priority).inc()
+            raise QuotaExhausted(f"Grok quota would admit this {priority} call in {wait:.1f}s, "
+                                 f"its budget is {timeout:.1f}s", retry_after=int(wait) + 1)
+        started = time.monotonic()
+        fut = asyncio.get_running_loop().create_future()
+        self._seq += 1
+        heapq.heappush(self._waiters, [rank, self._seq, tokens, fut])
+        self._dispatch()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self._charge(-1, -tokens)  # admitted but never sent
+            self._dispatch()
+            raise
+        UPSTREAM_QUOTA_WAIT_SECONDS.labels(priority).observe(time.monotonic() - started)
+        return tokens
 
-# ----------------------
-# Exec prompt builder (explicitly requests machine-readable tables)
-# ----------------------
-def build_exec_prompt(countries: List[str], start_iso: str, end_iso: str) -> Dict[str, Any]:
-    countries_text = ", ".join(countries)
-    user_brief = (
-        "Prepare Executive Briefing Pack covering regulatory developments, AI developments in tech "
-        "and in deployment/adoption by different industries/countries, M&A update deals executed and its details, "
-        "cyberattack. Discuss with date of events and cover your analysis in last 24 hours.\n\n"
-        "Cyber attack : New attacks reported in different parts of world, details of incident, impact it caused, "
-        "segregate that into private sector, govt sector, who caused it, what sort of attack (e.g., ransomware) and recovery efforts. "
-        "If no attack, bring recovery efforts underway for earlier reported incidents.\n\n"
-        "Rules and regulations development : in fintech, banking, different industries related regulatory new updates, crypto world developments, "
-        "accounting, taxation, insurance, law, data privacy, auditing - only new updates.\n\n"
-        "Audit /consulting firms news update : It can cover audit firms related news such as EY/KPMG/PwC related actions - violation/fines/use of AI/Deployment of AI in finance/audit world.\n\n"
-        "Mergers & Acquisitions : New deals announced, acquirer, acquiree, size, valuation metrics, rationale, impact, valuation basis.\n\n"
-        "Give citation references from where details sought so users can click and expand more. General CFO - Lessons from the above - just summary lines."
-    )
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._waiters:
+            _, _, tokens, fut = self._waiters[0]
+            if fut.done():
+                heapq.heappop(self._waiters)
+                continue
+            delay = self._delay(1, tokens)
+            if delay > 0:
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+            heapq.heappop(self._waiters)
+            self._charge(1, tokens)
+            fut.set_result(None)
 
-    do_not_rules = (
-        "Return only a single VALID JSON object and nothing else. Use double quotes only. "
-        "Do NOT include salutations, greetings, 'Hello', 'Hi', 'Dear', or conversational openers. "
-        "Start the `document` content directly with the briefing title or first section (no preamble). "
-        "The `document` field should be readable and may include Markdown (including markdown tables). "
-        "Additionally, include a machine-readable `tables` array: each table entry must be {title, headers: [...], rows: [[...],[...]]}. "
-        "If you include a visual table inside `document`, also include the same table in `tables` for programmatic use."
-    )
+    def settle(self, charged: int, actual: Optional[int]) -> None:
+        """Replace the up-front token charge with the usage Grok reported (None: keep it)."""
+        if self.tokens is None or actual is None or charged == actual:
+            return
+        self._charge(0, actual - charged)
+        if self._waiters:
+            self._dispatch()
 
-    prompt_text = (
-        "You are an assistant that prepares high-quality Executive Briefing Packs for senior executives.\n\n"
-        "Output Requirement:\n"
-        "Return a STRICT, valid JSON object using the exact schema below (no extra keys, no commentary):\n\n"
-        f"{EXEC_SCHEMA_JSON}\n\n"
-        "Instructions:\n"
-        f"- TIME WINDOW: Only consider news and social posts published between {start_iso} (inclusive) and {end_iso} (inclusive) — i.e., the last 24 hours.\n"
-        f"- SCOPE: Limit your search and synthesis to events and reporting relating to these countries ONLY: {countries_text}.\n"
-        f"- FORMAT: Provide the briefing in `document` (readable text). If there are tabular items (e.g., M&A or deals), embed a readable Markdown table in `document` and ALSO include a corresponding structured object in `tables`.\n\n"
-        f"USER BRIEF:\n{user_brief}\n\n"
-        f"Other rules:\n{do_not_rules}\n\n"
-        "If you cannot find content for a subsection, explicitly state 'No material new items in the last 24 hours' for that subsection but provide a short analytical comment. Always return valid JSON even if some arrays are empty."
-    )
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        if self._waiters:
+            self._dispatch()
 
-    payload = {
-        "model": "grok-3",
-        "messages": [
-            {"role": "system", "content": "You are a precise briefing writer. Output valid JSON only."},
-            {"role": "user", "content": prompt_text}
-        ],
-        # increased to reduce truncation (model limits permitting)
-        "temperature": 0.0,
-        "max_tokens": 3500
-    }
+def retry_after_seconds(resp: httpx.Response) -> float:
+    try:
+        return float(resp.headers.get("retry-after", GROK_RETRY_AFTER))
+    except ValueError:
+        return float(GROK_RETRY_AFTER)
+
+# ----------------------
+# Circuit breaker around the Grok upstream: it opens when the failure or timeout rate
+# of the recent calls crosses its threshold, and while open every call fails at once
+# with CircuitOpen (503 + Retry-After). After GROK_BREAKER_OPEN_SECONDS it goes
+# half-open and lets GROK_BREAKER_PROBES calls through: all of them succeeding closes
+# it, any of them failing reopens it. Timeouts, 5xx and transport errors count as
+# failures; 429 (handled by the quota) and other 4xx do not. A timeout only counts when
+# the call had its full timeout, not when a client's ?deadline= cut it short.
+# ----------------------
+GROK_BREAKER_ENABLED = os.getenv("GROK_BREAKER_ENABLED", "1").lower() in ("1", "true", "yes")
+GROK_BREAKER_WINDOW = int(os.getenv("GROK_BREAKER_WINDOW", "20"))  # most recent calls considered
+GROK_BREAKER_WINDOW_SECONDS = float(os.getenv("GROK_BREAKER_WINDOW_SECONDS", "300"))
+GROK_BREAKER_MIN_CALLS = int(os.getenv("GROK_BREAKER_MIN_CALLS", "5"))
+GROK_BREAKER_FAILURE_RATE = float(os.getenv("GROK_BREAKER_FAILURE_RATE", "0.5"))
+GROK_BREAKER_TIMEOUT_RATE = float(os.getenv("GROK_BREAKER_TIMEOUT_RATE", "0.3"))
+GROK_BREAKER_OPEN_SECONDS = float(os.getenv("GROK_BREAKER_OPEN_SECONDS", "30"))
+GROK_BREAKER_PROBES = int(os.getenv("GROK_BREAKER_PROBES", "2"))
 
-    return {"prompt": prompt_text, "payload": payload}
+class CircuitOpen(UpstreamBusy):
+    """Raised without calling Grok while the breaker is open or its half-open probes are taken."""
+    client_message = "Grok is currently unavailable (circuit breaker open). Try again shortly."
 
+def breaker_outcome(exc: Optional[BaseException]) -> str:
+    """Classify a call that reached Grok: "ok", "timeout" or "failure"."""
+    if exc is None:
+        return "ok"
+    if isinstance(exc, httpx.TimeoutException):
+        return "timeout"
+    if isinstance(exc, httpx.HTTPStatusError):
+        return "failure" if exc.response.status_code >= 500 else "ok"
+    return "failure"
 
-def build_grok_prompt(topic: str, n: int, prefer_verified: bool = True) -> Dict[str, Any]:
+def breaker_result(outcome: Optional[str], full_timeout: bool) -> Optional[str]:
     """
-    Build the payload (prompt + model args) to send to Grok for tweet extraction.
-    Returns a dict with keys: 'prompt' (str) and 'payload' (dict for requests.post).
+    The outcome a call reports to the breaker: a timeout only counts when the call had
+    its full timeout. A call cut short by the client's own ?deadline= says nothing about
+    Grok's health, so it is released like a call that never reached Grok (None).
     """
-    # Compute last-24-hours window in ISO8601 (UTC)
-    now_utc = datetime.now(timezone.utc)
-    start_utc = now_utc - timedelta(hours=24)
-    start_iso = start_utc.replace(microsecond=0).isoformat()
-    end_iso = now_utc.replace(microsecond=0).isoformat()
+    return None if outcome == "timeout" and not full_timeout else outcome
 
-    # Ensure we have a topic-specific instruction
-    topic_key = topic.lower()
-    topic_instr = TOPIC_INSTRUCTIONS.get(topic_key, f"Return tweets strictly about {topic}.")
+class CircuitBreaker:
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.probes = 0  # half-open probes in flight
+        self.probe_successes = 0
+        self._outcomes: deque = deque(maxlen=GROK_BREAKER_WINDOW)  # (monotonic time, outcome)
 
-    # explicit "do not" rules and data expectations
-    do_not_rules = (
-        "Do NOT paraphrase or rewrite the tweet text field — return the tweet text EXACTLY as posted (verbatim). "
-        "Do NOT add commentary inline. Do NOT invent URLs. If you cannot determine the exact tweet URL or it is not available, set url to \"\". "
-        "All dates must be ISO 8601 (UTC). Use double quotes only. Output only a single top-level JSON object and nothing else."
-    )
+    def rates(self) -> Tuple[int, float, float]:
+        """(calls in the window, failure rate, timeout rate); timeouts count as failures too."""
+        now = time.monotonic()
+        while self._outcomes and now - self._outcomes[0][0] > GROK_BREAKER_WINDOW_SECONDS:
+            self._outcomes.popleft()
+        calls = len(self._outcomes)
+        if not calls:
+            return 0, 0.0, 0.0
+        timeouts = sum(1 for _, o in self._outcomes if o == "timeout")
+        failures = timeouts + sum(1 for _, o in self._outcomes if o == "failure")
+        return calls, failures / calls, timeouts / calls
 
-    # Ranking guidance
-    ranking = (
-        "Return up to {n} tweets, ranked primarily by engagement (likes+retweets+replies) and secondarily by recency. "
-        "Prefer tweets from authoritative/verified accounts and official sources when available. "
-    ).format(n=n)
+    def retry_after(self) -> int:
+        return max(1, int(self.opened_at + GROK_BREAKER_OPEN_SECONDS - time.monotonic()) + 1)
 
-    # Build the full instruction prompt
-    prompt_text = (
-        "You are an assistant that searches Twitter/X for very recent, high-quality posts.\n\n"
-        "Output Requirement:\n"
-        "Return a STRICT, valid JSON object using the exact schema below (no extra keys, no commentary):\n\n"
-        f"{STRICT_SCHEMA_JSON}\n\n"
-        "Search & filtering instructions:\n"
-        f"- TIME WINDOW: Only consider tweets posted between {start_iso} (inclusive) and {end_iso} (inclusive) — i.e., the last 24 hours.\n"
-        f"- TOPIC: {topic_instr}\n"
-        f"- RANKING: {ranking}\n"
-        f"- PREFER_VERIFIED: {'Yes' if prefer_verified else 'No'}\n\n"
-        "Field rules and details:\n"
-        "- tweet.text must be EXACT verbatim tweet text (do not summarize or paraphrase). Replace newline characters with a single space.\n"
-        "- tweet.created_at must be ISO 8601 UTC (e.g. 2025-10-27T14:23:00Z). If you cannot get exact timestamp, set created_at to empty string.\n"
-        "- tweet.url must be the canonical X/Twitter URL of the tweet if available (https://x.com/<handle>/status/<id>). If you cannot reliably provide the URL, set it to \"\".\n"
-        "- Provide engagement numbers (retweets, replies, likes) if available; otherwise set to 0.\n"
-        "- why_selected: one short sentence (<= 120 chars) explaining why this tweet was chosen.\n\n"
-        f"Other rules:\n{do_not_rules}\n\n"
-        "If you are unable to return the fully valid JSON (for example due to truncation), return the best-effort JSON object that remains valid JSON (do not return text or code blocks)."
-    )
+    def acquire(self) -> bool:
+        """Admit a call or raise CircuitOpen; returns True if the call is a half-open probe."""
+        if not self.enabled:
+            return False
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < GROK_BREAKER_OPEN_SECONDS:
+                BREAKER_REJECTIONS.inc()
+                raise CircuitOpen(f"Grok circuit breaker open, next probe in {self.retry_after()}s",
+                                  retry_after=self.retry_after())
+            self._transition("half_open")
+        if self.state == "half_open":
+            if self.probes >= GROK_BREAKER_PROBES:
+                BREAKER_REJECTIONS.inc()
+                raise CircuitOpen(f"Grok circuit breaker half-open, {self.probes} probe calls in flight")
+            self.probes += 1
+            return True
+        return False
 
-    # Build model payload
-    payload = {
-        "model": "grok-3",
-        "messages": [
-            {"role": "system", "content": "You are a precise data extractor. Output valid JSON only."},
-            {"role": "user", "content": prompt_text}
-        ],
-        "temperature": 0.0,
-        "max_tokens": 1400
-    }
+    def release(self, probe: bool, outcome: Optional[str]) -> None:
+        """Report how an admitted call ended; None if it never reached Grok or was cancelled."""
+        if not self.enabled:
+            return
+        if probe:
+            self.probes -= 1
+            if self.state != "half_open" or outcome is None:
+                return
+            if outcome != "ok":
+                self._open()
+                return
+            self.probe_successes += 1
+            if self.probe_successes >= GROK_BREAKER_PROBES:
+                self._transition("closed")
+            return
+        if outcome is None or self.state != "closed":
+            return  # calls admitted before the breaker opened don't count
+        self._outcomes.append((time.monotonic(), outcome))
+        calls, failure_rate, timeout_rate = self.rates()
+        if calls >= GROK_BREAKER_MIN_CALLS and (failure_rate >= GROK_BREAKER_FAILURE_RATE
+                                                or timeout_rate >= GROK_BREAKER_TIMEOUT_RATE):
+            self._open()
+
+    def _open(self) -> None:
+        self.opened_at = time.monotonic()
+        self._transition("open")
 
-    return {"prompt": prompt_text, "payload": payload}
+    def _transition(self, state: str) -> None:
+        self.state = state
+        self.probe_successes = 0
+        if state == "closed":
+            self._outcomes.clear()
+        BREAKER_TRANSITIONS.labels(state).inc()
+        print(f">>> Grok circuit breaker {state}")
+
+    def status(self) -> Dict[str, Any]:
+        if not self.enabled:
+            return {"state": "disabled"}
+        calls, failure_rate, timeout_rate = self.rates()
+        status = {"state": self.state, "recent_calls": calls,
+                  "failure_rate": round(failure_rate, 3), "timeout_rate": round(timeout_rate, 3)}
+        if self.state == "open":
+            status["retry_after"] = self.retry_after()
+        elif self.state == "half_open":
+            status["probes_in_flight"] = self.probes
+        return status
 
 # ----------------------
-# Standard tweet endpoint (unchanged logic)
+# Model routing: every Grok call names its route (primary extraction, exec generation,
+# JSON reformat, ...), and the route picks the model, caps max_tokens and sets the
+# call's timeout. Reformat routes only restructure text that already exists, so they
+# use the fast model with a budget sized from their input. A route with a fallback
+# model is demoted to it for GROK_ROUTE_DEMOTE_SECONDS when the p95 latency or the
+# failure rate of its recent calls crosses the route's limits; after that the primary
+# model gets another window. As for the breaker, calls cut short by a client's
+# ?deadline= are not counted. A response any of whose calls ran on a demoted route
+# names the model used in `demoted_routes`. The exec route is not demoted by
+# default: generations close to its long timeout are normal there. GROK_MODEL_ROUTES
+# (JSON, e.g. {"exec": {"fallback": "grok-3-mini", "demote_p95": 160}}) overrides
+# route fields.
 # ----------------------
-@app.get("/")
-def serve_frontend():
-    print("HELLO BANSAL")
-    return FileResponse("./static/index.html")
+GROK_MODEL = os.getenv("GROK_MODEL", "grok-3")
+GROK_FAST_MODEL = os.getenv("GROK_FAST_MODEL", "grok-3-mini")
+GROK_ROUTE_WINDOW = int(os.getenv("GROK_ROUTE_WINDOW", "50"))  # recent calls per route considered
+GROK_ROUTE_MIN_SAMPLES = int(os.getenv("GROK_ROUTE_MIN_SAMPLES", "10"))
+GROK_ROUTE_DEMOTE_SECONDS = float(os.getenv("GROK_ROUTE_DEMOTE_SECONDS", "300"))
 
-@app.get("/get_summary")
-def get_summary(
-    topic: str = Query(..., description="Topic such as finance, cyber, regulation, etc"),
-    n: int = Query(5, description="Number of top tweets to fetch (prefer <=10)"),
-    raw: bool = Query(False, description="Return raw grok output for debugging")
-):
-    if not GROK_API_KEY:
-        return {"error": "GROK_API_KEY not configured on server (set in .env)"}
+@dataclass(frozen=True)
+class ModelRoute:
+    model: str
+    timeout: float
+    max_tokens: Optional[int] = None  # cap on the payload's own max_tokens (None: keep it)
+    fallback: Optional[str] = None  # faster model to demote to (None: never demoted)
+    demote_p95: Optional[float] = None  # seconds
+    demote_failure_rate: float = 0.5
 
-    gp = build_grok_prompt(topic, n, prefer_verified=True)
-    payload = gp["payload"]
-    headers = {"Authorization": f"Bearer {GROK_API_KEY}", "Content-Type": "application/json"}
+def load_model_routes() -> Dict[str, ModelRoute]:
+    routes = {
+        "summary": ModelRoute(GROK_MODEL, 90, fallback=GROK_FAST_MODEL, demote_p95=60),
+        "exec": ModelRoute(GROK_MODEL, 180),
+        "exec_section": ModelRoute(GROK_MODEL, float(os.getenv("EXEC_SECTION_TIMEOUT", "90")),
+                                   fallback=GROK_FAST_MODEL, demote_p95=60),
+        "summary_reformat": ModelRoute(GROK_FAST_MODEL, 30, max_tokens=4000),
+        "exec_reformat": ModelRoute(GROK_FAST_MODEL, 60, max_tokens=6000),
+    }
+    overrides = json.loads(os.getenv("GROK_MODEL_ROUTES", "") or "{}")
+    for name, changes in overrides.items():
+        routes[name] = replace(routes.get(name) or ModelRoute(GROK_MODEL, 90), **changes)
+    return routes
 
-    try:
-        resp = requests.post(GROK_API_URL, headers=headers, json=payload, timeout=90)
-        resp.raise_for_status()
-        res_json = resp.json()
-
-        content = ""
-        if isinstance(res_json, dict):
-            if "choices" in res_json and res_json["choices"]:
-                ch0 = res_json["choices"][0]
-                content = ch0.get("message", {}).get("content") or ch0.get("text") or ""
-            elif "output" in res_json:
-                if isinstance(res_json["output"], list):
-                    content = " ".join(map(str, res_json["output"]))
-                else:
-                    content = str(res_json["output"])
-            else:
-                content = json.dumps(res_json)
-        else:
-            content = str(res_json)
+MODEL_ROUTES = load_model_routes()
 
-        cleaned_content = content.strip()
-        cleaned_content = re.sub(r'```json|```', '', cleaned_content)
-        cleaned_content = re.sub(r',\s*}', '}', cleaned_content)
-        cleaned_content = re.sub(r',\s*\]', ']', cleaned_content)
-        content = cleaned_content
+def reformat_max_tokens(content: str) -> int:
+    """Output budget for restructuring `content`: about its own size (~4 chars/token) plus JSON framing."""
+    return int(len(content) / 4 * 1.2) + 300
 
-        if raw:
-            return {"raw_response": res_json, "content": content}
+# routes served by their fallback model during the current fetch (route -> model)
+demoted_routes: ContextVar[Optional[Dict[str, str]]] = ContextVar("demoted_routes", default=None)
 
+def reports_demoted_routes(fetch: Callable[..., Awaitable[Dict[str, Any]]]) -> Callable[..., Awaitable[Dict[str, Any]]]:
+    """Decorate a fetch so its result carries `demoted_routes` when any of its calls ran on a fallback model."""
+    @wraps(fetch)
+    async def wrapper(*args: Any, **kwargs: Any) -> Dict[str, Any]:
+        demoted: Dict[str, str] = {}
+        token = demoted_routes.set(demoted)
         try:
-            parsed = extract_json_from_text(content)
-            tweets = parsed.get("tweets", []) or []
-            summary = parsed.get("summary", "") or ""
-            cfo_insights = parsed.get("cfo_insights") or parsed.get("cfo_insights", []) or []
-            sanitized = [sanitize_tweet_obj(t) for t in tweets][:n]
-            return {
-                "topic": topic,
-                "tweets": sanitized,
-                "summary": summary,
-                "cfo_insights": cfo_insights,
-                "source": "grok",
-                "raw_content": None
-            }
-        except Exception as primary_err:
-            fix_prompt = (
-                "The content below was intended to be valid JSON following a strict schema, "
-                "but the returned text appears malformed or truncated. "
-                "Please OUTPUT ONLY a valid JSON object that follows the schema previously requested. "
-                "If a tweet is incomplete, drop it. Keep fields compact and use double quotes.\n\n"
-                "RAW CONTENT START:\n\n" + content + "\n\nRAW CONTENT END."
-            )
-            fix_payload = {
-                "model": "grok-3",
-                "messages": [
-                    {"role": "system", "content": "You are a precise data extractor. Output VALID, STRICT JSON only. Never repeat keys or leave trailing commas."},
-                    {"role": "user", "content": fix_prompt}
-                ],
-                "temperature": 0.0,
-                "max_tokens": 1200
-            }
-            try:
-                fix_resp = requests.post(GROK_API_URL, headers=headers, json=fix_payload, timeout=30)
-                fix_resp.raise_for_status()
-                fix_json = fix_resp.json()
-                fix_content = ""
-                if isinstance(fix_json, dict) and "choices" in fix_json and fix_json["choices"]:
-                    ch0 = fix_json["choices"][0]
-                    fix_content = ch0.get("message", {}).get("content") or ch0.get("text") or ""
-                else:
-                    fix_content = json.dumps(fix_json)
-                try:
-                    parsed2 = extract_json_from_text(fix_content)
-                    tweets = parsed2.get("tweets", []) or []
-                    summary = parsed2.get("summary", "") or ""
-                    cfo_insights = parsed2.get("cfo_insights") or []
-                    sanitized = [sanitize_tweet_obj(t) for t in tweets][:n]
-                    return {
-                        "topic": topic,
-                        "tweets": sanitized,
-                        "summary": summary,
-                        "cfo_insights": cfo_insights,
-                        "source": "grok_reformat",
-                        "raw_content": content
-                    }
-                except Exception as reformat_err:
-                    fallback = find_all_tweet_like_blocks(content)
-                    sanitized = [sanitize_tweet_obj(t) for t in fallback][:n]
-                    summary_m = RE_SUMMARY_FIELD.search(content)
-                    summary_text = summary_m.group("summary") if summary_m else ""
-                    return {
-                        "topic": topic,
-                        "tweets": sanitized,
-                        "summary": summary_text,
-                        "cfo_insights": [],
-                        "source": "regex_fallback",
-                        "raw_content": content,
-                        "parse_error": str(primary_err),
-                        "reformat_error": str(reformat_err)
-                    }
-            except Exception as fix_call_exc:
-                fallback = find_all_tweet_like_blocks(content)
-                sanitized = [sanitize_tweet_obj(t) for t in fallback][:n]
-                summary_m = RE_SUMMARY_FIELD.search(content)
-                summary_text = summary_m.group("summary") if summary_m else ""
-                return {
-                    "topic": topic,
-                    "tweets": sanitized,
-                    "summary": summary_text,
-                    "cfo_insights": [],
-                    "source": "regex_fallback_direct",
-                    "raw_content": content,
-                    "parse_error": str(primary_err),
-                    "reformat_call_error": str(fix_call_exc)
-                }
+            result = await fetch(*args, **kwargs)
+        finally:
+            demoted_routes.reset(token)
+        return with_demoted_routes(result, demoted)
+    return wrapper
 
-    except requests.Timeout:
-        return {"error": "Grok API timed out. Try again later."}
-    except requests.HTTPError as http_err:
-        body = http_err.response.text if (http_err.response is not None) else ""
-        return {"error": f"HTTPError calling Grok: {http_err}", "body": body}
-    except Exception as e:
-        return {"error": str(e)}
+def with_demoted_routes(result: Dict[str, Any], demoted: Dict[str, str]) -> Dict[str, Any]:
+    if not demoted or not isinstance(result, dict) or "error" in result:
+        return result
+    return dict(result, demoted_routes=dict(demoted))
+
+class ModelRouter:
+    """Picks the model for each call from MODEL_ROUTES and demotes routes from their observed outcomes."""
+    def __init__(self, routes: Dict[str, ModelRoute]):
+        self.routes = routes
+        self._samples: Dict[str, deque] = {}  # route -> (latency, outcome) of calls on its primary model
+        self.demoted_until: Dict[str, float] = {}
+
+    def route(self, name: str) -> ModelRoute:
+        return self.routes.get(name) or ModelRoute(GROK_MODEL, 90)
+
+    def model(self, name: str) -> str:
+        route = self.route(name)
+        if route.fallback and self.demoted_until.get(name, 0.0) > time.monotonic():
+            return route.fallback
+        return route.model
+
+    def apply(self, name: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """The payload with the route's current model and max_tokens cap."""
+        route = self.route(name)
+        routed = dict(payload, model=self.model(name))
+        demoted = demoted_routes.get()
+        if demoted is not None and routed["model"] != route.model:
+            demoted[name] = routed["model"]
+        if route.max_tokens is not None:
+            routed["max_tokens"] = min(int(payload.get("max_tokens") or route.max_tokens), route.max_tokens)
+        return routed
+
+    def observe(self, name: str, model: str, seconds: float, outcome: str) -> None:
+        """Record a call that reached Grok; outcome as reported to the breaker (see breaker_result)."""
+        route = self.route(name)
+        if route.fallback is None or model != route.model:
+            return  # only the primary model's calls can demote a route
+        samples = self._samples.setdefault(name, deque(maxlen=GROK_ROUTE_WINDOW))
+        samples.append((seconds, outcome))
+        if len(samples) < GROK_ROUTE_MIN_SAMPLES:
+            return
+        failure_rate, p95 = self.stats(name)
+        if failure_rate >= route.demote_failure_rate or (route.demote_p95 is not None and p95 >= route.demote_p95):
+            self.demoted_until[name] = time.monotonic() + GROK_ROUTE_DEMOTE_SECONDS
+            samples.clear()
+            ROUTE_DEMOTIONS.labels(name).inc()
+            print(f">>> Grok route {name} demoted to {route.fallback} "
+                  f"(failure rate {failure_rate:.2f}, p95 {p95:.1f}s) for {GROK_ROUTE_DEMOTE_SECONDS:g}s")
+
+    def stats(self, name: str) -> Tuple[float, float]:
+        """(failure rate, p95 latency) of the route's recent calls on its primary model."""
+        samples = self._samples.get(name)
+        if not samples:
+            return 0.0, 0.0
+        latencies = sorted(seconds for seconds, _ in samples)
+        failures = sum(1 for _, outcome in samples if outcome != "ok")
+        return failures / len(samples), latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+
+    def status(self) -> Dict[str, Any]:
+        status = {}
+        for name, route in self.routes.items():
+            failure_rate, p95 = self.stats(name)
+            entry = {"model": self.model(name), "timeout": route.timeout,
+                     "failure_rate": round(failure_rate, 3), "p95_seconds": round(p95, 3)}
+            left = self.demoted_until.get(name, 0.0) - time.monotonic()
+            if route.fallback and left > 0:
+                entry["demoted_for"] = round(left)
+            status[name] = entry
+        return status
 
 # ----------------------
-# New/Improved endpoint: Executive Summary (robust + tables)
+# Deadlines: every request gets one overall budget (config default or ?deadline=),
+# and each step (primary call, reformat call) only gets the time that is left,
+# capped by its own per-step timeout.
 # ----------------------
-@app.get("/get_exec_summary")
-def get_exec_summary(
-    countries: Optional[str] = Query(None, description="Comma-separated list of countries (default: 7 Gulf countries)"),
-    raw: bool = Query(False, description="Return raw grok output for debugging")
-):
-    if not GROK_API_KEY:
-        return {"error": "GROK_API_KEY not configured on server (set in .env)"}
+SUMMARY_DEADLINE_SECONDS = float(os.getenv("SUMMARY_DEADLINE_SECONDS", "120"))
+EXEC_DEADLINE_SECONDS = float(os.getenv("EXEC_DEADLINE_SECONDS", "260"))
+# don't start a step (e.g. the reformat call) with less time than this left
+DEADLINE_MIN_STEP_SECONDS = float(os.getenv("DEADLINE_MIN_STEP_SECONDS", "2"))
 
-    default_countries = ["Saudi Arabia", "United Arab Emirates", "Qatar", "Kuwait", "Bahrain", "Oman", "Iraq"]
-    if countries:
+class DeadlineExceeded(Exception):
+    """Raised when too little of the request's time budget is left to start a step."""
+
+class Deadline:
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def budget(self, step_timeout: float) -> float:
+        """Timeout for the next step: its own cap or what is left, whichever is smaller."""
+        left = self.remaining()
+        if left < DEADLINE_MIN_STEP_SECONDS:
+            raise DeadlineExceeded(f"request deadline of {self.seconds:g}s exceeded")
+        return min(step_timeout, left)
+
+def request_deadline(deadline: Optional[float], default: float) -> Deadline:
+    return Deadline(deadline if deadline and deadline > 0 else default)
+
+# ----------------------
+# Client disconnects: the summary endpoints watch for the client's disconnect while
+# they wait, and cancel their work when it goes away. A cached fetch is shared by every coalesced
+# caller, so it is only abandoned once all of them are gone: abandoning cancels the
+# Grok calls in flight and refuses new ones (e.g. the reformat call), while a fetch
+# that is past its upstream calls (local parsing, store merge) finishes into the cache.
+# ----------------------
+CLIENT_CLOSED_REQUEST = 499  # nginx's status for "client closed the connection"; only seen in logs / metrics
+
+class UpstreamScope:
+    """The Grok calls made on behalf of one fetch; see call_grok."""
+    def __init__(self):
+        self.abandoned = False
+        self.calls: set = set()  # tasks currently inside call_grok / stream_grok
+
+    def abandon(self) -> None:
+        self.abandoned = True
+        for task in self.calls:
+            ABANDONED_UPSTREAM_CALLS.labels("in_flight").inc()
+            task.cancel()
+
+    @contextmanager
+    def call(self):
+        """Register the current task for the duration of an upstream call."""
+        if self.abandoned:
+            ABANDONED_UPSTREAM_CALLS.labels("skipped").inc()
+            raise asyncio.CancelledError("every client waiting on this fetch disconnected")
+        task = asyncio.current_task()
+        self.calls.add(task)
         try:
-            provided = [c.strip() for c in countries.split(",") if c.strip()]
-            country_list = provided if provided else default_countries
-        except Exception:
-            country_list = default_countries
+            yield
+        finally:
+            self.calls.discard(task)
+
+# scope of the fetch the current context runs in (None: not abandonable, e.g. prefetch)
+upstream_scope: ContextVar[Optional[UpstreamScope]] = ContextVar("upstream_scope", default=None)
+
+@contextmanager
+def upstream_call_scope():
+    scope = upstream_scope.get()
+    if scope is None:
+        yield
     else:
-        country_list = default_countries
+        with scope.call():
+            yield
 
-    now_utc = datetime.now(timezone.utc)
-    start_utc = now_utc - timedelta(hours=24)
-    start_iso = start_utc.replace(microsecond=0).isoformat()
-    end_iso = now_utc.replace(microsecond=0).isoformat()
+def raise_if_abandoned(results: List[Any]) -> None:
+    """After a gather(return_exceptions=True): a part cancelled by abandonment cancels the whole fetch."""
+    for r in results:
+        if isinstance(r, asyncio.CancelledError):
+            raise r
 
-    gp = build_exec_prompt(country_list, start_iso, end_iso)
-    payload = gp["payload"]
-    headers = {"Authorization": f"Bearer {GROK_API_KEY}", "Content-Type": "application/json"}
+async def wait_for_disconnect(request: Request) -> None:
+    # after the (empty) request body, the next ASGI message is the disconnect
+    while (await request.receive())["type"] != "http.disconnect":
+        pass
 
+async def unless_disconnected(request: Request, flow: str, work: Awaitable[Any]) -> Tuple[bool, Any]:
+    """Await `work`; returns (False, None) after cancelling it if the client disconnects first."""
+    task = asyncio.ensure_future(work)
+    watcher = asyncio.ensure_future(wait_for_disconnect(request))
     try:
-        # longer timeout to reduce truncation risks
-        resp = requests.post(GROK_API_URL, headers=headers, json=payload, timeout=180)
-        resp.raise_for_status()
-        res_json = resp.json()
-
-        content = ""
-        if isinstance(res_json, dict):
-            if "choices" in res_json and res_json["choices"]:
-                ch0 = res_json["choices"][0]
-                content = ch0.get("message", {}).get("content") or ch0.get("text") or ""
-            elif "output" in res_json:
-                if isinstance(res_json["output"], list):
-                    content = " ".join(map(str, res_json["output"]))
-                else:
-                    content = str(res_json["output"])
-            else:
-                content = json.dumps(res_json)
-        else:
-            content = str(res_json)
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        if task.done():
+            return True, task.result()
+        CLIENT_DISCONNECTS.labels(flow).inc()
+        return False, None
+    finally:
+        task.cancel()
+        watcher.cancel()
 
-        cleaned_content = content.strip()
-        # keep markdown tables if present; only remove explicit triple backticks around json blocks
-        cleaned_content = re.sub(r'```json', '', cleaned_content)
-        # we will not blindly strip all backticks here to preserve markdown tables in `document`
-        cleaned_content = re.sub(r',\s*}', '}', cleaned_content)
-        cleaned_content = re.sub(r',\s*\]', ']', cleaned_content)
-        content = cleaned_content
+# ----------------------
+# Hedged upstream calls (opt-in): if a call is still running after the observed
+# p95 latency for its kind of request, a duplicate is sent and the first success wins.
+# Hedges are only sent while the limiter has free slots.
+# ----------------------
+GROK_HEDGE_ENABLED = os.getenv("GROK_HEDGE_ENABLED", "0").lower() in ("1", "true", "yes")
+GROK_HEDGE_QUANTILE = float(os.getenv("GROK_HEDGE_QUANTILE", "0.95"))
+GROK_HEDGE_MIN_SAMPLES = int(os.getenv("GROK_HEDGE_MIN_SAMPLES", "20"))
+GROK_HEDGE_MIN_DELAY = float(os.getenv("GROK_HEDGE_MIN_DELAY", "1"))
 
-        if raw:
-            return {"raw_response": res_json, "content": content}
+class LatencyTracker:
+    """Sliding window of recent successful upstream latencies per request kind."""
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: Dict[str, deque] = {}
+
+    def observe(self, kind: str, seconds: float) -> None:
+        self._samples.setdefault(kind, deque(maxlen=self.window)).append(seconds)
+
+    def quantile(self, kind: str, q: float) -> Optional[float]:
+        samples = self._samples.get(kind)
+        if not samples or len(samples) < GROK_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def hedge_delay(self, kind: str) -> Optional[float]:
+        p = self.quantile(kind, GROK_HEDGE_QUANTILE)
+        return None if p is None else max(GROK_HEDGE_MIN_DELAY, p)
+
+# ----------------------
+# Response cache: TTL + LRU entries keyed by normalized request and time bucket,
+# with single-flight coalescing of identical in-flight fetches.
+# ----------------------
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "300"))
+# results from a recovery path (parse_error / regex fallback) expire sooner, so the next poll retries Grok
+CACHE_DEGRADED_TTL_SECONDS = float(os.getenv("CACHE_DEGRADED_TTL_SECONDS", "30"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "256"))
+CACHE_BUCKET_SECONDS = int(os.getenv("CACHE_BUCKET_SECONDS", "900"))
+
+def cache_bucket() -> int:
+    return int(time.time() // CACHE_BUCKET_SECONDS) if CACHE_BUCKET_SECONDS > 0 else 0
 
-        # Try strong JSON extraction (robust)
+def is_degraded(value: Dict[str, Any]) -> bool:
+    return "parse_error" in value or str(value.get("source", "")).startswith("regex_fallback")
+
+class ResponseCache:
+    """
+    Each entry remembers the `n` it was fetched with, so a request for a smaller n
+    is answered from a cached (or in-flight) larger n; a later fetch for a smaller n
+    does not replace a live larger entry unless it improves on a degraded one. Error
+    payloads, and results with a failed shard, are never cached; degraded results
+    only for CACHE_DEGRADED_TTL_SECONDS.
+    """
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # key -> (expires_at, n, value)
+        self._entries: "OrderedDict[Tuple, Tuple[float, int, Dict[str, Any]]]" = OrderedDict()
+        # key -> [n, fetch task, upstream scope, waiting callers]
+        self._inflight: Dict[Tuple, List[Any]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get(self, key: Tuple, n: int = 0) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, size, value = entry
+        if time.monotonic() > expires_at:
+            del self._entries[key]
+            return None
+        if size < n:
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: Tuple, n: int, value: Dict[str, Any]) -> None:
+        if "error" in value or "error" in value.get("shards", ()):
+            return
+        now = time.monotonic()
+        degraded = is_degraded(value)
+        current = self._entries.get(key)
+        if (current is not None and current[0] >= now and current[1] > n
+                and (degraded or not is_degraded(current[2]))):
+            return
+        self._entries[key] = (now + (min(self.ttl, CACHE_DEGRADED_TTL_SECONDS) if degraded else self.ttl), n, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_fetch(self, key: Tuple, n: int, fetch: Callable[[], Awaitable[Dict[str, Any]]],
+                           force: bool = False) -> Tuple[Dict[str, Any], str]:
+        """Return (value, status) where status is 'hit', 'coalesced' or 'miss'."""
+        if not force:
+            cached = self.get(key, n)
+            if cached is not None:
+                self.hits += 1
+                return cached, "hit"
+        pending = self._inflight.get(key)
+        if pending is not None and pending[0] >= n:
+            self.coalesced += 1
+            return await self._wait(key, pending), "coalesced"
+        self.misses += 1
+        # run the fetch as its own task so a cancelled leader does not fail the followers
+        scope = UpstreamScope()
+        token = upstream_scope.set(scope)
         try:
-            parsed = extract_json_from_text(content)
-            document = parsed.get("document", "") or ""
-            highlights = parsed.get("highlights", []) or []
-            sources = parsed.get("sources", []) or []
-            tables = parsed.get("tables", []) or []
-            return {
-                "document": document,
-                "highlights": highlights,
-                "tables": tables,
-                "sources": sources,
-                "source": "grok",
-                "raw_content": None
-            }
-        except Exception as parse_err:
-            # If parse fails, ask Grok to reformat the raw content into the exact schema,
-            # and explicitly request converting any narrative table into arrays.
-            fix_prompt = (
-                "The content below was intended to be valid JSON following this schema:\n\n"
-                f"{EXEC_SCHEMA_JSON}\n\n"
-                "However it's malformed/truncated. Please OUTPUT ONLY a single VALID JSON object exactly following the schema. "
-                "If you included any readable tables in the `document`, also add a corresponding entry in `tables` with 'title', 'headers' and 'rows'. "
-                "If a subsection has no new items, put: 'No material new items in the last 24 hours' for that subsection.\n\n"
-                "RAW CONTENT START:\n\n" + content + "\n\nRAW CONTENT END."
-            )
-            fix_payload = {
-                "model": "grok-3",
-                "messages": [
-                    {"role": "system", "content": (
-                        "You are a detailed executive intelligence assistant. "
-                        "Write longer, analytical, and context-rich briefings (8,000–10,000 characters). "
-                        "Cover implications, causal links, and impact where relevant. "
-                        "Important! - Ensure all text fits within VALID JSON under the field names exactly as specified."
-                    )},
-                    {"role": "user", "content": fix_prompt}
-                ],
-                "temperature": 0.0,
-                "max_tokens": 10000
-            }
+            task = asyncio.ensure_future(fetch())
+        finally:
+            upstream_scope.reset(token)
+        pending = [n, task, scope, 0]
+        self._inflight[key] = pending
+        task.add_done_callback(lambda t: self._on_done(key, n, t))
+        return await self._wait(key, pending), "miss"
+
+    async def _wait(self, key: Tuple, pending: List[Any]) -> Dict[str, Any]:
+        """
+        Wait for a shared fetch; when the last waiter is cancelled the fetch is abandoned
+        and unlisted, so a later caller starts a fresh one instead of joining it.
+        """
+        pending[3] += 1
+        try:
+            return await asyncio.shield(pending[1])
+        finally:
+            pending[3] -= 1
+            if pending[3] == 0 and not pending[1].done():
+                pending[2].abandon()
+                if self._inflight.get(key) is pending:
+                    del self._inflight[key]
+
+    def _on_done(self, key: Tuple, n: int, task: asyncio.Task) -> None:
+        pending = self._inflight.get(key)
+        if pending is not None and pending[1] is task:
+            del self._inflight[key]
+        if task.cancelled() or task.exception() is not None:
+            return
+        value = task.result()
+        if isinstance(value, dict):
+            self.put(key, n, value)
+
+# ----------------------
+# Response encoding: a JSON body is serialized once per cached value and kept with
+# a strong ETag and its gzip / brotli variants, so repeated polls are answered from
+# memory and a matching If-None-Match gets a 304 without re-serializing.
+# ----------------------
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+STATIC_MAX_AGE = int(os.getenv("STATIC_MAX_AGE", "86400"))
+ETAG_SUFFIXES = {"br": "-br", "gzip": "-gz"}
+
+class IdentityMemo:
+    """
+    Small LRU keyed by the identity of a cached value (plus optional extra key parts).
+    Entries hold a reference to the value, so its id cannot be reused while cached.
+    """
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple, Tuple[Any, Any]]" = OrderedDict()
+
+    def get(self, obj: Any, *extra: Any) -> Any:
+        entry = self._entries.get((id(obj),) + extra)
+        if entry is None or entry[0] is not obj:
+            return None
+        self._entries.move_to_end((id(obj),) + extra)
+        return entry[1]
+
+    def put(self, obj: Any, value: Any, *extra: Any) -> None:
+        key = (id(obj),) + extra
+        self._entries[key] = (obj, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+def accepted_encodings(request: Request) -> List[str]:
+    """Encodings we can produce that the client accepts (q > 0), in our preference order."""
+    accepted: Dict[str, float] = {}
+    for part in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = part.partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
             try:
-                fix_resp = requests.post(GROK_API_URL, headers=headers, json=fix_payload, timeout=80)
-                fix_resp.raise_for_status()
-                fix_json = fix_resp.json()
-                fix_content = ""
-                # print(len(fix_resp['choices'][0]['message']['content']))
-                if isinstance(fix_json, dict) and "choices" in fix_json and fix_json["choices"]:
-                    ch0 = fix_json["choices"][0]
-                    fix_content = ch0.get("message", {}).get("content") or ch0.get("text") or ""
-                else:
-                    fix_content = json.dumps(fix_json)
-                try:
-                    parsed2 = extract_json_from_text(fix_content)
-                    document = parsed2.get("document", "") or ""
-                    highlights = parsed2.get("highlights", []) or []
-                    sources = parsed2.get("sources", []) or []
-                    tables = parsed2.get("tables", []) or []
-                    return {
-                        "document": document,
-                        "highlights": highlights,
-                        "tables": tables,
-                        "sources": sources,
-                        "source": "grok_reformat",
-                        "raw_content": content
-                    }
-                except Exception as reformat_err:
-                    # As last fallback, return raw content as document with a parse_error field
-                    return {
-                        "document": content,
-                        "highlights": [],
-                        "tables": [],
-                        "sources": [],
-                        "source": "grok_raw_fallback",
-                        "raw_content": content,
-                        "parse_error": str(parse_err),
-                        "reformat_error": str(reformat_err)
-                    }
-            except Exception as fix_call_exc:
-                return {
-                    "document": content,
-                    "highlights": [],
-                    "tables": [],
-                    "sources": [],
-                    "source": "grok_reformat_failed",
-                    "raw_content": content,
-                    "reformat_call_error": str(fix_call_exc),
-                    "parse_error": str(parse_err)
-                }
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name.strip():
+            accepted[name.strip().lower()] = q
+    wildcard = accepted.get("*", 0.0)
+    out = []
+    if brotli is not None and accepted.get("br", wildcard) > 0:
+        out.append("br")
+    if accepted.get("gzip", wildcard) > 0:
+        out.append("gzip")
+    return out
 
-    except requests.Timeout:
-        return {"error": "Grok API timed out. Try again later."}
-    except requests.HTTPError as http_err:
-        body = http_err.response.text if (http_err.response is not None) else ""
-        return {"error": f"HTTPError calling Grok: {http_err}", "body": body}
+class EncodedBody:
+    """One serialized representation: strong ETag plus compressed variants built on first use."""
+    def __init__(self, body: bytes, media_type: str, best: bool = False):
+        self.body = body
+        self.media_type = media_type
+        self.best = best  # static files are compressed once, so spend the CPU on the ratio
+        self.digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+        self._variants: Dict[str, bytes] = {}
+
+    def etag(self, encoding: Optional[str]) -> str:
+        return f'"{self.digest}{ETAG_SUFFIXES.get(encoding, "")}"'
+
+    def variant(self, encoding: str) -> bytes:
+        data = self._variants.get(encoding)
+        if data is None:
+            if encoding == "br":
+                data = brotli.compress(self.body, quality=11 if self.best else 5)
+            else:
+                data = gzip.compress(self.body, compresslevel=9 if self.best else 6, mtime=0)
+            self._variants[encoding] = data
+        return data
+
+    def matches(self, if_none_match: str) -> bool:
+        """Weak comparison (RFC 9110): any encoding variant of the same body matches."""
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag == "*":
+                return True
+            tag = tag[2:] if tag.startswith("W/") else tag
+            if tag.strip('"').split("-", 1)[0] == self.digest:
+                return True
+        return False
+
+    def response(self, request: Request, cache_control: str,
+                 headers: Optional[Dict[str, str]] = None) -> Response:
+        encoding = None
+        if len(self.body) >= COMPRESS_MIN_BYTES:
+            encoding = next(iter(accepted_encodings(request)), None)
+        out = {"ETag": self.etag(encoding), "Vary": "Accept-Encoding", "Cache-Control": cache_control}
+        out.update(headers or {})
+        if self.matches(request.headers.get("if-none-match", "")):
+            return Response(status_code=304, headers=out)
+        if encoding is None:
+            return Response(self.body, media_type=self.media_type, headers=out)
+        out["Content-Encoding"] = encoding
+        return Response(self.variant(encoding), media_type=self.media_type, headers=out)
+
+def encoded_json(request: Request, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None,
+                 memoize: bool = True) -> Response:
+    """
+    JSON response with ETag / If-None-Match and negotiated compression. Bodies of
+    non-error payloads are memoized by payload identity, so a value served again
+    from the cache or prefetch store is neither re-serialized nor re-compressed.
+    """
+    memo: IdentityMemo = app.state.encoded_bodies
+    encoded = memo.get(payload) if memoize else None
+    if encoded is None:
+        encoded = EncodedBody(dumps_json(payload), "application/json")
+        if memoize and "error" not in payload:
+            memo.put(payload, encoded)
+    return encoded.response(request, "no-cache", headers)
+
+# ----------------------
+# Field projection: responses are lean by default (DEBUG_FIELDS such as raw_content
+# only with debug=true; LEAN_FIELDS such as clusters trimmed to references unless
+# debug=true or ?fields= names them), and ?fields= keeps just the listed keys; "tweets.text"-style
+# paths pick keys inside list items. Projection runs before encoded_json, and the view
+# of a cached value is memoized per (fields, debug), so unused large strings are never
+# serialized and repeat polls reuse the encoded body.
+# ----------------------
+DEBUG_FIELDS = ("raw_content",)
+
+def lean_clusters(clusters: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Near-duplicate clusters with members cut to id/url; the full tweets are already in `tweets`."""
+    return [dict(c, members=[{"id": m.get("id", ""), "url": m.get("url", "")} for m in c.get("members", [])])
+            for c in clusters]
+
+LEAN_FIELDS: Dict[str, Callable[[Any], Any]] = {"clusters": lean_clusters}
+
+FieldSpec = Optional[Tuple[Tuple[str, Optional[Tuple[str, ...]]], ...]]
+
+def parse_fields(fields: Optional[str]) -> FieldSpec:
+    """"summary,tweets.text,tweets.url" -> (("summary", None), ("tweets", ("text", "url"))); None keeps everything."""
+    if not fields:
+        return None
+    spec: Dict[str, Optional[set]] = {}
+    for path in fields.split(","):
+        top, _, sub = path.strip().partition(".")
+        if not top:
+            continue
+        if not sub:
+            spec[top] = None  # the whole field wins over sub-paths
+        elif spec.get(top, ()) is not None:
+            spec.setdefault(top, set()).add(sub.strip())
+    return tuple(sorted((k, None if v is None else tuple(sorted(v))) for k, v in spec.items())) or None
+
+def project_fields(result: Dict[str, Any], spec: FieldSpec, debug: bool = False) -> Dict[str, Any]:
+    """The keys of `result` selected by `spec`; error payloads are never narrowed."""
+    if spec is None or "error" in result:
+        if debug:
+            return result
+        return {k: LEAN_FIELDS[k](v) if k in LEAN_FIELDS else v
+                for k, v in result.items() if k not in DEBUG_FIELDS}
+    out = {}
+    for key, sub in spec:
+        if key not in result or (key in DEBUG_FIELDS and not debug):
+            continue
+        value = result[key]
+        if sub is not None and isinstance(value, list):
+            value = [{k: item[k] for k in sub if k in item} if isinstance(item, dict) else item for item in value]
+        out[key] = value
+    return out
+
+def response_view(result: Dict[str, Any], spec: FieldSpec, debug: bool) -> Dict[str, Any]:
+    """project_fields, memoized by the identity of a (cached) result."""
+    if spec is None and debug:
+        return result
+    views: IdentityMemo = app.state.projections
+    view = views.get(result, spec, debug)
+    if view is None:
+        view = project_fields(result, spec, debug)
+        if "error" not in result:
+            views.put(result, view, spec, debug)
+    return view
+
+class StaticAssets:
+    """
+    Files under `directory`, read and compressed once per (path, mtime). index.html is
+    not fingerprinted, so HTML revalidates on every load (ETag -> 304); other assets
+    get a long-lived Cache-Control.
+    """
+    def __init__(self, directory: str):
+        self.directory = os.path.realpath(directory)
+        self._entries: Dict[str, Tuple[float, EncodedBody]] = {}
+
+    def load(self, rel_path: str) -> Optional[Tuple[float, EncodedBody]]:
+        """(mtime, body) for a file under the directory, or None."""
+        path = os.path.realpath(os.path.join(self.directory, rel_path))
+        if not path.startswith(self.directory + os.sep) or not os.path.isfile(path):
+            return None
+        mtime = os.path.getmtime(path)
+        entry = self._entries.get(path)
+        if entry is not None and entry[0] == mtime:
+            return entry
+        with open(path, "rb") as f:
+            data = f.read()
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        entry = (mtime, EncodedBody(data, media_type, best=True))
+        self._entries[path] = entry
+        return entry
+
+    def response(self, request: Request, rel_path: str) -> Response:
+        entry = self.load(rel_path)
+        if entry is None:
+            return JSONResponse({"detail": "Not Found"}, status_code=404)
+        mtime, encoded = entry
+        if encoded.media_type == "text/html":
+            cache_control = "no-cache"
+        else:
+            cache_control = f"public, max-age={STATIC_MAX_AGE}"
+        return encoded.response(request, cache_control, {"Last-Modified": formatdate(mtime, usegmt=True)})
+
+# ----------------------
+# Metrics (Prometheus, served on /metrics): per-stage latency histograms, which
+# recovery path (`source`) each result took, upstream outcomes and token usage.
+# SERVER_TIMING_ENABLED=1 also reports the stage timings of each request in a
+# Server-Timing response header.
+# ----------------------
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "0").lower() in ("1", "true", "yes")
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 90, 120, 180)
+
+REQUEST_SECONDS = Histogram("grok_backend_request_seconds", "End-to-end HTTP request latency",
+                            ["route", "status"], buckets=LATENCY_BUCKETS)
+STAGE_SECONDS = Histogram("grok_backend_stage_seconds", "Latency of each processing stage",
+                          ["flow", "stage"], buckets=LATENCY_BUCKETS)
+RESULT_SOURCES = Counter("grok_backend_results_total", "Parsed results by recovery path (source)", ["flow", "source"])
+CACHE_LOOKUPS = Counter("grok_backend_cache_lookups_total", "Response cache / prefetch lookups by status", ["flow", "status"])
+UPSTREAM_QUEUE_SECONDS = Histogram("grok_backend_upstream_queue_seconds", "Time spent waiting for an upstream slot",
+                                   buckets=LATENCY_BUCKETS)
+UPSTREAM_REQUESTS = Counter("grok_backend_upstream_requests_total", "Grok calls by model and outcome", ["model", "outcome"])
+UPSTREAM_TOKENS = Counter("grok_backend_upstream_tokens_total", "Token usage reported by Grok", ["model", "kind"])
+UPSTREAM_CALL_SECONDS = Histogram("grok_backend_upstream_call_seconds",
+                                  "Latency of successful non-streamed Grok calls (from send), by prompt-cache hit",
+                                  ["model", "prompt_cache"], buckets=LATENCY_BUCKETS)
+UPSTREAM_TTFT_SECONDS = Histogram("grok_backend_upstream_ttft_seconds",
+                                  "Time to the first streamed token (from send), by prompt-cache hit",
+                                  ["model", "prompt_cache"], buckets=LATENCY_BUCKETS)
+UPSTREAM_QUOTA_WAIT_SECONDS = Histogram("grok_backend_upstream_quota_wait_seconds",
+                                        "Time spent waiting for RPM/TPM quota admission", ["priority"],
+                                        buckets=LATENCY_BUCKETS)
+QUOTA_REJECTIONS = Counter("grok_backend_quota_rejections_total",
+                           "Calls rejected because the quota could not admit them within their budget", ["priority"])
+CLIENT_DISCONNECTS = Counter("grok_backend_client_disconnects_total",
+                             "Requests whose client disconnected before the response was ready", ["flow"])
+ABANDONED_UPSTREAM_CALLS = Counter("grok_backend_abandoned_upstream_calls_total",
+                                   "Grok calls cancelled in flight or skipped because no client was waiting", ["stage"])
+BREAKER_TRANSITIONS = Counter("grok_backend_breaker_transitions_total", "Circuit breaker state changes", ["state"])
+BREAKER_REJECTIONS = Counter("grok_backend_breaker_rejections_total", "Calls failed fast by the circuit breaker")
+ROUTE_DEMOTIONS = Counter("grok_backend_model_route_demotions_total", "Routes demoted to their fallback model", ["route"])
+UPSTREAM_HEDGES = Counter("grok_backend_upstream_hedges_total", "Hedged Grok calls by latency class and outcome", ["kind", "outcome"])
+SHARD_RETRIES = Counter("grok_backend_summary_shard_retries_total", "Failed tweet ranking slices tried again")
+Gauge("grok_backend_upstream_inflight", "Grok calls in flight").set_function(
+    lambda: getattr(getattr(app.state, "upstream_limiter", None), "inflight", 0))
+Gauge("grok_backend_upstream_waiting", "Callers waiting for an upstream slot").set_function(
+    lambda: getattr(getattr(app.state, "upstream_limiter", None), "waiting", 0))
+Gauge("grok_backend_breaker_state", "Circuit breaker state (0 closed, 1 half-open, 2 open)").set_function(
+    lambda: {"half_open": 1, "open": 2}.get(getattr(getattr(app.state, "upstream_breaker", None), "state", ""), 0))
+Gauge("grok_backend_model_routes_demoted", "Routes currently on their fallback model").set_function(
+    lambda: sum(1 for until in getattr(getattr(app.state, "model_router", None), "demoted_until", {}).values()
+                if until > time.monotonic()))
+Gauge("grok_backend_quota_waiting", "Callers waiting for RPM/TPM quota admission").set_function(
+    lambda: getattr(getattr(app.state, "upstream_quota", None), "waiting", 0))
+
+# stage timings of the current request, for the Server-Timing header (None outside a request)
+_request_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_timings", default=None)
+
+@contextmanager
+def stage_timer(flow: str, stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.labels(flow, stage).observe(elapsed)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((stage, elapsed))
+
+def count_result(flow: str, result: Dict[str, Any]) -> None:
+    RESULT_SOURCES.labels(flow, "error" if "error" in result else result.get("source") or "unknown").inc()
+
+def record_usage(model: str, usage: Any) -> None:
+    if not isinstance(usage, dict):
+        return
+    for kind in ("prompt_tokens", "completion_tokens"):
+        if isinstance(usage.get(kind), int):
+            UPSTREAM_TOKENS.labels(model, kind[:-len("_tokens")]).inc(usage[kind])
+    reasoning = (usage.get("completion_tokens_details") or {}).get("reasoning_tokens")
+    if isinstance(reasoning, int):
+        UPSTREAM_TOKENS.labels(model, "reasoning").inc(reasoning)
+    cached = cached_prompt_tokens(usage)
+    if cached:
+        UPSTREAM_TOKENS.labels(model, "cached_prompt").inc(cached)
+
+def cached_prompt_tokens(usage: Any) -> Optional[int]:
+    if not isinstance(usage, dict):
+        return None
+    cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+    return cached if isinstance(cached, int) else None
+
+def prompt_cache_status(usage: Any) -> str:
+    """"hit" if part of the prompt was served from Grok's prompt cache, "miss", or "unknown"."""
+    cached = cached_prompt_tokens(usage)
+    if cached is None:
+        return "unknown"
+    return "hit" if cached > 0 else "miss"
+
+def upstream_outcome(exc: Optional[Exception]) -> str:
+    if exc is None:
+        return "ok"
+    if isinstance(exc, httpx.TimeoutException):
+        return "timeout"
+    if isinstance(exc, httpx.HTTPStatusError):
+        return f"http_{exc.response.status_code}"
+    return "error"
+
+def create_grok_client() -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=GROK_MAX_CONNECTIONS,
+        max_keepalive_connections=GROK_MAX_KEEPALIVE,
+        keepalive_expiry=GROK_KEEPALIVE_EXPIRY,
+    )
+    return httpx.AsyncClient(
+        http2=GROK_HTTP2,
+        limits=limits,
+        timeout=httpx.Timeout(90, connect=GROK_CONNECT_TIMEOUT),
+        headers={"Authorization": f"Bearer {GROK_API_KEY}", "Content-Type": "application/json"},
+    )
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if PROFILING_ENABLED:
+        asyncio.get_running_loop().set_task_factory(profiling_task_factory)
+    app.state.grok_client = create_grok_client()
+    app.state.upstream_limiter = UpstreamLimiter(GROK_MAX_INFLIGHT, GROK_MAX_QUEUE)
+    app.state.upstream_quota = UpstreamQuota(GROK_RPM_LIMIT, GROK_TPM_LIMIT)
+    app.state.upstream_breaker = CircuitBreaker(GROK_BREAKER_ENABLED)
+    app.state.model_router = ModelRouter(MODEL_ROUTES)
+    app.state.response_cache = ResponseCache(CACHE_TTL_SECONDS, CACHE_MAX_ENTRIES)
+    app.state.summary_views = IdentityMemo(CACHE_MAX_ENTRIES * 4)
+    app.state.encoded_bodies = IdentityMemo(CACHE_MAX_ENTRIES * 4)
+    app.state.projections = IdentityMemo(CACHE_MAX_ENTRIES * 4)
+    app.state.static_assets = StaticAssets("./static")
+    app.state.upstream_latency = LatencyTracker()
+    app.state.prefetch = create_prefetch_scheduler()
+    app.state.tweet_store = TweetStore(TWEET_STORE_PATH) if TWEET_STORE_PATH else None
+    if PREFETCH_ENABLED and GROK_API_KEY:
+        app.state.prefetch.start()
+    try:
+        yield
+    finally:
+        await app.state.prefetch.stop()
+        await app.state.grok_client.aclose()
+        if app.state.tweet_store is not None:
+            app.state.tweet_store.close()
+
+app = FastAPI(title="Twitter AI News — Grok Backend (Improved JSON extraction & Exec packs)", lifespan=lifespan)
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+@app.exception_handler(UpstreamBusy)
+async def upstream_busy_handler(request, exc: UpstreamBusy):
+    return JSONResponse(busy_error(exc), status_code=503, headers={"Retry-After": str(exc.retry_after)})
+
+@app.middleware("http")
+async def request_metrics(request: Request, call_next):
+    timings: List[Tuple[str, float]] = []
+    token = _request_timings.set(timings)
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        _request_timings.reset(token)
+    elapsed = time.perf_counter() - started
+    route = request.scope.get("route")
+    REQUEST_SECONDS.labels(getattr(route, "path", "other"), str(response.status_code)).observe(elapsed)
+    if SERVER_TIMING_ENABLED:
+        # streamed bodies only include the stages finished before the headers went out
+        entries = [f"{stage};dur={dur * 1000:.1f}" for stage, dur in timings]
+        entries.append(f"app;dur={elapsed * 1000:.1f}")
+        response.headers["Server-Timing"] = ", ".join(entries)
+    return response
+
+# ----------------------
+# On-demand profiling (off unless PROFILE_ADMIN_TOKEN or PROFILE_SAMPLE_RATE is set;
+# when off, neither the middleware nor the task factory is installed). A request with
+# ?profile=1 and a matching X-Admin-Token header, or one picked at PROFILE_SAMPLE_RATE,
+# runs under cProfile: every task it starts (the request itself, coalesced fetches,
+# shards) has its coroutine wrapped so the profiler only runs during that task's own
+# steps on the event loop. Time spent waiting on Grok is summed separately, so the
+# profile shows local CPU time and upstream wait apart. The pstats file and a JSON
+# summary are written to PROFILE_DIR, which keeps only the newest PROFILE_MAX_FILES
+# profiles; admin requests get their id in X-Profile-Id and can fetch it from
+# /admin/profiles/{id} (?format=pstats for the raw file).
+# ----------------------
+PROFILE_ADMIN_TOKEN = os.getenv("PROFILE_ADMIN_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+PROFILE_TOP_FUNCTIONS = int(os.getenv("PROFILE_TOP_FUNCTIONS", "30"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))  # profiles kept on disk (each is a .pstats + .json pair)
+PROFILING_ENABLED = bool(PROFILE_ADMIN_TOKEN) or PROFILE_SAMPLE_RATE > 0
+PROFILE_ID_RE = re.compile(r"^[0-9]+-[0-9a-f]{8}$")
+
+class ProfileSession:
+    """cProfile data plus on-loop and upstream time of one profiled request."""
+    def __init__(self, request: Request, reason: str):
+        self.id = f"{int(time.time())}-{secrets.token_hex(4)}"
+        self.reason = reason  # "admin" or "sampled"
+        self.method = request.method
+        self.path = request.url.path
+        self.query = request.url.query
+        self.status: Optional[int] = None
+        self.profiler = cProfile.Profile()
+        self.started = time.perf_counter()
+        self.wall = 0.0
+        self.cpu = 0.0  # time the request's own tasks ran on the event loop
+        self.upstream = 0.0  # summed over Grok calls (concurrent calls overlap)
+        self.upstream_calls = 0
+        self.closed = False
+        self._resumed = 0.0
+
+    def resume(self) -> None:
+        if not self.closed:
+            self._resumed = time.perf_counter()
+            self.profiler.enable()
+
+    def suspend(self) -> None:
+        if self._resumed:
+            self.profiler.disable()
+            self.cpu += time.perf_counter() - self._resumed
+            self._resumed = 0.0
+
+    def close(self) -> None:
+        self.closed = True
+        self.wall = time.perf_counter() - self.started
+
+    def summary(self) -> Dict[str, Any]:
+        stats = pstats.Stats(self.profiler).stats
+        top = sorted(stats.items(), key=lambda kv: kv[1][2], reverse=True)[:PROFILE_TOP_FUNCTIONS]
+        return {
+            "id": self.id, "reason": self.reason, "method": self.method, "path": self.path,
+            "query": self.query, "status": self.status,
+            "wall_ms": round(self.wall * 1000, 1),
+            "cpu_ms": round(self.cpu * 1000, 1),
+            "upstream_wait_ms": round(self.upstream * 1000, 1),
+            "upstream_calls": self.upstream_calls,
+            "top_functions": [
+                {"function": pstats.func_std_string(func), "calls": nc,
+                 "self_ms": round(tt * 1000, 3), "cumulative_ms": round(ct * 1000, 3)}
+                for func, (_, nc, tt, ct, _) in top
+            ],
+        }
+
+    def save(self) -> Dict[str, Any]:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        self.profiler.dump_stats(os.path.join(PROFILE_DIR, f"{self.id}.pstats"))
+        summary = self.summary()
+        with open(os.path.join(PROFILE_DIR, f"{self.id}.json"), "wb") as f:
+            f.write(dumps_json(summary))
+        prune_profiles()
+        return summary
+
+def prune_profiles() -> None:
+    """Delete all but the newest PROFILE_MAX_FILES profiles from PROFILE_DIR."""
+    ids = {name.rsplit(".", 1)[0] for name in os.listdir(PROFILE_DIR)}
+    ids = sorted((i for i in ids if PROFILE_ID_RE.match(i)), key=lambda i: int(i.split("-")[0]))
+    for profile_id in ids[:max(0, len(ids) - max(1, PROFILE_MAX_FILES))]:
+        for ext in ("pstats", "json"):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, f"{profile_id}.{ext}"))
+            except FileNotFoundError:
+                pass  # pruned concurrently by another save
+
+# session of the request the current context belongs to (None: not profiled)
+profile_session: ContextVar[Optional[ProfileSession]] = ContextVar("profile_session", default=None)
+
+class ProfiledCoroutine(collections.abc.Coroutine):
+    """Runs each step of the wrapped coroutine with its session's profiler enabled."""
+    __slots__ = ("_coro", "_session")
+
+    def __init__(self, coro, session: ProfileSession):
+        self._coro = coro
+        self._session = session
+
+    def send(self, value):
+        self._session.resume()
+        try:
+            return self._coro.send(value)
+        finally:
+            self._session.suspend()
+
+    def throw(self, *args):
+        self._session.resume()
+        try:
+            return self._coro.throw(*args)
+        finally:
+            self._session.suspend()
+
+    def close(self):
+        return self._coro.close()
+
+    def __await__(self):
+        return self._coro.__await__()
+
+    def __getattr__(self, name):
+        # cr_frame, cr_running, ... for code that inspects task coroutines (anyio, inspect)
+        return getattr(self._coro, name)
+
+def profiling_task_factory(loop: asyncio.AbstractEventLoop, coro, **kwargs) -> asyncio.Task:
+    context = kwargs.get("context")
+    session = context.get(profile_session) if context is not None else profile_session.get()
+    if session is not None and not session.closed:
+        coro = ProfiledCoroutine(coro, session)
+    return asyncio.Task(coro, loop=loop, **kwargs)
+
+def note_upstream_wait(seconds: float) -> None:
+    session = profile_session.get()
+    if session is not None:
+        session.upstream += seconds
+        session.upstream_calls += 1
+
+def is_admin(request: Request) -> bool:
+    token = request.headers.get("x-admin-token", "")
+    return bool(PROFILE_ADMIN_TOKEN) and secrets.compare_digest(token.encode(), PROFILE_ADMIN_TOKEN.encode())
+
+async def request_profiler(request: Request, call_next):
+    if request.query_params.get("profile") in ("1", "true") and is_admin(request):
+        reason = "admin"
+    elif PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        reason = "sampled"
+    else:
+        return await call_next(request)
+    session = ProfileSession(request, reason)
+    token = profile_session.set(session)
+    try:
+        response = await call_next(request)
+    finally:
+        profile_session.reset(token)
+    session.status = response.status_code
+    if reason == "admin":
+        response.headers["X-Profile-Id"] = session.id
+    response.body_iterator = profiled_body(response.body_iterator, session)
+    return response
+
+async def profiled_body(body: AsyncIterator[Any], session: ProfileSession) -> AsyncIterator[Any]:
+    """Pass the body through; the profile ends once it has been sent (streams included)."""
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        session.close()
+        summary = await asyncio.to_thread(session.save)
+        print(f">>> profile {session.id} ({session.reason}) {session.method} {session.path}: "
+              f"wall {summary['wall_ms']}ms, cpu {summary['cpu_ms']}ms, "
+              f"upstream {summary['upstream_wait_ms']}ms over {session.upstream_calls} calls")
+
+if PROFILING_ENABLED:
+    app.middleware("http")(request_profiler)
+
+@app.get("/admin/profiles/{profile_id}")
+async def get_profile(request: Request, profile_id: str, format: str = Query("json", description="json or pstats")):
+    if not is_admin(request):
+        return JSONResponse({"error": "admin token required"}, status_code=403)
+    path = os.path.join(PROFILE_DIR, f"{profile_id}.{'pstats' if format == 'pstats' else 'json'}")
+    if not PROFILE_ID_RE.match(profile_id) or not os.path.isfile(path):
+        return JSONResponse({"error": "profile not found"}, status_code=404)
+    with open(path, "rb") as f:
+        body = f.read()
+    if format == "pstats":
+        return Response(body, media_type="application/octet-stream",
+                        headers={"Content-Disposition": f'attachment; filename="{profile_id}.pstats"'})
+    return Response(body, media_type="application/json")
+
+@app.get("/ping")
+async def ping():
+    return JSONResponse({"status": "ok", "upstream": app.state.upstream_breaker.status(),
+                         "routes": app.state.model_router.status()})
+
+@app.get("/metrics")
+async def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@app.api_route("/static/{path:path}", methods=["GET", "HEAD"])
+async def static_file(request: Request, path: str):
+    return app.state.static_assets.response(request, path)
+
+async def call_grok(payload: Dict[str, Any], timeout: Optional[float] = None, deadline: Optional[Deadline] = None,
+                    hedge: Optional[str] = None, route: Optional[str] = None) -> Any:
+    """
+    POST a chat-completions payload to Grok over the shared pooled client.
+    `route` (see MODEL_ROUTES) sets the model and caps max_tokens, and its timeout is
+    used when `timeout` is not given; the call's outcome feeds the route's demotion.
+    Fails fast with CircuitOpen while the circuit breaker is open, then waits for quota
+    admission (QuotaExhausted if it would not come within the budget) and an upstream
+    slot (UpstreamBusy if the wait queue is full).
+    The whole call (slot wait included) is bounded by `timeout`, cut down to what is
+    left of `deadline` (DeadlineExceeded if too little is left to start).
+    `hedge` names the latency class for hedging (GROK_HEDGE_ENABLED); None disables it.
+    Inside an abandoned fetch (every client gone) the call is cancelled, or refused
+    with CancelledError if it has not started.
+    Raises httpx.TimeoutException / httpx.HTTPStatusError on timeouts and non-2xx responses.
+    """
+    if route is not None:
+        payload = app.state.model_router.apply(route, payload)
+        timeout = timeout or app.state.model_router.route(route).timeout
+    with upstream_call_scope():
+        return await _call_grok(payload, timeout or 90, deadline, hedge, route)
+
+async def _call_grok(payload: Dict[str, Any], timeout: float, deadline: Optional[Deadline],
+                     hedge: Optional[str], route: Optional[str]) -> Any:
+    full_timeout = True  # False when the client's deadline cut the step's own timeout short
+    if deadline is not None:
+        budget = deadline.budget(timeout)
+        full_timeout = budget >= timeout
+        timeout = budget
+    if hedge is None or not GROK_HEDGE_ENABLED:
+        return await _call_grok_once(payload, timeout, hedge, route, full_timeout)
+
+    delay = app.state.upstream_latency.hedge_delay(hedge)
+    primary = asyncio.ensure_future(_call_grok_once(payload, timeout, hedge, route, full_timeout))
+    if delay is None or delay >= timeout - DEADLINE_MIN_STEP_SECONDS:
+        return await primary
+    done, _ = await asyncio.wait({primary}, timeout=delay)
+    limiter: UpstreamLimiter = app.state.upstream_limiter
+    # a hedge is an extra call: only send it to a healthy upstream with a free slot and spare quota
+    if done or limiter.inflight >= limiter.max_inflight or app.state.upstream_breaker.state != "closed" or \
+            not app.state.upstream_quota.has_headroom(estimate_tokens(payload)):
+        return await primary
+
+    UPSTREAM_HEDGES.labels(hedge, "sent").inc()
+    # the hedge ends when the primary does: only the primary's timeout counts for the breaker
+    backup = asyncio.ensure_future(_call_grok_once(payload, timeout - delay, hedge, route, full_timeout=False))
+    pending = {primary, backup}
+    error: Optional[BaseException] = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    UPSTREAM_HEDGES.labels(hedge, "hedge_won" if task is backup else "primary_won").inc()
+                    return task.result()
+                # a busy limiter only means the hedge could not be sent; keep the primary's error
+                if error is None or not isinstance(task.exception(), UpstreamBusy):
+                    error = task.exception()
+        UPSTREAM_HEDGES.labels(hedge, "both_failed").inc()
+        raise error
+    finally:
+        for task in (primary, backup):
+            task.cancel()
+
+async def _call_grok_once(payload: Dict[str, Any], timeout: float, kind: Optional[str],
+                          route: Optional[str] = None, full_timeout: bool = True) -> Any:
+    client: httpx.AsyncClient = app.state.grok_client
+    limiter: UpstreamLimiter = app.state.upstream_limiter
+    quota: UpstreamQuota = app.state.upstream_quota
+    breaker: CircuitBreaker = app.state.upstream_breaker
+    model = payload.get("model", "")
+    started = time.monotonic()
+    charged = 0
+    sent: Optional[float] = None
+    probe = breaker.acquire()
+    outcome: Optional[str] = None  # breaker outcome; stays None unless the call reached Grok
+
+    async def post() -> httpx.Response:
+        nonlocal charged, sent
+        charged = await quota.acquire(estimate_tokens(payload), upstream_priority.get(), timeout)
+        async with limiter.slot():
+            UPSTREAM_QUEUE_SECONDS.observe(time.monotonic() - started)
+            sent = time.monotonic()
+            resp = await client.post(GROK_API_URL, json=payload, timeout=httpx.Timeout(timeout, connect=GROK_CONNECT_TIMEOUT))
+            if kind is not None and not resp.is_error:
+                app.state.upstream_latency.observe(kind, time.monotonic() - sent)
+            if resp.status_code == 429:
+                quota.pause(retry_after_seconds(resp))
+            return resp
+
+    try:
+        try:
+            resp = await asyncio.wait_for(post(), timeout)
+        except asyncio.TimeoutError:
+            raise httpx.TimeoutException(f"Grok call exceeded its {timeout:.1f}s budget") from None
+        resp.raise_for_status()
+        res_json = loads_json(resp.content)
+        outcome = "ok"
+    except UpstreamBusy:
+        raise
+    except Exception as e:
+        if sent is not None:
+            outcome = breaker_outcome(e)
+        if isinstance(e, httpx.HTTPStatusError):
+            quota.settle(charged, 0)  # rejected calls don't count against the token quota
+        UPSTREAM_REQUESTS.labels(model, upstream_outcome(e)).inc()
+        raise
+    finally:
+        counted = breaker_result(outcome, full_timeout)
+        breaker.release(probe, counted)
+        if route is not None and counted is not None:
+            app.state.model_router.observe(route, model, time.monotonic() - sent, counted)
+        if PROFILING_ENABLED:
+            note_upstream_wait(time.monotonic() - started)
+    UPSTREAM_REQUESTS.labels(model, "ok").inc()
+    if isinstance(res_json, dict):
+        record_usage(model, res_json.get("usage"))
+        quota.settle(charged, usage_tokens(res_json.get("usage")))
+        UPSTREAM_CALL_SECONDS.labels(model, prompt_cache_status(res_json.get("usage"))).observe(time.monotonic() - sent)
+    if GROK_RECORD_PATH:
+        await record_exchange(payload, res_json, time.monotonic() - started)
+    return res_json
+
+async def stream_grok(payload: Dict[str, Any], timeout: float, route: Optional[str] = None,
+                      deadline: Optional[Deadline] = None) -> AsyncIterator[str]:
+    """
+    Same as call_grok but with `stream: true`: yields content deltas from Grok's
+    server-sent events as they arrive. The upstream slot is held for the whole stream,
+    and `timeout` (cut down to what is left of `deadline`) bounds the whole stream,
+    not just each read.
+    """
+    full_timeout = True
+    if deadline is not None:
+        budget = deadline.budget(timeout)
+        full_timeout = budget >= timeout
+        timeout = budget
+    if route is not None:
+        payload = app.state.model_router.apply(route, payload)
+    client: httpx.AsyncClient = app.state.grok_client
+    limiter: UpstreamLimiter = app.state.upstream_limiter
+    quota: UpstreamQuota = app.state.upstream_quota
+    breaker: CircuitBreaker = app.state.upstream_breaker
+    model = payload.get("model", "")
+    started = time.monotonic()
+    recorded: List[str] = []
+    sent = False
+    sent_at = started
+    first_token: Optional[float] = None  # seconds from send to the first content delta
+    usage: Any = None
+    probe = breaker.acquire()
+    outcome: Optional[str] = None  # breaker outcome; stays None unless the stream reached Grok
+    try:
+        charged = await quota.acquire(estimate_tokens(payload), upstream_priority.get(), timeout)
+        async with limiter.slot():
+            UPSTREAM_QUEUE_SECONDS.observe(time.monotonic() - started)
+            sent = True
+            sent_at = time.monotonic()
+            async with client.stream("POST", GROK_API_URL, json=dict(payload, stream=True),
+                                     timeout=httpx.Timeout(timeout, connect=GROK_CONNECT_TIMEOUT)) as resp:
+                if resp.is_error:
+                    await resp.aread()
+                    if resp.status_code == 429:
+                        quota.pause(retry_after_seconds(resp))
+                    quota.settle(charged, 0)
+                    resp.raise_for_status()
+                async for line in resp.aiter_lines():
+                    if time.monotonic() - started > timeout:
+                        raise httpx.ReadTimeout(f"Grok stream exceeded its {timeout:.1f}s budget")
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    try:
+                        event = loads_json(data)
+                    except ValueError:
+                        continue
+                    if event.get("usage"):
+                        usage = event["usage"]
+                        record_usage(model, usage)
+                        quota.settle(charged, usage_tokens(usage))
+                    for ch in event.get("choices") or []:
+                        delta = (ch.get("delta") or {}).get("content") or ch.get("text") or ""
+                        if delta:
+                            if first_token is None:
+                                first_token = time.monotonic() - sent_at
+                            if GROK_RECORD_PATH:
+                                recorded.append(delta)
+                            yield delta
+        outcome = "ok"
+    except (UpstreamBusy, GeneratorExit, asyncio.CancelledError):
+        raise
+    except Exception as e:
+        if sent:
+            outcome = breaker_outcome(e)
+        UPSTREAM_REQUESTS.labels(model, upstream_outcome(e)).inc()
+        raise
+    finally:
+        counted = breaker_result(outcome, full_timeout)
+        breaker.release(probe, counted)
+        if route is not None and counted is not None:
+            app.state.model_router.observe(route, model, time.monotonic() - started, counted)
+        if PROFILING_ENABLED:
+            note_upstream_wait(time.monotonic() - started)
+    UPSTREAM_REQUESTS.labels(model, "ok").inc()
+    if first_token is not None:
+        # labelled once the stream is done: usage (with the cached token count) comes last
+        UPSTREAM_TTFT_SECONDS.labels(model, prompt_cache_status(usage)).observe(first_token)
+    if GROK_RECORD_PATH:
+        await record_exchange(payload, {"choices": [{"message": {"content": "".join(recorded)}}]},
+                              time.monotonic() - started)
+
+_record_lock = threading.Lock()
+
+def _append_record(line: str) -> None:
+    with _record_lock, open(GROK_RECORD_PATH, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+
+async def record_exchange(payload: Dict[str, Any], response: Any, latency: float) -> None:
+    line = json.dumps({
+        "recorded_at": datetime.now(timezone.utc).replace(microsecond=0).isoformat(),
+        "latency": round(latency, 3),
+        "request": payload,
+        "response": response,
+    }, ensure_ascii=False)
+    await asyncio.to_thread(_append_record, line)
+
+def upstream_error(exc: Exception) -> Dict[str, Any]:
+    """Map an exception from the Grok call path to the endpoints' {"error": ...} payload."""
+    if isinstance(exc, DeadlineExceeded):
+        return {"error": f"Grok API timed out ({exc}). Try again later or with a larger deadline."}
+    if isinstance(exc, httpx.TimeoutException):
+        return {"error": "Grok API timed out. Try again later."}
+    if isinstance(exc, httpx.HTTPStatusError):
+        body = exc.response.text if (exc.response is not None) else ""
+        return {"error": f"HTTPError calling Grok: {exc}", "body": body}
+    return {"error": str(exc)}
+
+def extract_completion_text(res_json: Any) -> str:
+    content = ""
+    if isinstance(res_json, dict):
+        if "choices" in res_json and res_json["choices"]:
+            ch0 = res_json["choices"][0]
+            content = ch0.get("message", {}).get("content") or ch0.get("text") or ""
+        elif "output" in res_json:
+            if isinstance(res_json["output"], list):
+                content = " ".join(map(str, res_json["output"]))
+            else:
+                content = str(res_json["output"])
+        else:
+            content = json.dumps(res_json)
+    else:
+        content = str(res_json)
+    return content
+
+def clean_tweet_content(content: str) -> str:
+    cleaned_content = content.strip()
+    cleaned_content = re.sub(r'```json|```', '', cleaned_content)
+    cleaned_content = re.sub(r',\s*}', '}', cleaned_content)
+    cleaned_content = re.sub(r',\s*\]', ']', cleaned_content)
+    return cleaned_content
+
+def clean_exec_content(content: str) -> str:
+    cleaned_content = content.strip()
+    # keep markdown tables if present; only remove explicit triple backticks around json blocks
+    cleaned_content = re.sub(r'```json', '', cleaned_content)
+    # we will not blindly strip all backticks here to preserve markdown tables in `document`
+    cleaned_content = re.sub(r',\s*}', '}', cleaned_content)
+    cleaned_content = re.sub(r',\s*\]', ']', cleaned_content)
+    return cleaned_content
+
+# ----------------------
+# Robust JSON extraction: decode JSON objects in place from each candidate '{'
+# offset and prefer the largest valid one. Single pass, no substring copies.
+# ----------------------
+_JSON_DECODER = json.JSONDecoder()
+MIN_JSON_CANDIDATE_LEN = 22  # ignore tiny objects (same threshold as the old balanced-brace scan)
+# only a '{' followed by a key or '}' can start an object; skipping the rest up front matters
+# because every failed decode builds a JSONDecodeError, which costs O(offset) to locate
+RE_JSON_OBJECT_START = re.compile(r'\{\s*["}]')
+
+def _fix_json_quotes(s: str) -> str:
+    # quick heuristic fixes: smart quotes, tabs, single-quoted keys/values
+    fixed = s.replace("“", '"').replace("”", '"').replace("’", "'").replace("\t", " ")
+    fixed = re.sub(r"'([A-Za-z0-9_\- ]+)'\s*:", r'"\1":', fixed)
+    fixed = re.sub(r':\s*\'([^\']*)\'', r': "\1"', fixed)
+    return fixed
+
+def _largest_json_object(text: str) -> Tuple[Any, int]:
+    """
+    Walk the candidate '{' offsets left to right and raw_decode in place. A successful decode
+    jumps past the object (anything nested inside it is smaller), a failed one moves
+    on to the next '{'. Returns (obj, span) of the largest object, or (None, 0).
+    """
+    best, best_len = None, 0
+    m = RE_JSON_OBJECT_START.search(text)
+    while m:
+        i = m.start()
+        try:
+            obj, end = _JSON_DECODER.raw_decode(text, i)
+        except ValueError:
+            m = RE_JSON_OBJECT_START.search(text, i + 1)
+            continue
+        if end - i >= MIN_JSON_CANDIDATE_LEN and end - i > best_len:
+            best, best_len = obj, end - i
+        m = RE_JSON_OBJECT_START.search(text, end)
+    return best, best_len
+
+def extract_json_from_text(text: str) -> Any:
+    """
+    Robust extractor:
+     - a text that is exactly one JSON object is decoded in one (orjson) pass
+     - otherwise decodes JSON objects directly from every candidate '{' offset (json raw_decode)
+     - if the text needs quote fixes, also scans the fixed text once
+     - returns the largest valid JSON object found (strict parse wins ties)
+    Raises ValueError if none parse.
+    """
+    if not text or not isinstance(text, str):
+        raise ValueError("No text provided for JSON extraction")
+
+    stripped = text.strip()
+    if stripped.startswith("{") and stripped.endswith("}"):
+        try:  # the common case: the completion is exactly one JSON object
+            obj = loads_json(stripped)
+            if isinstance(obj, dict):
+                return obj
+        except ValueError:
+            pass
+
+    best, best_len = _largest_json_object(text)
+
+    fixed = _fix_json_quotes(text)
+    if fixed != text:
+        fixed_best, fixed_len = _largest_json_object(fixed)
+        if fixed_len > best_len:
+            best, best_len = fixed_best, fixed_len
+
+    if best is not None:
+        return best
+
+    # Fallback to original approach: try first { ... last } as a whole (catches tiny objects)
+    first = text.find("{")
+    last = text.rfind("}")
+    if first != -1 and last > first:
+        for candidate in (text[first:last+1], fixed[fixed.find("{"):fixed.rfind("}")+1]):
+            try:
+                return json.loads(candidate)
+            except ValueError:
+                continue
+
+    # If still no JSON found, raise informative error
+    raise ValueError("No valid JSON object found in text (attempted multiple heuristics)")
+
+# ----------------------
+# Local truncation repair: most failed parses are completions cut off mid-object.
+# Instead of a second Grok round trip, cut back to the last complete element and
+# close whatever is still open; the result must still pass the schema check.
+# ----------------------
+RE_JSON_STRUCT_TOKEN = re.compile(r'"(?P<body>[^"\\]*(?:\\.[^"\\]*)*)(?P<end>"?)|[{}\[\],:]', re.S)
+RE_PARTIAL_ESCAPE = re.compile(r'\\(?:u[0-9a-fA-F]{0,3})?$')
+_JSON_CLOSERS = {"{": "}", "[": "]"}
+
+def repair_truncated_json(text: str) -> Optional[Any]:
+    """
+    Repair a JSON object that was cut off before its end:
+     - inside an array of objects/arrays (tweets, tables, rows) the incomplete trailing
+       element is dropped as a whole
+     - an unterminated string value outside such arrays (e.g. `document`) is closed
+     - otherwise the innermost structure is cut back to its last complete member
+    then every open structure is closed. Returns the decoded object, or None when the
+    text is not a truncated object (or still does not parse).
+    """
+    start_m = RE_JSON_OBJECT_START.search(text or "")
+    if not start_m:
+        return None
+    # one [opener, offset just past its last complete member] per open structure
+    stack: List[List[Any]] = []
+    expect_key = False
+    open_string = None
+    for m in RE_JSON_STRUCT_TOKEN.finditer(text, start_m.start()):
+        tok = m.group(0)
+        if tok[0] == '"':
+            is_key = bool(stack) and stack[-1][0] == "{" and expect_key
+            if not m.group("end"):
+                open_string = None if is_key else m
+                break
+            if not is_key and stack:
+                stack[-1][1] = m.end()
+        elif tok in "{[":
+            stack.append([tok, m.end()])
+            expect_key = tok == "{"
+        elif tok in "}]":
+            if not stack:
+                return None
+            stack.pop()
+            if not stack:
+                return None  # the object is complete: not a truncation
+            stack[-1][1] = m.end()
+            expect_key = False
+        elif tok == ",":
+            if stack:
+                stack[-1][1] = m.start()
+                expect_key = stack[-1][0] == "{"
+        else:
+            expect_key = False
+    if not stack:
+        return None
+
+    # innermost array whose current element is itself an object/array
+    cut = next((lvl for lvl in range(len(stack) - 2, -1, -1) if stack[lvl][0] == "["), None)
+    if cut is not None:
+        head = text[start_m.start():stack[cut][1]]
+        stack = stack[:cut + 1]
+    elif open_string is not None and stack[-1][0] == "{":
+        head = text[start_m.start():open_string.end()]
+        head = RE_PARTIAL_ESCAPE.sub("", head) + '"'
+    else:
+        head = text[start_m.start():stack[-1][1]]
+    candidate = head + "".join(_JSON_CLOSERS[opener] for opener, _ in reversed(stack))
+    for attempt in (candidate, _fix_json_quotes(candidate)):
+        try:
+            return _LENIENT_JSON_DECODER.decode(attempt)
+        except ValueError:
+            continue
+    return None
+
+def is_tweets_payload(obj: Any) -> bool:
+    """Shape check against STRICT_SCHEMA_JSON (a lone tweet object or a fragment does not pass)."""
+    if not isinstance(obj, dict) or not ("tweets" in obj or "summary" in obj):
+        return False
+    tweets = obj.get("tweets") or []
+    if not isinstance(tweets, list) or not all(isinstance(t, dict) for t in tweets):
+        return False
+    return isinstance(obj.get("summary") or "", str) and isinstance(obj.get("cfo_insights") or [], list)
+
+def is_exec_payload(obj: Any) -> bool:
+    """Shape check against EXEC_SCHEMA_JSON (a lone table / source object does not pass)."""
+    if not isinstance(obj, dict) or not ("document" in obj or "highlights" in obj):
+        return False
+    if not isinstance(obj.get("document") or "", str):
+        return False
+    if not all(isinstance(obj.get(k) or [], list) for k in ("highlights", "tables", "sources")):
+        return False
+    return all(isinstance(t, dict) for t in obj.get("tables") or [])
+
+# ----------------------
+# Regex extraction fallback for tweets: one tokenizer pass over the text, every
+# field is assigned to the innermost {...} object it appears in.
+# ----------------------
+RE_TWEET_URL = re.compile(r"https?://(?:x\.com|twitter\.com)/(?P<author>[^/\s]+)/status/(?P<id>\d+)", re.IGNORECASE)
+RE_SUMMARY_FIELD = re.compile(r'"summary"\s*:\s*"(?P<summary>(?:\\.|[^"\\])*)"', re.S)
+_JSON_STRING_BODY = r'[^"\\]*(?:\\.[^"\\]*)*'  # unrolled (?:\\.|[^"\\])*, much faster in sre
+RE_TWEET_TOKEN = re.compile(
+    r'(?P<open>\{)|(?P<close>\})'
+    r'|"(?:(?P<key>id|author|created_at|text|url|why_selected)"\s*:\s*'
+    r'(?:"(?P<value>' + _JSON_STRING_BODY + r')"|(?P<number>\d+))'
+    # any other string is consumed whole so braces / urls inside it are not tokens
+    r'|(?P<string>' + _JSON_STRING_BODY + r')")'
+    r'|(?P<url>(?i:https?://(?:x\.com|twitter\.com))/[^/\s"]+/status/\d+)',
+    re.S,
+)
+RE_ID_VALUE = re.compile(r"\d{5,}")
+RE_AUTHOR_VALUE = re.compile(r"@?[\w_]{1,30}")
+_LENIENT_JSON_DECODER = json.JSONDecoder(strict=False)
+
+def decode_json_string(raw: str) -> str:
+    """Decode the body of a JSON string literal (keeps non-ASCII intact, unlike unicode_escape)."""
+    if "\\" not in raw:
+        return raw
+    try:
+        return _LENIENT_JSON_DECODER.decode('"' + raw + '"')
+    except ValueError:
+        return raw
+
+def _empty_tweet() -> Dict[str, str]:
+    return {"id": "", "author": "", "text": "", "url": "", "why_selected": "", "created_at": ""}
+
+def _set_tweet_url(tweet: Dict[str, str], url_m: "re.Match") -> None:
+    tweet["url"] = url_m.group(0)
+    if not tweet["id"]:
+        tweet["id"] = url_m.group("id")
+    if not tweet["author"]:
+        a = url_m.group("author")
+        tweet["author"] = a if a.startswith("@") else "@" + a
+
+def find_all_tweet_like_blocks(text: str) -> List[Dict[str, str]]:
+    results: List[Dict[str, str]] = []
+    if not text:
+        return results
+    # frames[0] is a root pseudo-object for fields that appear outside any braces
+    frames: List[Tuple[int, Dict[str, str]]] = [(0, _empty_tweet())]
+    with_text: List[Tuple[int, Dict[str, str]]] = []
+    url_only: List[Tuple[int, Dict[str, str]]] = []
+
+    def close(frame: Tuple[int, Dict[str, str]]) -> None:
+        tweet = frame[1]
+        if tweet["text"]:
+            with_text.append(frame)
+        elif tweet["url"]:
+            url_only.append(frame)
+
+    for m in RE_TWEET_TOKEN.finditer(text):
+        kind = m.lastgroup
+        if kind == "string":
+            # most tokens are keys / values we don't need; tweet links can also sit
+            # in other fields or inside the text itself
+            if "/status/" in m.group("string") and not frames[-1][1]["url"]:
+                url_m = RE_TWEET_URL.search(m.group("string"))
+                if url_m:
+                    _set_tweet_url(frames[-1][1], url_m)
+        elif kind == "open":
+            frames.append((m.start(), _empty_tweet()))
+        elif kind == "close":
+            if len(frames) > 1:
+                close(frames.pop())
+        elif kind == "value" or kind == "number":
+            key = m.group("key")
+            value = m.group("value") if kind == "value" else m.group("number")
+            tweet = frames[-1][1]
+            if key == "text":
+                if tweet["text"]:
+                    # a second text in the same object: brace-less list of tweets, start a new one
+                    close(frames[-1])
+                    frames[-1] = (m.start(), _empty_tweet())
+                    tweet = frames[-1][1]
+                tweet["text"] = decode_json_string(value)
+            elif key == "why_selected":
+                if not tweet["why_selected"]:
+                    tweet["why_selected"] = decode_json_string(value)
+            elif key == "id":
+                id_m = RE_ID_VALUE.match(value)
+                if id_m and not tweet["id"]:
+                    tweet["id"] = id_m.group(0)
+            elif key == "author":
+                author_m = RE_AUTHOR_VALUE.match(value)
+                if author_m and not tweet["author"]:
+                    author = author_m.group(0)
+                    tweet["author"] = author if author.startswith("@") else "@" + author
+            elif key == "created_at":
+                if value and not tweet["created_at"]:
+                    tweet["created_at"] = value
+            elif key == "url":
+                url_m = RE_TWEET_URL.search(value)
+                if url_m and not tweet["url"]:
+                    _set_tweet_url(tweet, url_m)
+        else:
+            # bare tweet url outside any string (prose output): a tweet of its own
+            tweet = _empty_tweet()
+            _set_tweet_url(tweet, RE_TWEET_URL.match(m.group(0)))
+            url_only.append((m.start(), tweet))
+
+    # truncated output: whatever is still open counts as well
+    for frame in frames:
+        close(frame)
+    if with_text:
+        # url-only blocks are used only when no text field was found at all (as before)
+        ordered = sorted(with_text, key=lambda f: f[0])
+    else:
+        ordered = sorted(url_only, key=lambda f: f[0])
+    results = [tweet for _, tweet in ordered]
+
+    dedup: Dict[str, Dict[str, str]] = {}
+    for r in results:
+        key = r.get("id") or r.get("url") or r.get("text")[:40]
+        if not key:
+            continue
+        if key in dedup:
+            existing = dedup[key]
+            for f in ("author", "text", "url", "why_selected", "created_at"):
+                if not existing.get(f) and r.get(f):
+                    existing[f] = r.get(f)
+        else:
+            dedup[key] = r
+    return list(dedup.values())
+
+def sanitize_tweet_obj(t: Dict[str, Any]) -> Dict[str, Any]:
+    return Tweet.clean(t if isinstance(t, dict) else {})
+
+def sanitize_exec_tables(tables: List[Any]) -> List[Dict[str, Any]]:
+    return [ExecTable.clean(t) for t in tables if isinstance(t, dict)]
+
+def sanitize_exec_sources(sources: List[Any]) -> List[Dict[str, Any]]:
+    """Sources through ExecSource; a bare URL string becomes {"title": "", "url": ...}."""
+    out = []
+    for src in sources:
+        source = ExecSource.clean({"url": src} if isinstance(src, str) else src)
+        if source is not None and (source["url"] or source["title"]):
+            out.append(source)
+    return out
+
+# ----------------------
+# Prompt prefixes: Grok caches prompt prefixes, so each builder sends its static part
+# (role, schema, shared rules) as a byte-stable system message and everything that
+# varies per request (time window, topic, n, countries) last, in the user message.
+# The window's end is rounded up to PROMPT_WINDOW_SECONDS so that repeated requests
+# within one step send identical prompts. Cached prompt tokens reported in `usage`
+# are counted per model, and call latency / time to first token are labelled by
+# prompt-cache hit.
+# ----------------------
+PROMPT_WINDOW_SECONDS = int(os.getenv("PROMPT_WINDOW_SECONDS", "900"))
+
+# ----------------------
+# Exec prompt builder (explicitly requests machine-readable tables)
+# ----------------------
+EXEC_USER_BRIEF = (
+    "Prepare Executive Briefing Pack covering regulatory developments, AI developments in tech "
+    "and in deployment/adoption by different industries/countries, M&A update deals executed and its details, "
+    "cyberattack. Discuss with date of events and cover your analysis in last 24 hours.\n\n"
+    "Cyber attack : New attacks reported in different parts of world, details of incident, impact it caused, "
+    "segregate that into private sector, govt sector, who caused it, what sort of attack (e.g., ransomware) and recovery efforts. "
+    "If no attack, bring recovery efforts underway for earlier reported incidents.\n\n"
+    "Rules and regulations development : in fintech, banking, different industries related regulatory new updates, crypto world developments, "
+    "accounting, taxation, insurance, law, data privacy, auditing - only new updates.\n\n"
+    "Audit /consulting firms news update : It can cover audit firms related news such as EY/KPMG/PwC related actions - violation/fines/use of AI/Deployment of AI in finance/audit world.\n\n"
+    "Mergers & Acquisitions : New deals announced, acquirer, acquiree, size, valuation metrics, rationale, impact, valuation basis.\n\n"
+    "Give citation references from where details sought so users can click and expand more. General CFO - Lessons from the above - just summary lines."
+)
+
+EXEC_DO_NOT_RULES = (
+    "Return only a single VALID JSON object and nothing else. Use double quotes only. "
+    "Do NOT include salutations, greetings, 'Hello', 'Hi', 'Dear', or conversational openers. "
+    "Start the `document` content directly with the briefing title or first section (no preamble). "
+    "The `document` field should be readable and may include Markdown (including markdown tables). "
+    "Additionally, include a machine-readable `tables` array: each table entry must be {title, headers: [...], rows: [[...],[...]]}. "
+    "If you include a visual table inside `document`, also include the same table in `tables` for programmatic use."
+)
+
+# static prefix: identical bytes for every exec request (see "Prompt prefixes" above)
+EXEC_SYSTEM_PROMPT = (
+    "You are a precise briefing writer that prepares high-quality Executive Briefing Packs for senior executives. Output valid JSON only.\n\n"
+    "Output Requirement:\n"
+    "Return a STRICT, valid JSON object using the exact schema below (no extra keys, no commentary):\n\n"
+    f"{EXEC_SCHEMA_JSON}\n\n"
+    "- FORMAT: Provide the briefing in `document` (readable text). If there are tabular items (e.g., M&A or deals), embed a readable Markdown table in `document` and ALSO include a corresponding structured object in `tables`.\n\n"
+    f"USER BRIEF:\n{EXEC_USER_BRIEF}\n\n"
+    f"Other rules:\n{EXEC_DO_NOT_RULES}\n\n"
+    "If you cannot find content for a subsection, explicitly state 'No material new items in the last 24 hours' for that subsection but provide a short analytical comment. Always return valid JSON even if some arrays are empty."
+)
+
+def build_exec_prompt(countries: List[str], start_iso: str, end_iso: str) -> Dict[str, Any]:
+    prompt_text = (
+        "Instructions:\n"
+        f"- TIME WINDOW: Only consider news and social posts published between {start_iso} (inclusive) and {end_iso} (inclusive) — i.e., the last 24 hours.\n"
+        f"- SCOPE: Limit your search and synthesis to events and reporting relating to these countries ONLY: {', '.join(countries)}."
+    )
+
+    payload = {
+        "model": GROK_MODEL,
+        "messages": [
+            {"role": "system", "content": EXEC_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt_text}
+        ],
+        # increased to reduce truncation (model limits permitting)
+        "temperature": 0.0,
+        "max_tokens": 3500
+    }
+
+    return {"prompt": EXEC_SYSTEM_PROMPT + "\n\n" + prompt_text, "payload": payload}
+
+
+def last_24h_window() -> Tuple[str, str]:
+    """The last 24 hours, with the end rounded up to PROMPT_WINDOW_SECONDS (0: to the second)."""
+    now = time.time()
+    if PROMPT_WINDOW_SECONDS > 0:
+        now = -(-now // PROMPT_WINDOW_SECONDS) * PROMPT_WINDOW_SECONDS
+    end_utc = datetime.fromtimestamp(int(now), timezone.utc)
+    start_utc = end_utc - timedelta(hours=24)
+    return start_utc.isoformat(), end_utc.isoformat()
+
+# ----------------------
+# Token budget for tweet completions: sized from n and the per-tweet cost of
+# STRICT_SCHEMA_JSON instead of one fixed max_tokens for every n.
+# ----------------------
+TWEET_TOKENS_PER_ITEM = int(os.getenv("TWEET_TOKENS_PER_ITEM", "170"))  # one tweet object incl. verbatim text
+TWEET_TOKENS_BASE = int(os.getenv("TWEET_TOKENS_BASE", "300"))  # summary, cfo_insights, JSON framing
+TWEET_TOKENS_HEADROOM = 1.25
+TWEET_MAX_TOKENS_CAP = int(os.getenv("TWEET_MAX_TOKENS_CAP", "4000"))
+
+def tweet_max_tokens(n: int, with_summary: bool = True) -> int:
+    """max_tokens for a completion of n tweets (n=5 with a summary gives ~1400, the old fixed value)."""
+    estimate = TWEET_TOKENS_PER_ITEM * max(1, n) + (TWEET_TOKENS_BASE if with_summary else TWEET_TOKENS_BASE // 4)
+    return min(TWEET_MAX_TOKENS_CAP, int(estimate * TWEET_TOKENS_HEADROOM))
+
+TWEET_DO_NOT_RULES = (
+    "Do NOT paraphrase or rewrite the tweet text field — return the tweet text EXACTLY as posted (verbatim). "
+    "Do NOT add commentary inline. Do NOT invent URLs. If you cannot determine the exact tweet URL or it is not available, set url to \"\". "
+    "All dates must be ISO 8601 (UTC). Use double quotes only. Output only a single top-level JSON object and nothing else."
+)
+
+# static prefix: identical bytes for every tweet request (see "Prompt prefixes" above)
+TWEET_SYSTEM_PROMPT = (
+    "You are a precise data extractor that searches Twitter/X for very recent, high-quality posts. Output valid JSON only.\n\n"
+    "Output Requirement:\n"
+    "Return a STRICT, valid JSON object using the exact schema below (no extra keys, no commentary):\n\n"
+    f"{STRICT_SCHEMA_JSON}\n\n"
+    "Ranking: rank tweets primarily by engagement (likes+retweets+replies) and secondarily by recency. "
+    "Prefer tweets from authoritative/verified accounts and official sources when available (unless PREFER_VERIFIED is No).\n\n"
+    "Field rules and details:\n"
+    "- tweet.text must be EXACT verbatim tweet text (do not summarize or paraphrase). Replace newline characters with a single space.\n"
+    "- tweet.created_at must be ISO 8601 UTC (e.g. 2025-10-27T14:23:00Z). If you cannot get exact timestamp, set created_at to empty string.\n"
+    "- tweet.url must be the canonical X/Twitter URL of the tweet if available (https://x.com/<handle>/status/<id>). If you cannot reliably provide the URL, set it to \"\".\n"
+    "- Provide engagement numbers (retweets, replies, likes) if available; otherwise set to 0.\n"
+    "- why_selected: one short sentence (<= 120 chars) explaining why this tweet was chosen.\n\n"
+    f"Other rules:\n{TWEET_DO_NOT_RULES}\n\n"
+    "If you are unable to return the fully valid JSON (for example due to truncation), return the best-effort JSON object that remains valid JSON (do not return text or code blocks)."
+)
+
+def build_grok_prompt(topic: str, n: int, prefer_verified: bool = True, since_iso: Optional[str] = None,
+                      rank_offset: int = 0) -> Dict[str, Any]:
+    """
+    Build the payload (prompt + model args) to send to Grok for tweet extraction.
+    The system message is the static TWEET_SYSTEM_PROMPT; everything that varies per
+    request goes in the user message after it.
+    `since_iso` narrows the window to posts after the last successful fetch (tweet store).
+    `rank_offset` > 0 asks for a later slice of the ranking (sharded requests); such
+    slices skip the summary, which the first slice provides.
+    Returns a dict with keys: 'prompt' (str) and 'payload' (dict for call_grok).
+    """
+    # Compute last-24-hours window in ISO8601 (UTC)
+    start_iso, end_iso = last_24h_window()
+    window_desc = "the last 24 hours"
+    if since_iso and since_iso > start_iso:
+        start_iso, window_desc = since_iso, "only posts newer than our previous fetch"
+
+    # Ensure we have a topic-specific instruction
+    topic_key = topic.lower()
+    topic_instr = TOPIC_INSTRUCTIONS.get(topic_key, f"Return tweets strictly about {topic}.")
+
+    ranking = "Return up to {n} tweets.".format(n=n)
+    if rank_offset:
+        ranking = (
+            "SKIP the first {offset} tweets of the ranking (another request returns them) and return up to {n} tweets "
+            "from positions {first}-{last}. Set summary to \"\" and cfo_insights to []."
+        ).format(offset=rank_offset, n=n, first=rank_offset + 1, last=rank_offset + n)
+
+    prompt_text = (
+        "Search & filtering instructions:\n"
+        f"- TIME WINDOW: Only consider tweets posted between {start_iso} (inclusive) and {end_iso} (inclusive) — i.e., {window_desc}.\n"
+        f"- TOPIC: {topic_instr}\n"
+        f"- RANKING: {ranking}\n"
+        f"- PREFER_VERIFIED: {'Yes' if prefer_verified else 'No'}"
+    )
+
+    # Build model payload
+    payload = {
+        "model": GROK_MODEL,
+        "messages": [
+            {"role": "system", "content": TWEET_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt_text}
+        ],
+        "temperature": 0.0,
+        "max_tokens": tweet_max_tokens(n, with_summary=not rank_offset)
+    }
+
+    return {"prompt": TWEET_SYSTEM_PROMPT + "\n\n" + prompt_text, "payload": payload}
+
+# ----------------------
+# Standard tweet endpoint (unchanged logic)
+# ----------------------
+@app.get("/")
+def serve_frontend(request: Request):
+    print("HELLO BANSAL")
+    return app.state.static_assets.response(request, "index.html")
+
+@app.get("/get_summary")
+async def get_summary(
+    request: Request,
+    topic: str = Query(..., description="Topic such as finance, cyber, regulation, etc"),
+    n: int = Query(5, description="Number of top tweets to fetch (prefer <=10, at most SUMMARY_MAX_N)"),
+    raw: bool = Query(False, description="Return raw grok output for debugging"),
+    fresh: bool = Query(False, description="Bypass the response cache and refetch from Grok"),
+    deadline: Optional[float] = Query(None, description="Overall time budget in seconds (default SUMMARY_DEADLINE_SECONDS)"),
+    fields: Optional[str] = Query(None, description="Comma-separated keys to return, e.g. summary,tweets.text,tweets.url (default: all)"),
+    debug: bool = Query(False, description="Include debug fields such as raw_content")
+):
+    if not GROK_API_KEY:
+        return {"error": "GROK_API_KEY not configured on server (set in .env)"}
+    n = clamp_summary_n(n)
+    budget = request_deadline(deadline, SUMMARY_DEADLINE_SECONDS)
+    if raw:
+        connected, result = await unless_disconnected(request, "summary", fetch_summary(topic, n, raw=True, deadline=budget))
+        return result if connected else Response(status_code=CLIENT_CLOSED_REQUEST)
+
+    connected, out = await unless_disconnected(request, "summary", cached_summary(topic, n, fresh=fresh, deadline=budget))
+    if not connected:
+        return Response(status_code=CLIENT_CLOSED_REQUEST)
+    result, status = out
+    return encoded_json(request, response_view(result, parse_fields(fields), debug), {"X-Cache": status})
+
+def summary_key(topic: str) -> Tuple:
+    return ("summary", topic.strip().lower())
+
+def summary_cache_key(topic: str) -> Tuple:
+    return summary_key(topic) + (cache_bucket(),)
+
+async def cached_summary(topic: str, n: int, fresh: bool = False,
+                         deadline: Optional[Deadline] = None) -> Tuple[Dict[str, Any], str]:
+    """
+    fetch_summary through the prefetch store and the response cache;
+    returns (result sliced to n, cache status). A coalesced caller waits on the
+    leader's fetch, which runs under the leader's deadline.
+    """
+    warm = None if fresh else app.state.prefetch.lookup(summary_key(topic), n)
+    if warm is not None:
+        result, status = warm, "prefetch"
+    else:
+        cache: ResponseCache = app.state.response_cache
+        result, status = await cache.get_or_fetch(summary_cache_key(topic), n, lambda: fetch_summary(topic, n, deadline=deadline), force=fresh)
+    CACHE_LOOKUPS.labels("summary", status).inc()
+    if "tweets" not in result:
+        return result, status
+    # one view per (cached value, topic, n): repeat hits return the same object, so
+    # encoded_json can reuse its serialized body
+    views: IdentityMemo = app.state.summary_views
+    view = views.get(result, topic, n)
+    if view is None:
+        view = dict(result, topic=topic, tweets=result["tweets"][:n])
+        views.put(result, view, topic, n)
+    return view, status
+
+async def finalize_summary(topic: str, n: int, content: str, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+    """
+    Parse cleaned Grok content into the tweets response. On failure: local truncation
+    repair, then a reformat call (within what is left of `deadline`), then the regex fallback.
+    """
+    try:
+        with stage_timer("summary", "extract_json"):
+            parsed = extract_json_from_text(content)
+        if not is_tweets_payload(parsed):
+            raise ValueError("Parsed JSON does not match the tweets schema")
+        tweets = parsed.get("tweets", []) or []
+        summary = parsed.get("summary", "") or ""
+        cfo_insights = parsed.get("cfo_insights") or parsed.get("cfo_insights", []) or []
+        sanitized = [sanitize_tweet_obj(t) for t in tweets][:n]
+        return {
+            "topic": topic,
+            "tweets": sanitized,
+            "summary": summary,
+            "cfo_insights": cfo_insights,
+            "source": "grok",
+            "raw_content": None
+        }
+    except Exception as primary_err:
+        with stage_timer("summary", "local_repair"):
+            repaired = repair_truncated_json(content)
+        if is_tweets_payload(repaired) and (repaired.get("tweets") or repaired.get("summary")):
+            return {
+                "topic": topic,
+                "tweets": [sanitize_tweet_obj(t) for t in repaired.get("tweets") or []][:n],
+                "summary": repaired.get("summary") or "",
+                "cfo_insights": repaired.get("cfo_insights") or [],
+                "source": "local_repair",
+                "raw_content": content
+            }
+        fix_prompt = (
+            "The content below was intended to be valid JSON following a strict schema, "
+            "but the returned text appears malformed or truncated. "
+            "Please OUTPUT ONLY a valid JSON object that follows the schema previously requested. "
+            "If a tweet is incomplete, drop it. Keep fields compact and use double quotes.\n\n"
+            "RAW CONTENT START:\n\n" + content + "\n\nRAW CONTENT END."
+        )
+        fix_payload = {
+            "model": GROK_FAST_MODEL,
+            "messages": [
+                {"role": "system", "content": "You are a precise data extractor. Output VALID, STRICT JSON only. Never repeat keys or leave trailing commas."},
+                {"role": "user", "content": fix_prompt}
+            ],
+            "temperature": 0.0,
+            "max_tokens": reformat_max_tokens(content)
+        }
+        try:
+            with stage_timer("summary", "reformat"):
+                fix_json = await call_grok(fix_payload, deadline=deadline, hedge="summary_reformat", route="summary_reformat")
+            fix_content = ""
+            if isinstance(fix_json, dict) and "choices" in fix_json and fix_json["choices"]:
+                ch0 = fix_json["choices"][0]
+                fix_content = ch0.get("message", {}).get("content") or ch0.get("text") or ""
+            else:
+                fix_content = json.dumps(fix_json)
+            try:
+                parsed2 = extract_json_from_text(fix_content)
+                if not is_tweets_payload(parsed2):
+                    raise ValueError("Reformatted JSON does not match the tweets schema")
+                tweets = parsed2.get("tweets", []) or []
+                summary = parsed2.get("summary", "") or ""
+                cfo_insights = parsed2.get("cfo_insights") or []
+                sanitized = [sanitize_tweet_obj(t) for t in tweets][:n]
+                return {
+                    "topic": topic,
+                    "tweets": sanitized,
+                    "summary": summary,
+                    "cfo_insights": cfo_insights,
+                    "source": "grok_reformat",
+                    "raw_content": content
+                }
+            except Exception as reformat_err:
+                with stage_timer("summary", "regex_fallback"):
+                    fallback = find_all_tweet_like_blocks(content)
+                sanitized = [sanitize_tweet_obj(t) for t in fallback][:n]
+                summary_m = RE_SUMMARY_FIELD.search(content)
+                summary_text = summary_m.group("summary") if summary_m else ""
+                return {
+                    "topic": topic,
+                    "tweets": sanitized,
+                    "summary": summary_text,
+                    "cfo_insights": [],
+                    "source": "regex_fallback",
+                    "raw_content": content,
+                    "parse_error": str(primary_err),
+                    "reformat_error": str(reformat_err)
+                }
+        except Exception as fix_call_exc:
+            with stage_timer("summary", "regex_fallback"):
+                fallback = find_all_tweet_like_blocks(content)
+            sanitized = [sanitize_tweet_obj(t) for t in fallback][:n]
+            summary_m = RE_SUMMARY_FIELD.search(content)
+            summary_text = summary_m.group("summary") if summary_m else ""
+            return {
+                "topic": topic,
+                "tweets": sanitized,
+                "summary": summary_text,
+                "cfo_insights": [],
+                "source": "regex_fallback_direct",
+                "raw_content": content,
+                "parse_error": str(primary_err),
+                "reformat_call_error": str(fix_call_exc)
+            }
+
+@reports_demoted_routes
+async def fetch_summary(topic: str, n: int, raw: bool = False, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+    """
+    Call Grok for the top-n tweets on a topic and parse them (uncached).
+    n above SUMMARY_SHARD_SIZE is split into concurrent ranking slices (see summary_slices).
+    With the tweet store enabled only posts since the last successful fetch are
+    requested, and the response carries the merged top-n from the store.
+    All upstream calls share `deadline` (default: SUMMARY_DEADLINE_SECONDS from now).
+    """
+    deadline = deadline or Deadline(SUMMARY_DEADLINE_SECONDS)
+    store: Optional[TweetStore] = app.state.tweet_store
+    fetched_at = datetime.now(timezone.utc).replace(microsecond=0).isoformat()
+    since_iso = await store.window_start(topic) if store is not None else None
+
+    try:
+        if raw:
+            payload = build_grok_prompt(topic, n, prefer_verified=True, since_iso=since_iso)["payload"]
+            res_json = await call_grok(payload, deadline=deadline, hedge="summary", route="summary")
+            return {"raw_response": res_json, "content": clean_tweet_content(extract_completion_text(res_json))}
+
+        want = near_dup_candidates(n)
+        slices = summary_slices(want)
+        if len(slices) > 1:
+            result = await fetch_summary_sharded(topic, want, slices, since_iso, deadline)
+        else:
+            result = await fetch_summary_slice(topic, want, since_iso, 0, deadline)
+        if store is not None:
+            with stage_timer("summary", "store_merge"):
+                result = await store.merge(topic, want, result, fetched_at)
+        return collapse_summary(result, n)
+
+    except UpstreamBusy:
+        raise
+    except Exception as e:
+        RESULT_SOURCES.labels("summary", "error").inc()
+        return upstream_error(e)
+
+async def fetch_summary_slice(topic: str, n: int, since_iso: Optional[str], rank_offset: int,
+                              deadline: Deadline) -> Dict[str, Any]:
+    """One Grok call for ranking positions rank_offset+1 .. rank_offset+n, parsed."""
+    payload = build_grok_prompt(topic, n, prefer_verified=True, since_iso=since_iso, rank_offset=rank_offset)["payload"]
+    with stage_timer("summary", "upstream"):
+        res_json = await call_grok(payload, deadline=deadline, hedge="summary", route="summary")
+
+    with stage_timer("summary", "clean"):
+        content = clean_tweet_content(extract_completion_text(res_json))
+
+    result = await finalize_summary(topic, n, content, deadline)
+    count_result("summary", result)
+    return result
+
+# ----------------------
+# Sharded tweet requests: large n is split into concurrent requests for disjoint
+# slices of the ranking, so each completion stays short instead of one long one
+# that truncates. Slices are merged in rank order and deduped by id / url.
+# n is capped at SUMMARY_MAX_N, and one request fans out to at most SUMMARY_MAX_SHARDS
+# calls and never more than the upstream limiter has free slots for, so a large n
+# gets bigger slices rather than taking every slot from other clients. A failed
+# slice is retried once while the deadline allows; a result that still has a
+# failed slice is served but not cached.
+# ----------------------
+SUMMARY_SHARD_SIZE = int(os.getenv("SUMMARY_SHARD_SIZE", "10"))  # 0 disables sharding
+SUMMARY_MAX_SHARDS = int(os.getenv("SUMMARY_MAX_SHARDS", "4"))
+SUMMARY_MAX_N = int(os.getenv("SUMMARY_MAX_N", "50"))
+# worst recovery path first: the merged result reports the most degraded shard's source
+SOURCE_SEVERITY = ["grok", "local_repair", "grok_reformat", "regex_fallback", "regex_fallback_direct"]
+
+def clamp_summary_n(n: int) -> int:
+    return max(1, min(n, SUMMARY_MAX_N))
+
+def summary_slices(n: int) -> List[Tuple[int, int]]:
+    """(rank_offset, size) of each ranking slice to request for n tweets, in rank order."""
+    if not 0 < SUMMARY_SHARD_SIZE < n:
+        return [(0, n)]
+    limiter: UpstreamLimiter = app.state.upstream_limiter
+    free = limiter.max_inflight - limiter.inflight
+    count = max(1, min(-(-n // SUMMARY_SHARD_SIZE), SUMMARY_MAX_SHARDS, free))
+    size = -(-n // count)
+    return [(off, min(size, n - off)) for off in range(0, n, size)]
+
+def slice_failed(shard: Any) -> bool:
+    return isinstance(shard, Exception) or (isinstance(shard, dict) and "error" in shard)
+
+async def fetch_summary_slice_retried(topic: str, n: int, since_iso: Optional[str], rank_offset: int,
+                                      deadline: Deadline) -> Dict[str, Any]:
+    """fetch_summary_slice, tried once more if it fails and the deadline leaves room for another call."""
+    try:
+        result = await fetch_summary_slice(topic, n, since_iso, rank_offset, deadline)
+    except DeadlineExceeded:
+        raise
+    except Exception:
+        if deadline.remaining() < DEADLINE_MIN_STEP_SECONDS:
+            raise
+        result = None
+    if result is not None and not slice_failed(result):
+        return result
+    SHARD_RETRIES.inc()
+    return await fetch_summary_slice(topic, n, since_iso, rank_offset, deadline)
+
+async def fetch_summary_sharded(topic: str, n: int, slices: List[Tuple[int, int]], since_iso: Optional[str],
+                                deadline: Deadline) -> Dict[str, Any]:
+    shards = await asyncio.gather(
+        *[fetch_summary_slice_retried(topic, size, since_iso, off, deadline) for off, size in slices],
+        return_exceptions=True,
+    )
+    raise_if_abandoned(shards)
+    return merge_summary_shards(topic, n, shards)
+
+def merge_summary_shards(topic: str, n: int, shards: List[Any]) -> Dict[str, Any]:
+    """Merge slice results (or their exceptions), given in rank order, into one tweets result."""
+    ok = [r for r in shards if isinstance(r, dict) and "error" not in r]
+    if not ok:
+        # nothing usable: surface busy as a 503 like the unsharded path, otherwise the first error
+        for r in shards:
+            if isinstance(r, UpstreamBusy):
+                raise r
+        first = shards[0]
+        return upstream_error(first) if isinstance(first, BaseException) else first
+
+    tweets: List[Dict[str, Any]] = []
+    seen = set()
+    for shard in ok:
+        for t in shard.get("tweets") or []:
+            key = TweetStore.tweet_key(t)
+            if key and key in seen:
+                continue
+            seen.add(key)
+            tweets.append(t)
+    sources = [r.get("source", "") if isinstance(r, dict) and "error" not in r else "error" for r in shards]
+    result = {
+        "topic": topic,
+        "tweets": tweets[:n],
+        "summary": next((r["summary"] for r in ok if r.get("summary")), ""),
+        "cfo_insights": next((r["cfo_insights"] for r in ok if r.get("cfo_insights")), []),
+        "source": max((r["source"] for r in ok), key=lambda src: SOURCE_SEVERITY.index(src) if src in SOURCE_SEVERITY else 0),
+        "raw_content": None,
+        "shards": sources,
+    }
+    # a shard that needed the regex fallback (or failed) means the window was not fully covered
+    parse_error = next((r["parse_error"] for r in ok if "parse_error" in r), None)
+    if parse_error is None and len(ok) < len(shards):
+        parse_error = "some shards failed"
+    if parse_error is not None:
+        result["parse_error"] = parse_error
+    return result
+
+# ----------------------
+# Persistent tweet store (SQLite): sanitized tweets per topic + last successful
+# fetch per topic, so refreshes only ask Grok for posts since the previous fetch.
+# Off by default; set TWEET_STORE_PATH (e.g. tweets.db) to enable.
+# ----------------------
+TWEET_STORE_PATH = os.getenv("TWEET_STORE_PATH", "")
+# re-request a little before the last fetch so late-indexed posts are not missed
+TWEET_STORE_OVERLAP_MINUTES = float(os.getenv("TWEET_STORE_OVERLAP_MINUTES", "10"))
+
+TWEET_STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tweets (
+    topic TEXT NOT NULL,
+    tweet_key TEXT NOT NULL,
+    id TEXT NOT NULL DEFAULT '',
+    author TEXT NOT NULL DEFAULT '',
+    created_at TEXT NOT NULL DEFAULT '',
+    text TEXT NOT NULL DEFAULT '',
+    url TEXT NOT NULL DEFAULT '',
+    why_selected TEXT NOT NULL DEFAULT '',
+    retweets INTEGER NOT NULL DEFAULT 0,
+    replies INTEGER NOT NULL DEFAULT 0,
+    likes INTEGER NOT NULL DEFAULT 0,
+    first_seen_at TEXT NOT NULL,
+    PRIMARY KEY (topic, tweet_key)
+);
+CREATE INDEX IF NOT EXISTS idx_tweets_id ON tweets(id);
+CREATE INDEX IF NOT EXISTS idx_tweets_topic_created ON tweets(topic, created_at);
+CREATE TABLE IF NOT EXISTS fetch_state (
+    topic TEXT PRIMARY KEY,
+    last_success_at TEXT NOT NULL,
+    summary TEXT NOT NULL DEFAULT '',
+    cfo_insights TEXT NOT NULL DEFAULT '[]'
+);
+"""
+
+TWEET_FIELDS = ("id", "author", "created_at", "text", "url", "why_selected")
+TWEET_COUNT_FIELDS = ("retweets", "replies", "likes")  # engagement only grows: keep the max seen
+
+def parse_iso(value: Any) -> Optional[datetime]:
+    """An ISO 8601 timestamp ("Z" or an offset, with or without seconds) as aware UTC; naive means UTC."""
+    if not isinstance(value, str) or not value.strip():
+        return None
+    try:
+        dt = datetime.fromisoformat(value.strip().replace("Z", "+00:00").replace("z", "+00:00"))
+    except ValueError:
+        return None
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt.astimezone(timezone.utc)
+
+class TweetStore:
+    """
+    Blocking sqlite3 work runs in a worker thread (asyncio.to_thread) on one shared
+    connection guarded by a lock. Tweets are keyed per topic by id, else url, else
+    the first 40 chars of text (the same key find_all_tweet_like_blocks dedups on).
+    """
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript(TWEET_STORE_SCHEMA)
+            # stores created before the engagement columns existed
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(tweets)")}
+            for f in TWEET_COUNT_FIELDS:
+                if f not in columns:
+                    self._conn.execute(f"ALTER TABLE tweets ADD COLUMN {f} INTEGER NOT NULL DEFAULT 0")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def tweet_key(t: Dict[str, Any]) -> str:
+        return t.get("id") or t.get("url") or (t.get("text") or "")[:40]
+
+    def _state(self, topic: str) -> Optional[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute("SELECT * FROM fetch_state WHERE topic = ?", (topic,)).fetchone()
+
+    def _save(self, topic: str, tweets: List[Dict[str, Any]], fetched_at: str,
+              summary: Optional[str], cfo_insights: Optional[List[Any]]) -> None:
+        rows = [(topic, self.tweet_key(t), *(t.get(f, "") for f in TWEET_FIELDS),
+                 *(t.get(f) or 0 for f in TWEET_COUNT_FIELDS), fetched_at)
+                for t in tweets if self.tweet_key(t)]
+        columns = ("topic", "tweet_key") + TWEET_FIELDS + TWEET_COUNT_FIELDS + ("first_seen_at",)
+        with self._lock, self._conn:
+            # keep the first non-empty value of every field, like the regex fallback dedup
+            self._conn.executemany(
+                f"INSERT INTO tweets ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                "ON CONFLICT(topic, tweet_key) DO UPDATE SET "
+                + ", ".join([f"{f} = CASE WHEN {f} = '' THEN excluded.{f} ELSE {f} END" for f in TWEET_FIELDS]
+                            + [f"{f} = MAX({f}, excluded.{f})" for f in TWEET_COUNT_FIELDS]),
+                rows,
+            )
+            if summary is not None:
+                self._conn.execute(
+                    "INSERT INTO fetch_state (topic, last_success_at, summary, cfo_insights) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(topic) DO UPDATE SET last_success_at = excluded.last_success_at, "
+                    "summary = CASE WHEN excluded.summary = '' THEN summary ELSE excluded.summary END, "
+                    "cfo_insights = CASE WHEN excluded.cfo_insights = '[]' THEN cfo_insights ELSE excluded.cfo_insights END",
+                    (topic, fetched_at, summary, json.dumps(cfo_insights or [])),
+                )
+
+    def _query(self, topic: str, since: datetime, limit: int) -> List[Dict[str, Any]]:
+        """
+        Tweets posted since `since` (without a usable created_at: first seen since then),
+        ranked by engagement, then recency.
+        """
+        # first_seen_at is always written by us in one format, so it can bound the scan as a
+        # string; created_at comes from Grok in mixed formats and is compared parsed
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM tweets WHERE topic = ? AND first_seen_at >= ?"
+                " ORDER BY retweets + replies + likes DESC, first_seen_at DESC",
+                (topic, since.replace(microsecond=0).isoformat()),
+            ).fetchall()
+        dated = []
+        for row in rows:
+            sort_at = parse_iso(row["created_at"]) or parse_iso(row["first_seen_at"])
+            if sort_at is not None and sort_at >= since:
+                dated.append((sort_at, row))
+        # most engagement first (likes + retweets + replies), then newest
+        dated.sort(key=lambda d: (sum(d[1][f] for f in TWEET_COUNT_FIELDS), d[0]), reverse=True)
+        return [sanitize_tweet_obj(dict(row)) for _, row in dated[:limit]]
+
+    async def window_start(self, topic: str) -> Optional[str]:
+        """Start of the incremental fetch window for a topic, or None if never fetched."""
+        state = await asyncio.to_thread(self._state, topic.strip().lower())
+        if state is None:
+            return None
+        last = datetime.fromisoformat(state["last_success_at"])
+        return (last - timedelta(minutes=TWEET_STORE_OVERLAP_MINUTES)).replace(microsecond=0).isoformat()
+
+    async def merge(self, topic: str, n: int, result: Dict[str, Any], fetched_at: str) -> Dict[str, Any]:
+        """
+        Store the freshly fetched tweets and answer with up to n tweets: the ones Grok
+        just returned (always, in Grok's order), then the most engaged stored ones from
+        the last 24h.
+        Only a clean parse (no parse_error) advances the fetch window.
+        """
+        if "tweets" not in result:
+            return result
+        key = topic.strip().lower()
+        clean = "parse_error" not in result
+        fresh = result["tweets"]
+        await asyncio.to_thread(self._save, key, fresh, fetched_at,
+                                result.get("summary", "") if clean else None,
+                                result.get("cfo_insights") if clean else None)
+        start_iso, _ = last_24h_window()
+        stored = await asyncio.to_thread(self._query, key, parse_iso(start_iso), n + len(fresh))
+        fresh_keys = {self.tweet_key(t) for t in fresh}
+        merged = (list(fresh) + [t for t in stored if self.tweet_key(t) not in fresh_keys])[:n]
+        state = await asyncio.to_thread(self._state, key)
+        summary = result.get("summary") or (state["summary"] if state else "")
+        cfo_insights = result.get("cfo_insights") or (json.loads(state["cfo_insights"]) if state else [])
+        return dict(result, tweets=merged, summary=summary, cfo_insights=cfo_insights,
+                    new_tweets=len(fresh))
+
+    async def history(self, topic: str, since: datetime, limit: int) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self._query, topic.strip().lower(), since, limit)
+
+# ----------------------
+# Near-duplicate clustering: retweets, quote-tweets and lightly edited reposts of the
+# same story are grouped by MinHash signatures over word shingles of the tweet text,
+# computed for the whole batch at once with NumPy, with LSH banding to find
+# candidate pairs. Each cluster collapses to its best-ranked member.
+# ----------------------
+NEAR_DUP_ENABLED = os.getenv("NEAR_DUP_ENABLED", "1").lower() in ("1", "true", "yes")
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.6"))  # estimated Jaccard similarity
+NEAR_DUP_SHINGLE = int(os.getenv("NEAR_DUP_SHINGLE", "3"))  # words per shingle
+NEAR_DUP_PERMUTATIONS = 64
+NEAR_DUP_BANDS = 16  # 16 bands x 4 rows: pairs from ~0.5 similarity up usually share a band
+NEAR_DUP_CHUNK = 256  # texts hashed per NumPy pass, bounds the shingles x permutations matrix
+# candidates requested (from Grok, and from the store when on) per slot of n, so
+# collapsing near-duplicates still leaves n tweets
+NEAR_DUP_OVERFETCH = float(os.getenv("NEAR_DUP_OVERFETCH", "1.5"))
+
+RE_RETWEET_PREFIX = re.compile(r"^\s*rt\s+@\w+:?\s*")
+RE_TEXT_URL = re.compile(r"https?://\S+")
+RE_WORD = re.compile(r"\w+")
+
+def near_dup_candidates(n: int) -> int:
+    """How many ranked tweets to fetch so that n remain after collapse_summary."""
+    if not NEAR_DUP_ENABLED or np is None:
+        return n
+    return max(n, math.ceil(n * NEAR_DUP_OVERFETCH))
+
+def shingle_tokens(text: str) -> List[str]:
+    """Lowercased words of a tweet, without links and the "RT @user:" prefix."""
+    text = RE_RETWEET_PREFIX.sub("", RE_TEXT_URL.sub(" ", text.lower()))
+    return RE_WORD.findall(text)
+
+def minhash_signatures(texts: List[str]) -> "np.ndarray":
+    """(len(texts), NEAR_DUP_PERMUTATIONS) MinHash signatures over word shingles."""
+    k = NEAR_DUP_SHINGLE
+    rng = np.random.default_rng(1)
+    perm_a = rng.integers(1, 1 << 63, size=NEAR_DUP_PERMUTATIONS, dtype=np.uint64) | np.uint64(1)  # odd
+    perm_b = rng.integers(0, 1 << 63, size=NEAR_DUP_PERMUTATIONS, dtype=np.uint64)
+    vocab: Dict[str, int] = {}
+    token_ids: List[List[int]] = []
+    for text in texts:
+        ids = [vocab.setdefault(w, len(vocab) + 1) for w in shingle_tokens(text)]
+        if not ids:
+            ids = [len(vocab) + 1]  # no words: a token of its own, so it never matches
+            vocab[f"\0{len(token_ids)}"] = ids[0]
+        token_ids.append(ids + [0] * (k - len(ids)))  # short texts are one padded shingle
+
+    out = np.empty((len(texts), NEAR_DUP_PERMUTATIONS), dtype=np.uint32)
+    for lo in range(0, len(texts), NEAR_DUP_CHUNK):
+        chunk = token_ids[lo:lo + NEAR_DUP_CHUNK]
+        lens = np.fromiter((len(ids) for ids in chunk), dtype=np.int64, count=len(chunk))
+        flat = np.fromiter((i for ids in chunk for i in ids), dtype=np.uint64, count=int(lens.sum()))
+        counts = lens - k + 1  # shingles per text
+        seg_starts = np.cumsum(counts) - counts
+        # flat index of the first word of every shingle
+        pos = np.repeat(np.cumsum(lens) - lens - seg_starts, counts) + np.arange(int(counts.sum()))
+        h = np.zeros(len(pos), dtype=np.uint64)
+        for o in range(k):  # FNV-style combine of the k word ids (wraps mod 2**64)
+            h = (h * np.uint64(0x100000001B3)) ^ flat[pos + o]
+        # multiply-shift hashing: the high 32 bits of a*h + b (mod 2**64), one column per permutation
+        hashed = ((h[:, None] * perm_a[None, :] + perm_b[None, :]) >> np.uint64(32)).astype(np.uint32)
+        out[lo:lo + len(chunk)] = np.minimum.reduceat(hashed, seg_starts, axis=0)
+    return out
+
+def near_duplicate_clusters(texts: List[str]) -> List[List[int]]:
+    """
+    Indices of `texts` grouped into near-duplicate clusters (singletons included),
+    each cluster in input order and the clusters ordered by their first member.
+    """
+    if len(texts) < 2 or np is None:
+        return [[i] for i in range(len(texts))]
+    sig = minhash_signatures(texts)
+    parent = list(range(len(texts)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    rows = NEAR_DUP_PERMUTATIONS // NEAR_DUP_BANDS
+    mix = np.random.default_rng(2).integers(1, 1 << 63, size=rows, dtype=np.uint64)
+    idx = np.arange(len(texts))
+    for b in range(NEAR_DUP_BANDS):
+        keys = (sig[:, b * rows:(b + 1) * rows].astype(np.uint64) * mix).sum(axis=1)
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        run_start = np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]
+        # every bucket member is checked against the bucket's first (lowest) index
+        heads = order[np.maximum.accumulate(np.where(run_start, idx, 0))]
+        members, heads = order[~run_start], heads[~run_start]
+        if not len(members):
+            continue
+        similar = (sig[members] == sig[heads]).mean(axis=1) >= NEAR_DUP_THRESHOLD
+        for i, j in zip(members[similar].tolist(), heads[similar].tolist()):
+            ri, rj = find(i), find(j)
+            if ri != rj:
+                parent[max(ri, rj)] = min(ri, rj)
+
+    clusters: Dict[int, List[int]] = {}
+    for i in range(len(texts)):
+        clusters.setdefault(find(i), []).append(i)
+    return list(clusters.values())
+
+def collapse_near_duplicates(tweets: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    (one representative per cluster, cluster view of the clusters with duplicates).
+    The representative is the best-ranked member, with empty fields filled from the others.
+    """
+    if not NEAR_DUP_ENABLED or np is None:
+        return tweets, []
+    representatives, view = [], []
+    for members in near_duplicate_clusters([t.get("text") or "" for t in tweets]):
+        rep = dict(tweets[members[0]])
+        for i in members[1:]:
+            for f, v in tweets[i].items():
+                if not rep.get(f) and v:
+                    rep[f] = v
+        representatives.append(rep)
+        if len(members) > 1:
+            view.append({"representative": TweetStore.tweet_key(rep), "size": len(members),
+                         "members": [tweets[i] for i in members]})
+    return representatives, view
+
+def collapse_summary(result: Dict[str, Any], n: int) -> Dict[str, Any]:
+    """Collapse near-duplicates in a tweets result and keep the top n; adds the cluster view."""
+    if "tweets" not in result or not NEAR_DUP_ENABLED or np is None:
+        return result
+    with stage_timer("summary", "near_dup"):
+        tweets, clusters = collapse_near_duplicates(result["tweets"])
+    return dict(result, tweets=tweets[:n], clusters=clusters,
+                near_duplicates=len(result["tweets"]) - len(tweets))
+
+@app.get("/tweets/history")
+async def tweets_history(
+    topic: str = Query(..., description="Topic such as finance, cyber, regulation, etc"),
+    hours: float = Query(24 * 7, description="How far back to look, in hours"),
+    limit: int = Query(100, description="Max number of tweets to return")
+):
+    store: Optional[TweetStore] = app.state.tweet_store
+    if store is None:
+        return {"error": "Tweet store is disabled (set TWEET_STORE_PATH)"}
+    since = (datetime.now(timezone.utc) - timedelta(hours=hours)).replace(microsecond=0)
+    tweets = await store.history(topic, since, max(1, min(limit, 1000)))
+    return {"topic": topic, "since": since.isoformat(), "tweets": tweets}
+
+@app.get("/tweets/clusters")
+async def tweets_clusters(
+    topics: Optional[str] = Query(None, description="Comma-separated topics (default: every topic in TOPIC_INSTRUCTIONS)"),
+    hours: float = Query(24, description="How far back to look, in hours"),
+    limit: int = Query(500, description="Max number of stored tweets to read per topic")
+):
+    """Near-duplicate clusters across topics and refreshes, from the tweet store."""
+    store: Optional[TweetStore] = app.state.tweet_store
+    if store is None:
+        return {"error": "Tweet store is disabled (set TWEET_STORE_PATH)"}
+    if np is None:
+        return {"error": "Near-duplicate clustering needs numpy (pip install numpy)"}
+    topic_list = parse_topics(topics)
+    since = (datetime.now(timezone.utc) - timedelta(hours=hours)).replace(microsecond=0)
+    tweets: List[Dict[str, Any]] = []
+    for topic in topic_list:
+        tweets.extend(dict(t, topic=topic) for t in await store.history(topic, since, max(1, min(limit, 5000))))
+    with stage_timer("clusters", "near_dup"):
+        _, clusters = await asyncio.to_thread(collapse_near_duplicates, tweets)
+    for c in clusters:
+        c["topics"] = sorted({m["topic"] for m in c["members"]})
+    clusters.sort(key=lambda c: -c["size"])
+    return {"topics": topic_list, "since": since.isoformat(), "tweets": len(tweets), "clusters": clusters}
+
+# ----------------------
+# Batch endpoint: several topics in one request, fanned out concurrently
+# (capped per batch), per-topic errors isolated.
+# ----------------------
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_MAX_TOPICS = int(os.getenv("BATCH_MAX_TOPICS", "12"))
+
+def parse_topics(topics: Optional[str]) -> List[str]:
+    if not topics:
+        return list(TOPIC_INSTRUCTIONS.keys())
+    seen = set()
+    topic_list = []
+    for t in topics.split(","):
+        t = t.strip()
+        if t and t.lower() not in seen:
+            seen.add(t.lower())
+            topic_list.append(t)
+    return topic_list[:BATCH_MAX_TOPICS]
+
+async def batch_summary_item(topic: str, n: int, fresh: bool, sem: asyncio.Semaphore,
+                             deadline: Deadline) -> Dict[str, Any]:
+    upstream_priority.set("batch")
+    async with sem:
+        try:
+            result, status = await cached_summary(topic, n, fresh=fresh, deadline=deadline)
+        except UpstreamBusy as e:
+            result, status = busy_error(e), "busy"
+        except Exception as e:
+            result, status = upstream_error(e), "error"
+    return dict(result, topic=topic, cache=status)
+
+@app.get("/get_summaries")
+async def get_summaries(
+    request: Request,
+    topics: Optional[str] = Query(None, description="Comma-separated topics (default: every topic in TOPIC_INSTRUCTIONS)"),
+    n: int = Query(5, description="Number of top tweets to fetch per topic (prefer <=10, at most SUMMARY_MAX_N)"),
+    concurrency: int = Query(BATCH_CONCURRENCY, description="Max concurrent Grok calls for this batch"),
+    stream: bool = Query(False, description="Stream NDJSON lines in completion order instead of one JSON response"),
+    fresh: bool = Query(False, description="Bypass the response cache and refetch from Grok"),
+    deadline: Optional[float] = Query(None, description="Time budget in seconds for the whole batch (default SUMMARY_DEADLINE_SECONDS)"),
+    cross_topic: bool = Query(False, description="Drop tweets that near-duplicate one already listed under an earlier topic"),
+    fields: Optional[str] = Query(None, description="Comma-separated keys to return, e.g. summary,tweets.text,tweets.url (default: all)"),
+    debug: bool = Query(False, description="Include debug fields such as raw_content")
+):
+    if not GROK_API_KEY:
+        return {"error": "GROK_API_KEY not configured on server (set in .env)"}
+
+    topic_list = parse_topics(topics)
+    n = clamp_summary_n(n)
+    sem = asyncio.Semaphore(max(1, min(concurrency, BATCH_CONCURRENCY)))
+    budget = request_deadline(deadline, SUMMARY_DEADLINE_SECONDS)
+    spec = parse_fields(fields)
+    if stream:
+        return StreamingResponse(batch_ndjson(topic_list, n, fresh, sem, budget, spec, debug), media_type="application/x-ndjson")
+    connected, results = await unless_disconnected(request, "batch", batch_summaries(topic_list, n, fresh, sem, budget))
+    if not connected:
+        return Response(status_code=CLIENT_CLOSED_REQUEST)
+    if cross_topic:
+        results = collapse_across_topics(results)
+    results = [batch_item_view(r, spec, debug) for r in results]
+    return encoded_json(request, {"topics": topic_list, "results": results}, memoize=False)
+
+def batch_item_view(item: Dict[str, Any], spec: FieldSpec, debug: bool) -> Dict[str, Any]:
+    """project_fields for one batch item; topic and cache status are always kept."""
+    return dict(project_fields(item, spec, debug), topic=item["topic"], cache=item["cache"])
+
+async def batch_summaries(topic_list: List[str], n: int, fresh: bool, sem: asyncio.Semaphore,
+                          deadline: Deadline) -> List[Dict[str, Any]]:
+    return list(await asyncio.gather(*[batch_summary_item(t, n, fresh, sem, deadline) for t in topic_list]))
+
+def collapse_across_topics(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Keep each near-duplicate cluster only under the first topic (in request order) that lists it."""
+    owners = [(r, i) for r in range(len(results)) for i in range(len(results[r].get("tweets") or []))]
+    if not owners or not NEAR_DUP_ENABLED or np is None:
+        return results
+    dropped = set()
+    for members in near_duplicate_clusters([results[r]["tweets"][i].get("text") or "" for r, i in owners]):
+        first_topic = owners[members[0]][0]
+        dropped.update(owners[m] for m in members if owners[m][0] != first_topic)
+    out = []
+    for r, result in enumerate(results):
+        if "tweets" in result:
+            kept = [t for i, t in enumerate(result["tweets"]) if (r, i) not in dropped]
+            result = dict(result, tweets=kept, cross_topic_duplicates=len(result["tweets"]) - len(kept))
+        out.append(result)
+    return out
+
+async def batch_ndjson(topic_list: List[str], n: int, fresh: bool, sem: asyncio.Semaphore,
+                       deadline: Deadline, spec: FieldSpec = None, debug: bool = False) -> AsyncIterator[bytes]:
+    tasks = [asyncio.ensure_future(batch_summary_item(t, n, fresh, sem, deadline)) for t in topic_list]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield dumps_json(batch_item_view(await next_done, spec, debug)) + b"\n"
+    finally:
+        for task in tasks:
+            task.cancel()
+
+# ----------------------
+# New/Improved endpoint: Executive Summary (robust + tables)
+# ----------------------
+DEFAULT_EXEC_COUNTRIES = ["Saudi Arabia", "United Arab Emirates", "Qatar", "Kuwait", "Bahrain", "Oman", "Iraq"]
+
+def parse_countries(countries: Optional[str]) -> List[str]:
+    if countries:
+        provided = [c.strip() for c in countries.split(",") if c.strip()]
+        return provided if provided else list(DEFAULT_EXEC_COUNTRIES)
+    return list(DEFAULT_EXEC_COUNTRIES)
+
+# "single": one completion writes the whole pack; "sections": one concurrent completion per section
+EXEC_MODE = os.getenv("EXEC_MODE", "single")
+
+def exec_key(country_list: List[str], mode: Optional[str] = None) -> Tuple:
+    return ("exec", tuple(sorted(c.lower() for c in country_list)), mode or EXEC_MODE)
+
+def exec_cache_key(country_list: List[str], mode: Optional[str] = None) -> Tuple:
+    return exec_key(country_list, mode) + (cache_bucket(),)
+
+@app.get("/get_exec_summary")
+async def get_exec_summary(
+    request: Request,
+    countries: Optional[str] = Query(None, description="Comma-separated list of countries (default: 7 Gulf countries)"),
+    raw: bool = Query(False, description="Return raw grok output for debugging"),
+    fresh: bool = Query(False, description="Bypass the response cache and refetch from Grok"),
+    deadline: Optional[float] = Query(None, description="Overall time budget in seconds (default EXEC_DEADLINE_SECONDS)"),
+    mode: Optional[str] = Query(None, description="'single' (one completion) or 'sections' (one concurrent completion per section); default EXEC_MODE"),
+    fields: Optional[str] = Query(None, description="Comma-separated keys to return, e.g. document,highlights,tables.title (default: all)"),
+    debug: bool = Query(False, description="Include debug fields such as raw_content")
+):
+    if not GROK_API_KEY:
+        return {"error": "GROK_API_KEY not configured on server (set in .env)"}
+
+    country_list = parse_countries(countries)
+    mode = mode or EXEC_MODE
+    if mode not in ("single", "sections"):
+        return {"error": f"Unknown exec mode {mode!r} (use 'single' or 'sections')"}
+    budget = request_deadline(deadline, EXEC_DEADLINE_SECONDS)
+    if raw:
+        connected, result = await unless_disconnected(request, "exec", fetch_exec_summary(country_list, raw=True, deadline=budget))
+        return result if connected else Response(status_code=CLIENT_CLOSED_REQUEST)
+
+    connected, out = await unless_disconnected(
+        request, "exec", cached_exec_summary(country_list, fresh=fresh, deadline=budget, mode=mode))
+    if not connected:
+        return Response(status_code=CLIENT_CLOSED_REQUEST)
+    result, status = out
+    return encoded_json(request, response_view(result, parse_fields(fields), debug), {"X-Cache": status})
+
+async def cached_exec_summary(country_list: List[str], fresh: bool = False, deadline: Optional[Deadline] = None,
+                              mode: Optional[str] = None) -> Tuple[Dict[str, Any], str]:
+    """fetch_exec_summary through the prefetch store and the response cache; returns (result, cache status)."""
+    mode = mode or EXEC_MODE
+    fetch = fetch_exec_summary_sections if mode == "sections" else fetch_exec_summary
+    warm = None if fresh else app.state.prefetch.lookup(exec_key(country_list, mode))
+    if warm is not None:
+        result, status = warm, "prefetch"
+    else:
+        cache: ResponseCache = app.state.response_cache
+        result, status = await cache.get_or_fetch(exec_cache_key(country_list, mode), 0,
+                                                  lambda: fetch(country_list, deadline=deadline), force=fresh)
+    CACHE_LOOKUPS.labels("exec", status).inc()
+    return result, status
+
+async def finalize_exec_summary(content: str, deadline: Optional[Deadline] = None,
+                                allow_reformat: bool = True) -> Dict[str, Any]:
+    """
+    Parse cleaned Grok content into the exec response. On failure: local truncation
+    repair, then a reformat call (within what is left of `deadline`; skipped when
+    allow_reformat is False), then the raw content as the document.
+    """
+    # Try strong JSON extraction (robust)
+    try:
+        with stage_timer("exec", "extract_json"):
+            parsed = extract_json_from_text(content)
+        if not is_exec_payload(parsed):
+            raise ValueError("Parsed JSON does not match the exec schema")
+        document = parsed.get("document", "") or ""
+        highlights = parsed.get("highlights", []) or []
+        sources = sanitize_exec_sources(parsed.get("sources", []) or [])
+        tables = sanitize_exec_tables(parsed.get("tables", []) or [])
+        return {
+            "document": document,
+            "highlights": highlights,
+            "tables": tables,
+            "sources": sources,
+            "source": "grok",
+            "raw_content": None
+        }
+    except Exception as parse_err:
+        # Most failures are truncations: repair locally before paying for a second call
+        with stage_timer("exec", "local_repair"):
+            repaired = repair_truncated_json(content)
+        if is_exec_payload(repaired) and repaired.get("document"):
+            return {
+                "document": repaired.get("document") or "",
+                "highlights": repaired.get("highlights") or [],
+                "tables": sanitize_exec_tables(repaired.get("tables") or []),
+                "sources": sanitize_exec_sources(repaired.get("sources") or []),
+                "source": "local_repair",
+                "raw_content": content
+            }
+        if not allow_reformat:
+            return {
+                "document": content,
+                "highlights": [],
+                "tables": [],
+                "sources": [],
+                "source": "grok_raw_fallback",
+                "raw_content": content,
+                "parse_error": str(parse_err)
+            }
+        # If parse fails, ask Grok to reformat the raw content into the exact schema,
+        # and explicitly request converting any narrative table into arrays.
+        fix_prompt = (
+            "The content below was intended to be valid JSON following this schema:\n\n"
+            f"{EXEC_SCHEMA_JSON}\n\n"
+            "However it's malformed/truncated. Please OUTPUT ONLY a single VALID JSON object exactly following the schema. "
+            "If you included any readable tables in the `document`, also add a corresponding entry in `tables` with 'title', 'headers' and 'rows'. "
+            "If a subsection has no new items, put: 'No material new items in the last 24 hours' for that subsection.\n\n"
+            "RAW CONTENT START:\n\n" + content + "\n\nRAW CONTENT END."
+        )
+        # a reformat only restructures the briefing that was already written: no new analysis,
+        # and an output budget the size of the input
+        fix_payload = {
+            "model": GROK_FAST_MODEL,
+            "messages": [
+                {"role": "system", "content": (
+                    "You are a precise data extractor. Restructure the given briefing into the schema, "
+                    "keeping its text as written; do not add new analysis. "
+                    "Output VALID, STRICT JSON only under the field names exactly as specified."
+                )},
+                {"role": "user", "content": fix_prompt}
+            ],
+            "temperature": 0.0,
+            "max_tokens": reformat_max_tokens(content)
+        }
+        try:
+            with stage_timer("exec", "reformat"):
+                fix_json = await call_grok(fix_payload, deadline=deadline, hedge="exec_reformat", route="exec_reformat")
+            fix_content = ""
+            # print(len(fix_json['choices'][0]['message']['content']))
+            if isinstance(fix_json, dict) and "choices" in fix_json and fix_json["choices"]:
+                ch0 = fix_json["choices"][0]
+                fix_content = ch0.get("message", {}).get("content") or ch0.get("text") or ""
+            else:
+                fix_content = json.dumps(fix_json)
+            try:
+                parsed2 = extract_json_from_text(fix_content)
+                if not is_exec_payload(parsed2):
+                    raise ValueError("Reformatted JSON does not match the exec schema")
+                document = parsed2.get("document", "") or ""
+                highlights = parsed2.get("highlights", []) or []
+                sources = sanitize_exec_sources(parsed2.get("sources", []) or [])
+                tables = sanitize_exec_tables(parsed2.get("tables", []) or [])
+                return {
+                    "document": document,
+                    "highlights": highlights,
+                    "tables": tables,
+                    "sources": sources,
+                    "source": "grok_reformat",
+                    "raw_content": content
+                }
+            except Exception as reformat_err:
+                # As last fallback, return raw content as document with a parse_error field
+                return {
+                    "document": content,
+                    "highlights": [],
+                    "tables": [],
+                    "sources": [],
+                    "source": "grok_raw_fallback",
+                    "raw_content": content,
+                    "parse_error": str(parse_err),
+                    "reformat_error": str(reformat_err)
+                }
+        except Exception as fix_call_exc:
+            return {
+                "document": content,
+                "highlights": [],
+                "tables": [],
+                "sources": [],
+                "source": "grok_reformat_failed",
+                "raw_content": content,
+                "reformat_call_error": str(fix_call_exc),
+                "parse_error": str(parse_err)
+            }
+
+@reports_demoted_routes
+async def fetch_exec_summary(country_list: List[str], raw: bool = False,
+                             deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+    """
+    Call Grok for the executive briefing pack and parse it (uncached).
+    All upstream calls share `deadline` (default: EXEC_DEADLINE_SECONDS from now).
+    """
+    deadline = deadline or Deadline(EXEC_DEADLINE_SECONDS)
+    start_iso, end_iso = last_24h_window()
+    gp = build_exec_prompt(country_list, start_iso, end_iso)
+    payload = gp["payload"]
+
+    try:
+        # longer timeout to reduce truncation risks
+        with stage_timer("exec", "upstream"):
+            res_json = await call_grok(payload, deadline=deadline, hedge="exec", route="exec")
+
+        with stage_timer("exec", "clean"):
+            content = clean_exec_content(extract_completion_text(res_json))
+
+        if raw:
+            return {"raw_response": res_json, "content": content}
+
+        result = await finalize_exec_summary(content, deadline)
+        count_result("exec", result)
+        return result
+
+    except UpstreamBusy:
+        raise
+    except Exception as e:
+        RESULT_SOURCES.labels("exec", "error").inc()
+        return upstream_error(e)
+
+# ----------------------
+# Section-wise exec generation (mode=sections): each section of the pack gets its
+# own short prompt and budget, all sections run concurrently, and the document,
+# tables and sources are merged locally. A failed section is reported in place
+# instead of failing the whole pack.
+# ----------------------
+EXEC_SECTIONS = {
+    "cyber": ("Cyber attacks", (
+        "New attacks reported in different parts of world, details of incident, impact it caused, "
+        "segregate that into private sector, govt sector, who caused it, what sort of attack (e.g., ransomware) and recovery efforts. "
+        "If no attack, bring recovery efforts underway for earlier reported incidents."
+    )),
+    "regulation": ("Rules and regulations development", (
+        "In fintech, banking, different industries related regulatory new updates, crypto world developments, "
+        "accounting, taxation, insurance, law, data privacy, auditing - only new updates."
+    )),
+    "ai": ("AI developments", (
+        "AI developments in tech and in deployment/adoption by different industries/countries."
+    )),
+    "audit": ("Audit / consulting firms news update", (
+        "Audit firms related news such as EY/KPMG/PwC related actions - violation/fines/use of AI/Deployment of AI in finance/audit world."
+    )),
+    "ma": ("Mergers & Acquisitions", (
+        "New deals announced, acquirer, acquiree, size, valuation metrics, rationale, impact, valuation basis. "
+        "Put the deals in a `tables` entry with headers Date, Acquirer, Acquiree, Size/Valuation, Rationale."
+    )),
+    "cfo": ("General CFO - Lessons", (
+        "Lessons for CFOs from the last 24 hours' developments in cyber security, regulation, audit firms, AI and M&A - just summary lines."
+    )),
+}
+EXEC_SECTION_MAX_TOKENS = int(os.getenv("EXEC_SECTION_MAX_TOKENS", "1500"))
+EXEC_SOURCE_SEVERITY = ["grok", "local_repair", "grok_reformat", "grok_raw_fallback", "grok_reformat_failed"]
+
+# static prefix shared by every section request (see "Prompt prefixes" above)
+EXEC_SECTION_SYSTEM_PROMPT = (
+    "You are a precise briefing writer that prepares one section of an Executive Briefing Pack for senior executives. Output valid JSON only.\n\n"
+    "Output Requirement:\n"
+    "Return a STRICT, valid JSON object using the exact schema below (no extra keys, no commentary):\n\n"
+    f"{EXEC_SCHEMA_JSON}\n\n"
+    "- FORMAT: `document` holds only this section's text in Markdown, without the section title and without any preamble or greeting. "
+    "If you include a table in `document`, also include it in `tables` as {title, headers: [...], rows: [[...],[...]]}. "
+    "Give citation references in `sources` so users can click and expand more. Discuss with date of events.\n\n"
+    "If there is no new content for this section, say 'No material new items in the last 24 hours' with a short analytical comment. "
+    "Return only a single VALID JSON object and nothing else. Use double quotes only."
+)
+
+def build_exec_section_prompt(section: str, countries: List[str], start_iso: str, end_iso: str) -> Dict[str, Any]:
+    title, brief = EXEC_SECTIONS[section]
+    prompt_text = (
+        "Instructions:\n"
+        f"- SECTION: {title}. {brief}\n"
+        f"- TIME WINDOW: Only consider news and social posts published between {start_iso} (inclusive) and {end_iso} (inclusive) — i.e., the last 24 hours.\n"
+        f"- SCOPE: Limit your search and synthesis to events and reporting relating to these countries ONLY: {', '.join(countries)}."
+    )
+    payload = {
+        "model": GROK_MODEL,
+        "messages": [
+            {"role": "system", "content": EXEC_SECTION_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt_text}
+        ],
+        "temperature": 0.0,
+        "max_tokens": EXEC_SECTION_MAX_TOKENS
+    }
+    return {"prompt": EXEC_SECTION_SYSTEM_PROMPT + "\n\n" + prompt_text, "payload": payload}
+
+async def fetch_exec_section(section: str, country_list: List[str], start_iso: str, end_iso: str,
+                             deadline: Deadline) -> Dict[str, Any]:
+    payload = build_exec_section_prompt(section, country_list, start_iso, end_iso)["payload"]
+    with stage_timer("exec_section", "upstream"):
+        res_json = await call_grok(payload, deadline=deadline, hedge="exec_section", route="exec_section")
+    content = clean_exec_content(extract_completion_text(res_json))
+    # no reformat round trip per section: that would bring back the long tail this mode avoids
+    result = await finalize_exec_summary(content, deadline, allow_reformat=False)
+    count_result("exec_section", result)
+    return result
+
+def source_url_key(source: Dict[str, Any]) -> str:
+    url = str(source.get("url") or "").strip()
+    return url.rstrip("/").lower() if url else str(source.get("title") or "").strip().lower()
+
+@reports_demoted_routes
+async def fetch_exec_summary_sections(country_list: List[str], raw: bool = False,
+                                      deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+    """Executive briefing pack from concurrent per-section completions (uncached); `raw` is not supported."""
+    deadline = deadline or Deadline(EXEC_DEADLINE_SECONDS)
+    start_iso, end_iso = last_24h_window()
+    sections = list(EXEC_SECTIONS)
+    results = await asyncio.gather(
+        *[fetch_exec_section(s, country_list, start_iso, end_iso, deadline) for s in sections],
+        return_exceptions=True,
+    )
+    raise_if_abandoned(results)
+    ok = [r for r in results if isinstance(r, dict) and "error" not in r]
+    if not ok:
+        RESULT_SOURCES.labels("exec", "error").inc()
+        for r in results:
+            if isinstance(r, UpstreamBusy):
+                raise r
+        first = results[0]
+        return upstream_error(first) if isinstance(first, BaseException) else first
+
+    parts = [f"# Executive Briefing Pack — {', '.join(country_list)}\n\n_{start_iso} to {end_iso}_"]
+    highlights: List[Any] = []
+    tables: List[Any] = []
+    sources: List[Any] = []
+    seen_sources = set()
+    section_status: Dict[str, str] = {}
+    section_errors: Dict[str, str] = {}
+    for section, r in zip(sections, results):
+        title = EXEC_SECTIONS[section][0]
+        if isinstance(r, BaseException) or "error" in r:
+            error = upstream_error(r)["error"] if isinstance(r, BaseException) else r["error"]
+            section_status[section], section_errors[section] = "error", error
+            parts.append(f"## {title}\n\n_This section could not be generated ({error.splitlines()[0]})._")
+            continue
+        section_status[section] = r["source"]
+        parts.append(f"## {title}\n\n{(r.get('document') or '').strip()}")
+        highlights.extend(h for h in r.get("highlights") or [] if h not in highlights)
+        tables.extend(r.get("tables") or [])
+        for src in r.get("sources") or []:
+            key = source_url_key(src) if isinstance(src, dict) else str(src)
+            if key and key not in seen_sources:
+                seen_sources.add(key)
+                sources.append(src)
+
+    result = {
+        "document": "\n\n".join(parts),
+        "highlights": highlights,
+        "tables": tables,
+        "sources": sources,
+        "source": max((r["source"] for r in ok), key=lambda src: EXEC_SOURCE_SEVERITY.index(src) if src in EXEC_SOURCE_SEVERITY else 0),
+        "raw_content": None,
+        "mode": "sections",
+        "sections": section_status,
+    }
+    if section_errors:
+        result["section_errors"] = section_errors
+    count_result("exec", result)
+    return result
+
+# ----------------------
+# Background prefetch (opt-in): keeps the configured topics and exec country sets
+# warm so user requests are answered from memory instead of waiting on Grok.
+# ----------------------
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "0").lower() in ("1", "true", "yes")
+PREFETCH_TOPICS = [t.strip() for t in os.getenv("PREFETCH_TOPICS", ",".join(TOPIC_INSTRUCTIONS)).split(",") if t.strip()]
+PREFETCH_N = int(os.getenv("PREFETCH_N", "10"))
+# ';'-separated country lists, '*' = the default Gulf set, empty = no exec prefetch
+PREFETCH_EXEC_COUNTRIES = [c.strip() for c in os.getenv("PREFETCH_EXEC_COUNTRIES", "*").split(";") if c.strip()]
+PREFETCH_INTERVAL_SECONDS = float(os.getenv("PREFETCH_INTERVAL_SECONDS", "600"))
+PREFETCH_JITTER_SECONDS = float(os.getenv("PREFETCH_JITTER_SECONDS", "60"))
+PREFETCH_MAX_AGE_SECONDS = float(os.getenv("PREFETCH_MAX_AGE_SECONDS", str(2 * PREFETCH_INTERVAL_SECONDS)))
+
+class PrefetchScheduler:
+    """
+    One refresh loop per target. A failed refresh keeps serving the last good value
+    (until it is older than max_age) and records the error in the entry's status.
+    """
+    def __init__(self, interval: float, jitter: float, max_age: float):
+        self.interval = interval
+        self.jitter = jitter
+        self.max_age = max_age
+        self.entries: Dict[Tuple, Dict[str, Any]] = {}
+        self._targets: List[Tuple[Tuple, int, Callable[[], Awaitable[Dict[str, Any]]]]] = []
+        self._tasks: List[asyncio.Task] = []
+
+    def add_target(self, key: Tuple, n: int, fetch: Callable[[], Awaitable[Dict[str, Any]]]) -> None:
+        self._targets.append((key, n, fetch))
+        self.entries[key] = {"n": n, "value": None, "refreshed_at": None, "status": "pending",
+                             "last_error": None, "last_duration": None, "next_refresh_at": None}
+
+    def start(self) -> None:
+        self._tasks = [asyncio.ensure_future(self._run(*target)) for target in self._targets]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _run(self, key: Tuple, n: int, fetch: Callable[[], Awaitable[Dict[str, Any]]]) -> None:
+        # spread the first refreshes out so the targets don't all hit Grok at once
+        await asyncio.sleep(random.uniform(0, self.jitter))
+        while True:
+            await self.refresh(key, fetch)
+            delay = max(1.0, self.interval + random.uniform(-self.jitter, self.jitter))
+            self.entries[key]["next_refresh_at"] = time.time() + delay
+            await asyncio.sleep(delay)
+
+    async def refresh(self, key: Tuple, fetch: Callable[[], Awaitable[Dict[str, Any]]]) -> None:
+        entry = self.entries[key]
+        entry["status"] = "refreshing"
+        started = time.monotonic()
+        token = upstream_priority.set("prefetch")
+        try:
+            value = await fetch()
+        except Exception as e:
+            value = upstream_error(e)
+        finally:
+            upstream_priority.reset(token)
+        entry["last_duration"] = round(time.monotonic() - started, 3)
+        if "error" in value:
+            entry["status"] = "error"
+            entry["last_error"] = value["error"]
+            return
+        entry.update(value=value, refreshed_at=time.time(), status="ok", last_error=None)
+
+    def lookup(self, key: Tuple, n: int = 0) -> Optional[Dict[str, Any]]:
+        entry = self.entries.get(key)
+        if entry is None or entry["value"] is None or entry["n"] < n:
+            return None
+        if time.time() - entry["refreshed_at"] > self.max_age:
+            return None
+        return entry["value"]
+
+    def status(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        out = []
+        for key, entry in self.entries.items():
+            out.append({
+                "kind": key[0],
+                "target": key[1] if isinstance(key[1], str) else list(key[1]),
+                "n": entry["n"],
+                "status": entry["status"],
+                "age_seconds": round(now - entry["refreshed_at"], 1) if entry["refreshed_at"] else None,
+                "fresh": self.lookup(key, entry["n"]) is not None,
+                "last_duration_seconds": entry["last_duration"],
+                "last_error": entry["last_error"],
+                "next_refresh_in_seconds": round(entry["next_refresh_at"] - now, 1) if entry["next_refresh_at"] else None,
+            })
+        return out
+
+def create_prefetch_scheduler() -> PrefetchScheduler:
+    scheduler = PrefetchScheduler(PREFETCH_INTERVAL_SECONDS, PREFETCH_JITTER_SECONDS, PREFETCH_MAX_AGE_SECONDS)
+    if not PREFETCH_ENABLED:
+        return scheduler
+    for topic in PREFETCH_TOPICS:
+        scheduler.add_target(summary_key(topic), PREFETCH_N, lambda topic=topic: fetch_summary(topic, PREFETCH_N))
+    for spec in PREFETCH_EXEC_COUNTRIES:
+        country_list = parse_countries(None if spec == "*" else spec)
+        fetch = fetch_exec_summary_sections if EXEC_MODE == "sections" else fetch_exec_summary
+        scheduler.add_target(exec_key(country_list), 0, lambda country_list=country_list, fetch=fetch: fetch(country_list))
+    return scheduler
+
+@app.get("/prefetch/status")
+async def prefetch_status():
+    scheduler: PrefetchScheduler = app.state.prefetch
+    return {
+        "enabled": PREFETCH_ENABLED,
+        "interval_seconds": scheduler.interval,
+        "max_age_seconds": scheduler.max_age,
+        "entries": scheduler.status(),
+    }
+
+# ----------------------
+# Streaming (SSE) variants: tweets are emitted as soon as each object is complete,
+# `document` text is forwarded as it is generated, the final event carries the
+# same validated payload as the non-streaming endpoints.
+# ----------------------
+class StreamingJsonScanner:
+    """
+    Incremental scanner over a JSON completion arriving in chunks. feed() returns
+    ("item", obj) for each complete object of the top-level `array_key` array and
+    ("text", str) for decoded pieces of the top-level `text_key` string.
+    Only a small tail (the current item / undecoded text) is kept between chunks.
+    """
+    def __init__(self, array_key: str = "tweets", text_key: str = "document"):
+        self.array_key = array_key
+        self.text_key = text_key
+        self._parts: List[str] = []
+        self._buf = ""
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._u_left = 0
+        self._high_surrogate = False
+        self._expect_key = False
+        self._string_is_key = False
+        self._key_start = -1
+        self._last_key: Optional[str] = None  # last key seen in the top-level object
+        self._item_start = -1
+        self._text_start = -1
+        self._text_safe = -1
+
+    @property
+    def content(self) -> str:
+        return "".join(self._parts)
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        self._parts.append(chunk)
+        events: List[Tuple[str, Any]] = []
+        buf = self._buf + chunk
+        stack = self._stack
+        for i in range(len(self._buf), len(buf)):
+            ch = buf[i]
+            if self._in_string:
+                if self._u_left:
+                    self._u_left -= 1
+                    if not self._u_left:
+                        try:
+                            self._high_surrogate = 0xD800 <= int(buf[i-3:i+1], 16) <= 0xDBFF
+                        except ValueError:
+                            self._high_surrogate = False
+                elif self._escape:
+                    self._escape = False
+                    if ch == "u":
+                        self._u_left = 4
+                    else:
+                        self._high_surrogate = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._string_is_key:
+                        if len(stack) == 1:
+                            self._last_key = buf[self._key_start:i]
+                        self._key_start = -1
+                    elif self._text_start >= 0:
+                        self._emit_text(events, buf[self._text_start:i])
+                        self._text_start = self._text_safe = -1
+                    continue
+                else:
+                    self._high_surrogate = False
+                if self._text_start >= 0 and not (self._escape or self._u_left or self._high_surrogate):
+                    self._text_safe = i + 1
+                continue
+            if ch == '"':
+                self._in_string = True
+                self._string_is_key = bool(stack) and stack[-1] == "{" and self._expect_key
+                if self._string_is_key:
+                    self._key_start = i + 1
+                elif len(stack) == 1 and self._last_key == self.text_key:
+                    self._text_start = self._text_safe = i + 1
+            elif ch == "{" or ch == "[":
+                if ch == "{" and len(stack) == 2 and stack[-1] == "[" and self._last_key == self.array_key:
+                    self._item_start = i
+                stack.append(ch)
+                self._expect_key = ch == "{"
+            elif ch == "}" or ch == "]":
+                if stack:
+                    stack.pop()
+                if ch == "}" and self._item_start >= 0 and len(stack) == 2:
+                    try:
+                        events.append(("item", loads_json(buf[self._item_start:i+1])))
+                    except ValueError:
+                        pass
+                    self._item_start = -1
+                self._expect_key = False
+            elif ch == ",":
+                self._expect_key = bool(stack) and stack[-1] == "{"
+            elif ch == ":":
+                self._expect_key = False
+        if self._text_start >= 0 and self._text_safe > self._text_start:
+            self._emit_text(events, buf[self._text_start:self._text_safe])
+            self._text_start = self._text_safe
+        # keep only the tail that an open item, key or text string still needs
+        keep = min([p for p in (self._item_start, self._key_start, self._text_start) if p >= 0] or [len(buf)])
+        self._buf = buf[keep:]
+        for attr in ("_item_start", "_key_start", "_text_start", "_text_safe"):
+            if getattr(self, attr) >= 0:
+                setattr(self, attr, getattr(self, attr) - keep)
+        return events
+
+    @staticmethod
+    def _emit_text(events: List[Tuple[str, Any]], raw: str) -> None:
+        if not raw:
+            return
+        try:
+            events.append(("text", _STREAM_TEXT_DECODER.decode('"' + raw + '"')))
+        except ValueError:
+            events.append(("text", raw))
+
+_STREAM_TEXT_DECODER = json.JSONDecoder(strict=False)
+
+def sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {dumps_json(data).decode('utf-8')}\n\n"
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+class StreamedTweets:
+    """
+    The tweets a summary stream has sent. Candidates arrive in rank order; one is sent
+    once it heads a near-duplicate cluster none of whose members was sent yet (up to
+    n), and `done` lists exactly the sent tweets, so the stream and `done` agree.
+    """
+    def __init__(self, n: int):
+        self.n = n
+        self.candidates: List[Dict[str, Any]] = []
+        self.sent: List[Dict[str, Any]] = []
+        self._candidate_keys: set = set()
+        self._sent_keys: set = set()
+
+    def add(self, tweets: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Append candidates (already-known keys are skipped); returns the tweets to send now."""
+        for t in tweets:
+            key = TweetStore.tweet_key(t)
+            if key not in self._candidate_keys:
+                self._candidate_keys.add(key)
+                self.candidates.append(t)
+        return self._select()
+
+    def finish(self, tweets: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """The final candidate list (after the shard and store merges); returns the tweets still to send."""
+        self.candidates = list(tweets)
+        self._candidate_keys = {TweetStore.tweet_key(t) for t in tweets}
+        return self._select()
+
+    def _select(self) -> List[Dict[str, Any]]:
+        if len(self.sent) >= self.n:
+            return []
+        if NEAR_DUP_ENABLED:
+            clusters = near_duplicate_clusters([t.get("text") or "" for t in self.candidates])
+        else:
+            clusters = [[i] for i in range(len(self.candidates))]
+        new = []
+        for members in clusters:
+            if len(self.sent) >= self.n:
+                break
+            if any(TweetStore.tweet_key(self.candidates[i]) in self._sent_keys for i in members):
+                continue
+            tweet = self.candidates[members[0]]
+            self._sent_keys.add(TweetStore.tweet_key(tweet))
+            self.sent.append(tweet)
+            new.append(tweet)
+        return new
+
+@app.get("/get_summary/stream")
+async def stream_summary(
+    topic: str = Query(..., description="Topic such as finance, cyber, regulation, etc"),
+    n: int = Query(5, description="Number of top tweets to fetch (prefer <=10, at most SUMMARY_MAX_N)"),
+    fresh: bool = Query(False, description="Bypass the response cache and refetch from Grok"),
+    deadline: Optional[float] = Query(None, description="Overall time budget in seconds (default SUMMARY_DEADLINE_SECONDS)"),
+    fields: Optional[str] = Query(None, description="Comma-separated keys for the `done` payload (default: all)"),
+    debug: bool = Query(False, description="Include debug fields such as raw_content in `done`")
+):
+    if not GROK_API_KEY:
+        return {"error": "GROK_API_KEY not configured on server (set in .env)"}
+    n = clamp_summary_n(n)
+    budget = request_deadline(deadline, SUMMARY_DEADLINE_SECONDS)
+    return StreamingResponse(summary_events(topic, n, fresh, budget, parse_fields(fields), debug),
+                             media_type="text/event-stream", headers=SSE_HEADERS)
+
+async def summary_events(topic: str, n: int, fresh: bool, deadline: Deadline,
+                         spec: FieldSpec = None, debug: bool = False) -> AsyncIterator[str]:
+    """SSE events: `tweet` per sanitized tweet, then `done` with the (projected) payload (or `error`)."""
+    cache: ResponseCache = app.state.response_cache
+    key = summary_cache_key(topic)
+    cached = None if fresh else (app.state.prefetch.lookup(summary_key(topic), n) or cache.get(key, n))
+    if cached is not None:
+        for t in cached["tweets"][:n]:
+            yield sse_event("tweet", t)
+        yield sse_event("done", project_fields(dict(cached, topic=topic, tweets=cached["tweets"][:n]), spec, debug))
+        return
+
+    # the same fetch as fetch_summary: n above SUMMARY_SHARD_SIZE is sharded (the first
+    # slice streams while the later slices are fetched concurrently) and every slice
+    # asks for the same window; candidates are sent in rank order as they arrive
+    want = near_dup_candidates(n)
+    (_, shard_size), *later = summary_slices(want)
+    store: Optional[TweetStore] = app.state.tweet_store
+    fetched_at = datetime.now(timezone.utc).replace(microsecond=0).isoformat()
+    since_iso = await store.window_start(topic) if store is not None else None
+    payload = build_grok_prompt(topic, shard_size, prefer_verified=True, since_iso=since_iso)["payload"]
+    demoted: Dict[str, str] = {}
+    demoted_routes.set(demoted)  # this generator's task only serves this stream; set before the slice tasks copy it
+    rest = [asyncio.ensure_future(fetch_summary_slice_retried(topic, size, since_iso, off, deadline))
+            for off, size in later]
+    scanner = StreamingJsonScanner(array_key="tweets")
+    streamed = StreamedTweets(n)
+    items = 0
+    try:
+        try:
+            with stage_timer("summary", "upstream_stream"):
+                async for delta in stream_grok(payload, MODEL_ROUTES["summary"].timeout, route="summary", deadline=deadline):
+                    for kind, obj in scanner.feed(delta):
+                        if kind == "item" and isinstance(obj, dict) and items < shard_size:
+                            items += 1
+                            for t in streamed.add([sanitize_tweet_obj(obj)]):
+                                yield sse_event("tweet", t)
+            result = await finalize_summary(topic, shard_size, clean_tweet_content(scanner.content), deadline)
+            count_result("summary", result)
+        except Exception as e:
+            if not rest:
+                raise
+            result = e  # the other slices may still cover the request
+        if rest:
+            shards = [result]
+            for task in rest:
+                try:
+                    shard = await task
+                except Exception as e:
+                    shard = e
+                shards.append(shard)
+                if isinstance(shard, dict) and "error" not in shard:
+                    for t in streamed.add(shard.get("tweets") or []):
+                        yield sse_event("tweet", t)
+            result = merge_summary_shards(topic, want, shards)
+            if "error" in result:
+                yield sse_event("error", result)
+                return
+        # the same store merge as fetch_summary, so the `done` payload matches what
+        # /get_summary serves from the shared cache entry
+        if store is not None:
+            with stage_timer("summary", "store_merge"):
+                result = await store.merge(topic, want, result, fetched_at)
+        if "tweets" in result:
+            for t in streamed.finish(result["tweets"]):
+                yield sse_event("tweet", t)
+            result = dict(collapse_summary(result, n), tweets=streamed.sent)
+        result = with_demoted_routes(result, demoted)
+    except asyncio.CancelledError:
+        CLIENT_DISCONNECTS.labels("summary_stream").inc()
+        raise
+    except UpstreamBusy as e:
+        yield sse_event("error", busy_error(e))
+        return
+    except Exception as e:
+        yield sse_event("error", upstream_error(e))
+        return
+    finally:
+        for task in rest:
+            task.cancel()
+    cache.put(key, n, result)
+    yield sse_event("done", project_fields(result, spec, debug))
+
+@app.get("/get_exec_summary/stream")
+async def stream_exec_summary(
+    countries: Optional[str] = Query(None, description="Comma-separated list of countries (default: 7 Gulf countries)"),
+    fresh: bool = Query(False, description="Bypass the response cache and refetch from Grok"),
+    deadline: Optional[float] = Query(None, description="Overall time budget in seconds (default EXEC_DEADLINE_SECONDS)"),
+    fields: Optional[str] = Query(None, description="Comma-separated keys for the `done` payload (default: all)"),
+    debug: bool = Query(False, description="Include debug fields such as raw_content in `done`")
+):
+    if not GROK_API_KEY:
+        return {"error": "GROK_API_KEY not configured on server (set in .env)"}
+    budget = request_deadline(deadline, EXEC_DEADLINE_SECONDS)
+    return StreamingResponse(exec_summary_events(parse_countries(countries), fresh, budget, parse_fields(fields), debug),
+                             media_type="text/event-stream", headers=SSE_HEADERS)
+
+async def exec_summary_events(country_list: List[str], fresh: bool, deadline: Deadline,
+                              spec: FieldSpec = None, debug: bool = False) -> AsyncIterator[str]:
+    """SSE events: `document` text deltas and sanitized `table` objects as they are generated, then `done` (or `error`)."""
+    cache: ResponseCache = app.state.response_cache
+    # the stream always generates the pack in one completion
+    key = exec_cache_key(country_list, "single")
+    cached = None if fresh else (app.state.prefetch.lookup(exec_key(country_list, "single")) or cache.get(key))
+    if cached is not None:
+        yield sse_event("document", {"delta": cached.get("document", "")})
+        yield sse_event("done", project_fields(cached, spec, debug))
+        return
+
+    start_iso, end_iso = last_24h_window()
+    payload = build_exec_prompt(country_list, start_iso, end_iso)["payload"]
+    scanner = StreamingJsonScanner(array_key="tables", text_key="document")
+    demoted: Dict[str, str] = {}
+    demoted_routes.set(demoted)  # this generator's task only serves this stream
+    try:
+        with stage_timer("exec", "upstream_stream"):
+            async for delta in stream_grok(payload, MODEL_ROUTES["exec"].timeout, route="exec", deadline=deadline):
+                for kind, obj in scanner.feed(delta):
+                    if kind == "text":
+                        yield sse_event("document", {"delta": obj})
+                    elif kind == "item" and isinstance(obj, dict):
+                        yield sse_event("table", ExecTable.clean(obj))
+        result = with_demoted_routes(await finalize_exec_summary(clean_exec_content(scanner.content), deadline), demoted)
+        count_result("exec", result)
+    except asyncio.CancelledError:
+        CLIENT_DISCONNECTS.labels("exec_stream").inc()
+        raise
+    except UpstreamBusy as e:
+        yield sse_event("error", busy_error(e))
+        return
     except Exception as e:
-        return {"error": str(e)}
+        yield sse_event("error", upstream_error(e))
+        return
+    cache.put(key, 0, result)
+    yield sse_event("done", project_fields(result, spec, debug))
 
 if __name__ == "__main__":
     import uvicorn
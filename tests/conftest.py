@@ -0,0 +1,10 @@
+import os
+import sys
+
+# main reads its configuration at import time: no key, store or prefetch from the environment
+os.environ.setdefault("GROK_API_KEY", "test")
+os.environ["TWEET_STORE_PATH"] = ""
+os.environ["PREFETCH_ENABLED"] = "0"
+os.environ["GROK_MAX_INFLIGHT"] = "32"  # the breaker tests need every call to reach the upstream
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,55 @@
+"""
+Calls cut short by a client's ?deadline= neither trip the circuit breaker nor demote
+their model route; calls that run out their own full timeout still open the breaker.
+"""
+import asyncio
+
+import httpx
+
+from main import GROK_BREAKER_MIN_CALLS, GROK_ROUTE_MIN_SAMPLES, CircuitOpen, Deadline, app, call_grok
+
+UPSTREAM_SECONDS = 3
+PAYLOAD = {"model": "grok-3", "messages": [{"role": "user", "content": "ping"}], "max_tokens": 10}
+CALLS = max(GROK_BREAKER_MIN_CALLS, GROK_ROUTE_MIN_SAMPLES) + 2
+
+
+async def slow_upstream(request: httpx.Request) -> httpx.Response:
+    await asyncio.sleep(UPSTREAM_SECONDS)
+    return httpx.Response(200, json={"choices": [{"message": {"content": "{}"}}]})
+
+
+async def run_call(deadline=None, **kwargs):
+    try:
+        await call_grok(PAYLOAD, deadline=Deadline(deadline) if deadline else None, **kwargs)
+    except (httpx.TimeoutException, CircuitOpen):
+        pass
+
+
+async def run_calls(count, **kwargs):
+    await asyncio.gather(*(run_call(**kwargs) for _ in range(count)))
+
+
+def run_against_slow_upstream(scenario):
+    async def main():
+        async with app.router.lifespan_context(app):
+            await app.state.grok_client.aclose()
+            app.state.grok_client = httpx.AsyncClient(transport=httpx.MockTransport(slow_upstream))
+            await scenario()
+    asyncio.run(main())
+
+
+def test_client_deadline_truncation_is_not_an_upstream_timeout():
+    async def scenario():
+        # the route's timeout (90 s) is cut to 2.5 s by each client's deadline
+        await run_calls(CALLS, deadline=2.5, route="summary")
+        assert app.state.upstream_breaker.state == "closed", app.state.upstream_breaker.status()
+        router = app.state.model_router
+        assert router.model("summary") == router.route("summary").model
+    run_against_slow_upstream(scenario)
+
+
+def test_full_timeouts_open_the_breaker():
+    async def scenario():
+        await run_calls(CALLS, timeout=0.5)
+        assert app.state.upstream_breaker.state == "open", app.state.upstream_breaker.status()
+    run_against_slow_upstream(scenario)
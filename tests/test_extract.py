@@ -0,0 +1,74 @@
+"""find_all_tweet_like_blocks: the regex fallback's single-pass tokenizer."""
+import json
+
+from main import find_all_tweet_like_blocks
+
+
+def tweet(i, text=None, **extra):
+    t = {
+        "id": str(1850000000000000000 + i),
+        "author": f"@handle{i}",
+        "created_at": "2025-10-29T12:00:00Z",
+        "text": text if text is not None else f"Tweet {i}: markets rally on AI news",
+        "url": f"https://x.com/handle{i}/status/{1850000000000000000 + i}",
+        "retweets": i, "replies": 0, "likes": i * 2,
+        "why_selected": "high engagement",
+    }
+    t.update(extra)
+    return t
+
+
+def payload(tweets, summary="Markets moved."):
+    return json.dumps({"tweets": tweets, "summary": summary, "cfo_insights": []}, ensure_ascii=False, indent=2)
+
+
+def test_complete_payload_fields_land_on_their_own_tweet():
+    # the old +-500 char window picked up the previous tweet's id/author once tweets
+    # were shorter than the window
+    tweets = [tweet(i) for i in range(20)]
+    fields = ("id", "author", "created_at", "text", "url", "why_selected")
+    got = find_all_tweet_like_blocks(payload(tweets))
+    assert [tuple(t[f] for f in fields) for t in got] == [tuple(t[f] for f in fields) for t in tweets]
+
+
+def test_truncated_mid_text_drops_the_cut_tweet():
+    text = payload([tweet(i) for i in range(3)])
+    got = find_all_tweet_like_blocks(text[: text.rindex("markets rally")])
+    assert [t["id"] for t in got] == [tweet(0)["id"], tweet(1)["id"]]
+
+
+def test_truncated_after_text_keeps_the_fields_seen():
+    text = payload([tweet(0), tweet(1, url="")])
+    got = find_all_tweet_like_blocks(text[: text.rindex('"url"')])
+    assert [(t["id"], t["text"]) for t in got] == [(tweet(0)["id"], tweet(0)["text"]),
+                                                    (tweet(1)["id"], tweet(1)["text"])]
+
+
+def test_tweet_without_id_does_not_borrow_its_neighbours():
+    tweets = [tweet(0), {"author": "@anon", "text": "no id here", "why_selected": "x"}]
+    got = find_all_tweet_like_blocks(payload(tweets))
+    assert [(t["id"], t["author"]) for t in got] == [(tweet(0)["id"], "@handle0"), ("", "@anon")]
+
+
+def test_non_ascii_and_escapes_decode_as_json():
+    tweets = [tweet(0, text="Émirats: “IA” progresse — 20% ↑ \"quoted\"\nnext")]
+    assert find_all_tweet_like_blocks(payload(tweets))[0]["text"] == tweets[0]["text"]
+    # \uXXXX-escaped form
+    assert find_all_tweet_like_blocks(json.dumps({"tweets": tweets}))[0]["text"] == tweets[0]["text"]
+
+
+def test_braces_in_strings_do_not_split_objects():
+    tweets = [tweet(0, text="set {a} and {b"), tweet(1)]
+    got = find_all_tweet_like_blocks(payload(tweets, summary="{not json"))
+    assert [(t["id"], t["text"]) for t in got] == [(tweet(0)["id"], "set {a} and {b"), (tweet(1)["id"], tweet(1)["text"])]
+
+
+def test_prose_falls_back_to_tweet_urls():
+    prose = "See https://x.com/alice/status/1234567 and https://twitter.com/bob/status/7654321 for details."
+    got = find_all_tweet_like_blocks(prose)
+    assert [(t["id"], t["author"]) for t in got] == [("1234567", "@alice"), ("7654321", "@bob")]
+
+
+def test_duplicates_merge_on_id():
+    got = find_all_tweet_like_blocks(payload([tweet(0, why_selected=""), tweet(0)]))
+    assert [(t["id"], t["why_selected"]) for t in got] == [(tweet(0)["id"], "high engagement")]
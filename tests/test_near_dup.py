@@ -0,0 +1,56 @@
+"""near_duplicate_clusters (NumPy MinHash + LSH banding) and what the summary paths build on it."""
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("numpy")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bench"))
+from bench_near_dup import corpus, pairwise_clusters, same_cluster_pairs  # noqa: E402
+from main import StreamedTweets, collapse_near_duplicates, near_duplicate_clusters  # noqa: E402
+
+BASE = "Saudi Aramco posts record third quarter profit as oil prices climb and beats analyst estimates"
+
+
+def test_retweet_quote_and_edit_cluster_together():
+    texts = [
+        BASE,
+        f"RT @Reuters: {BASE}",
+        f"Big numbers. {BASE} https://t.co/abc123",
+        BASE.replace("record", "strong"),
+        "Saudi Aramco shares slip after OPEC signals output increase next month",
+        "",
+        "",
+        "ok",
+    ]
+    assert near_duplicate_clusters(texts) == [[0, 1, 2, 3], [4], [5], [6], [7]]
+
+
+def test_single_and_no_texts():
+    assert near_duplicate_clusters([BASE]) == [[0]]
+    assert near_duplicate_clusters([]) == []
+
+
+def test_recall_against_exact_pairwise_jaccard():
+    texts = corpus(300)
+    expected = same_cluster_pairs(pairwise_clusters(texts))
+    got = same_cluster_pairs(near_duplicate_clusters(texts))
+    assert len(got & expected) / max(1, len(expected)) >= 0.95
+
+
+def test_collapse_keeps_best_ranked_member_and_fills_its_empty_fields():
+    tweets = [{"id": "1", "text": BASE, "url": ""}, {"id": "2", "text": f"RT @x: {BASE}", "url": "https://x.com/x/status/2"}]
+    representatives, clusters = collapse_near_duplicates(tweets)
+    assert [(t["id"], t["url"]) for t in representatives] == [("1", "https://x.com/x/status/2")]
+    assert clusters[0]["representative"] == "1" and clusters[0]["size"] == 2
+
+
+def test_streamed_tweets_skip_near_duplicates_of_sent_ones():
+    other = [{"id": str(i), "text": f"unrelated story number {i} about {topic}"}
+             for i, topic in [(3, "cyber attacks on a utility"), (4, "gulf regulation"), (5, "oil markets")]]
+    streamed = StreamedTweets(3)
+    assert [t["id"] for t in streamed.add([{"id": "1", "text": BASE}])] == ["1"]
+    assert [t["id"] for t in streamed.add([{"id": "2", "text": f"RT @x: {BASE}"}, other[0]])] == ["3"]
+    assert [t["id"] for t in streamed.finish([{"id": "1", "text": BASE}] + other)] == ["4"]
+    assert [t["id"] for t in streamed.sent] == ["1", "3", "4"]